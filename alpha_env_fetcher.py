@@ -3,6 +3,9 @@ import pandas as pd
 import os
 import time
 
+from bar_cache import BAR_COLUMNS, BarCache
+from candle_store import to_epoch
+
 # ==========================================
 # 🔧 CONFIGURATION
 # ==========================================
@@ -14,6 +17,15 @@ BASE_URL = "https://www.alphavantage.co/query"
 SYMBOL = "SPY"
 OUTPUT_SYMBOL_NAME = "SPX"
 
+# data/<label>/SPX_<label>.csv + coverage index (what env_brain reads)
+CACHE = BarCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+# 'compact' is the last 100 trading days (~140 calendar days); beyond
+# this gap we need 'full'
+COMPACT_DAYS = 130
+
+AV_COLUMNS = ("1. open", "2. high", "3. low", "4. close", "5. volume")
+
 # Map Function -> JSON Key
 TIME_SERIES_KEYS = {
     "TIME_SERIES_DAILY": "Time Series (Daily)",
@@ -21,13 +33,34 @@ TIME_SERIES_KEYS = {
     "TIME_SERIES_MONTHLY": "Monthly Time Series",
 }
 
-def fetch_series(function_name: str, folder: str, label: str, mode: str = "compact") -> None:
+def _parse_series(data: dict, ts_key: str) -> dict:
+    # Alpha Vantage {date: {"1. open": "...", ...}} -> bar arrays, oldest first
+    df = pd.DataFrame.from_dict(data[ts_key], orient="index")
+    df.index = pd.to_datetime(df.index)
+    df = df.sort_index()
+    bars = {"timestamp": df.index.values.astype("datetime64[s]").astype("int64")}
+    for col, av_col in zip(BAR_COLUMNS, AV_COLUMNS):
+        bars[col] = pd.to_numeric(df[av_col], errors="coerce").to_numpy(dtype="float64")
+    return bars
+
+def fetch_series(function_name: str, label: str, mode: str = "auto") -> None:
     """
     function_name: API function (e.g., TIME_SERIES_DAILY)
-    folder: Output folder
-    label: Filename suffix
-    mode: 'compact' (100 rows) or 'full' (20 years history)
+    label: interval name = data subfolder + filename suffix (daily/weekly/monthly)
+    mode: 'auto' (only what's missing: 'compact' when the gap since the
+          cached data is short enough, else 'full'), 'compact' (100 rows)
+          or 'full' (20 years history)
+
+    New bars are merged into data/<label>/SPX_<label>.csv in place (see
+    bar_cache.py); nothing that's already cached is rewritten.
     """
+    now = to_epoch(time.time())
+    covered = CACHE.coverage(OUTPUT_SYMBOL_NAME, label)
+    if mode == "auto":
+        # The gap we care about is the one since the last cached bar
+        recent = covered and now - covered[-1][1] <= COMPACT_DAYS * 86400
+        mode = "compact" if recent else "full"
+
     print(f"📥 Fetching {label} ({mode})...")
     
     params = {
@@ -42,7 +75,7 @@ def fetch_series(function_name: str, folder: str, label: str, mode: str = "compa
         params["outputsize"] = mode  # 'compact' or 'full'
 
     try:
-        resp = requests.get(BASE_URL, params=params)
+        resp = requests.get(BASE_URL, params=params, timeout=30)
         data = resp.json()
     except Exception as e:
         print(f"❌ Network Error: {e}")
@@ -52,51 +85,47 @@ def fetch_series(function_name: str, folder: str, label: str, mode: str = "compa
     if "Error Message" in data:
         print(f"❌ API Error: {data['Error Message']}")
         return
-    if "Note" in data:
-        print(f"⚠️ API Note (Rate Limit?): {data['Note']}")
-        # If we hit a rate limit, wait 60s (Alpha Vantage free tier is 5 calls/min)
-        time.sleep(60) 
+    if "Note" in data or "Information" in data:
+        # Rate limit (free tier: 5 calls/min). Nothing is lost: the cache
+        # still knows what's missing, so just run again later.
+        print(f"⚠️ API Note (Rate Limit?): {data.get('Note') or data.get('Information')}")
+        return
 
     ts_key = TIME_SERIES_KEYS.get(function_name)
     if not ts_key or ts_key not in data:
         print(f"❌ Key '{ts_key}' not found. Keys received: {list(data.keys())}")
         return
 
-    # Parse Data
-    ts = data[ts_key]
-    df = pd.DataFrame.from_dict(ts, orient="index")
-    df.index.name = "date"
-    df.index = pd.to_datetime(df.index)
-    df = df.sort_index()  # Oldest -> Newest
+    bars = _parse_series(data, ts_key)
+    if len(bars["timestamp"]) == 0:
+        print(f"⚠️ {label}: no rows returned")
+        return
 
-    # Convert strings to floats
-    for col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
+    # A full pull is everything there is, so it covers all time before it too
+    start = 0 if mode == "full" else int(bars["timestamp"][0])
+    gaps = CACHE.missing(OUTPUT_SYMBOL_NAME, label, start, now)
+    written = CACHE.merge(OUTPUT_SYMBOL_NAME, label, bars, start, now, now=now)
 
-    # Save
-    os.makedirs(folder, exist_ok=True)
-    out_path = os.path.join(folder, f"{OUTPUT_SYMBOL_NAME}_{label}.csv")
-    df.to_csv(out_path)
-    
-    print(f"✅ Saved {len(df)} rows to {out_path}")
+    out_path = CACHE.path(OUTPUT_SYMBOL_NAME, label)
+    print(f"✅ Merged {written} rows into {out_path} ({len(gaps)} gap(s) filled)")
 
 def main():
     print("--- 🚀 ALPHA VANTAGE FETCHER ---")
     
     # 1. WEEKLY & MONTHLY (Always Full History)
-    fetch_series("TIME_SERIES_WEEKLY", "data/weekly", "weekly")
-    fetch_series("TIME_SERIES_MONTHLY", "data/monthly", "monthly")
+    fetch_series("TIME_SERIES_WEEKLY", "weekly")
+    fetch_series("TIME_SERIES_MONTHLY", "monthly")
 
     # 2. DAILY (Ask User)
     print("\nSelect Mode for DAILY data:")
-    print("1: Update (Last 100 days - FAST)")
+    print("1: Update (only what's missing - FAST)")
     print("2: Training (Last 20 Years - SLOW, large file)")
     choice = input("Choice (1/2): ").strip()
 
     if choice == "2":
-        fetch_series("TIME_SERIES_DAILY", "data/daily", "daily", mode="full")
+        fetch_series("TIME_SERIES_DAILY", "daily", mode="full")
     else:
-        fetch_series("TIME_SERIES_DAILY", "data/daily", "daily", mode="compact")
+        fetch_series("TIME_SERIES_DAILY", "daily", mode="auto")
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,23 @@
-from flask import Flask, jsonify, request
-from collections import defaultdict
-from indicators import compute_indicators
-from signal_logic import classify_trend, classify_day_mode
-from utils import sanitize_latest_indicators, sanitize_snapshot
-from env_brain import get_environment
+from flask import Flask, Response, g, jsonify, request, stream_with_context
+import atexit
+import hmac
+import json
+import os
+import threading
+import time
+from candle_journal import CandleJournal, load_records
+from market_state import MarketState, parse_candle
+from mtf_fanout import MTFFanOut
+from scanner import DEFAULT_SCAN_TIMEFRAMES, parse_filter, scan_universe
+from schwab_live_feed import start_in_process_feed
+from shared_store import SharedCandleStore
+from signal_hub import SignalHub
+from signal_logic import classify_day_mode, score_snapshots
+from env_brain import add_daily_bar, environment_version, warm_environment
+from http_cache import dict_delta, make_etag, not_modified, parse_since, tag
+import metrics
+from metrics import REGISTRY, REQUEST_SECONDS, timed
+from request_profiler import RequestProfiler
 
 # -------------------------------------------------
 # Create the Flask app
@@ -13,9 +27,236 @@ app = Flask(__name__)
 # -------------------------------------------------
 # In-memory candle store (Multi-Timeframe Analysis)
 # -------------------------------------------------
-CANDLES = defaultdict(lambda: defaultdict(list))
 MAX_CANDLES_PER_TIMEFRAME = 300  # Keep a cap for cleanliness
 
+# Cached per-series snapshots; /scan is fastest when this covers
+# symbols x timeframes (misses recompute from the indicator engines)
+SNAPSHOT_CACHE_SIZE = int(os.environ.get("SNAPSHOT_CACHE_SIZE", "4096"))
+
+# Running more than one worker (gunicorn -w 4 app:app)? Point every
+# worker at the same shared store file so they all see the same bars:
+# CANDLE_SHARED_STORE=/dev/shm/schwab-bot.candles
+# CANDLE_SHARED_MAX_SERIES=1024  -> (symbol, timeframe) slots in the file
+# Reads are lock-free on x86 only; on ARM (Graviton, Apple silicon) they
+# take the store's file lock, so readers and the writer take turns
+SHARED_STORE_PATH = os.environ.get("CANDLE_SHARED_STORE", "")
+SHARED_MAX_SERIES = int(os.environ.get("CANDLE_SHARED_MAX_SERIES", "1024"))
+
+# Store + per-series indicator engines + 1m -> higher timeframe rollup
+if SHARED_STORE_PATH:
+    MARKET = MarketState(cache_size=SNAPSHOT_CACHE_SIZE, store=SharedCandleStore(
+        SHARED_STORE_PATH, capacity=MAX_CANDLES_PER_TIMEFRAME, max_series=SHARED_MAX_SERIES,
+    ))
+else:
+    MARKET = MarketState(capacity=MAX_CANDLES_PER_TIMEFRAME, cache_size=SNAPSHOT_CACHE_SIZE)
+CANDLES = MARKET.store
+
+# -------------------------------------------------
+# Candle journal (so a restart / deploy keeps history)
+# -------------------------------------------------
+# On by default, at data/journal/candles.journal next to this file
+# (relative paths are taken from here too, not from the working dir,
+# so starting the app from elsewhere still finds the same journal)
+# CANDLE_JOURNAL_PATH=""            -> no journal (pure memory, old behavior)
+# CANDLE_JOURNAL_FSYNC=always|interval|never
+# CANDLE_JOURNAL_FSYNC_INTERVAL=1.0 -> seconds, for "interval"
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+JOURNAL_PATH = os.environ.get("CANDLE_JOURNAL_PATH", os.path.join(DATA_DIR, "journal", "candles.journal"))
+if JOURNAL_PATH:
+    JOURNAL_PATH = os.path.join(os.path.dirname(__file__), JOURNAL_PATH)
+JOURNAL_FSYNC = os.environ.get("CANDLE_JOURNAL_FSYNC", "interval")
+JOURNAL_FSYNC_INTERVAL = float(os.environ.get("CANDLE_JOURNAL_FSYNC_INTERVAL", "1.0"))
+
+JOURNAL = None
+JOURNAL_REPLAYED = 0
+if JOURNAL_PATH:
+    # Under the write lock: with a shared store, only the first worker to
+    # start replays; the others find the bars already there
+    with CANDLES.write_lock:
+        JOURNAL = CandleJournal(JOURNAL_PATH, fsync=JOURNAL_FSYNC, fsync_interval=JOURNAL_FSYNC_INTERVAL)
+        if CANDLES.total_candles() == 0:
+            # Rebuild before attaching, so the replay isn't written back
+            JOURNAL_REPLAYED = MARKET.replay_journal(load_records(JOURNAL_PATH))
+        MARKET.journal = JOURNAL
+    atexit.register(JOURNAL.close)
+
+# -------------------------------------------------
+# /mtf-signal fan-out (timeframes + environment in parallel)
+# -------------------------------------------------
+# MTF_POOL=thread|process|none   (process needs CANDLE_SHARED_STORE)
+# MTF_POOL_WORKERS=8             -> default: 4 threads / 1 process per core
+# MTF_DEADLINE_MS=2000           -> per request; ?deadline_ms= can lower it
+MTF_POOL = os.environ.get("MTF_POOL", "thread")
+MTF_POOL_WORKERS = int(os.environ.get("MTF_POOL_WORKERS", "0")) or None
+MTF_DEADLINE_MS = int(os.environ.get("MTF_DEADLINE_MS", "2000"))
+
+MAX_BATCH_SYMBOLS = 200  # /mtf-signal/batch
+
+MTF = MTFFanOut(MARKET, kind=MTF_POOL, workers=MTF_POOL_WORKERS)
+atexit.register(MTF.shutdown)
+
+# -------------------------------------------------
+# Push channel (/stream/mtf-signal)
+# -------------------------------------------------
+# SSE_POLL_SECONDS: how often versions are re-checked for bars that
+# arrive without a local ingest (other workers on a shared store)
+SSE_POLL_SECONDS = float(os.environ.get("SSE_POLL_SECONDS", "1.0"))
+SSE_HEARTBEAT_SECONDS = 15.0
+MAX_SSE_SUBSCRIBERS = int(os.environ.get("MAX_SSE_SUBSCRIBERS", "500"))
+
+HUB = SignalHub(MARKET, poll_interval=SSE_POLL_SECONDS, max_subscribers=MAX_SSE_SUBSCRIBERS)
+MARKET.listeners.append(HUB.notify)
+atexit.register(HUB.stop)
+
+# -------------------------------------------------
+# Environment from live daily bars
+# -------------------------------------------------
+# ENV_LIVE_DAILY=1 -> every "day" bar rolled up from the 1m feed also
+# moves that symbol's environment (env_brain.add_daily_bar: daily plus
+# the forming weekly / monthly bars, no CSV reload). Off by default: the
+# feed's prices must be on the same scale as the data/ CSVs (the demo
+# feed's aren't).
+ENV_LIVE_DAILY = os.environ.get("ENV_LIVE_DAILY", "0") == "1"
+
+
+def _env_from_day_bar(symbol, timeframes):
+    if "day" not in timeframes:
+        return
+    series = MARKET.store.get(symbol, "day")
+    bar = series.last_candle() if series else None
+    if bar is None:
+        return
+    try:
+        add_daily_bar(symbol, bar)
+    except ValueError as e:  # a late bar for a day the environment moved past
+        print(f"⚠️ Environment skipped {symbol} day bar: {e}")
+
+
+if ENV_LIVE_DAILY:
+    MARKET.listeners.append(_env_from_day_bar)
+
+# -------------------------------------------------
+# In-process live feed
+# -------------------------------------------------
+# LIVE_FEED=demo -> run the (fake, for now) live feed inside this process;
+# its bars go straight into MARKET, no HTTP hop. Use it with ONE worker:
+# every gunicorn worker would start its own feed.
+LIVE_FEED = os.environ.get("LIVE_FEED", "")
+LIVE_FEED_SINK = None
+if LIVE_FEED == "demo":
+    LIVE_FEED_STOP = threading.Event()
+    _, LIVE_FEED_SINK = start_in_process_feed(MARKET, LIVE_FEED_STOP)
+    atexit.register(LIVE_FEED_STOP.set)
+elif LIVE_FEED:
+    print(f"⚠️ Unknown LIVE_FEED={LIVE_FEED!r}; no in-process feed started")
+
+# -------------------------------------------------
+# Metrics (/metrics, Prometheus text format)
+# -------------------------------------------------
+# METRICS_ENABLED=0 turns off the latency histograms (see metrics.py);
+# the scrape-time gauges below are always there
+@app.before_request
+def _start_timer():
+    if metrics.ENABLED:
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # Label by route pattern, not path, to keep the label set bounded.
+        # Streaming routes (SSE) are timed up to the response headers.
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method, str(response.status_code))
+    return response
+
+@REGISTRY.collector
+def _market_metrics():
+    yield ("schwab_bot_series_candles", "gauge", "Candles stored per series.",
+           [({"symbol": series.symbol, "timeframe": series.timeframe}, len(series)) for series in CANDLES])
+
+    cache = MARKET.snapshots.stats()
+    yield ("schwab_bot_snapshot_cache_entries", "gauge", "Cached series snapshots.",
+           [({}, cache["size"])])
+    yield ("schwab_bot_snapshot_cache_lookups_total", "counter", "Snapshot cache lookups.",
+           [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])])
+    yield ("schwab_bot_snapshot_cache_evictions_total", "counter", "Snapshot cache evictions.",
+           [({}, cache["evictions"])])
+    yield ("schwab_bot_snapshot_cache_hit_ratio", "gauge", "Snapshot cache hits / lookups.",
+           [({}, cache["hit_rate"])])
+
+    push = HUB.stats()
+    yield ("schwab_bot_sse_subscribers", "gauge", "Open /stream/mtf-signal subscriptions.",
+           [({}, push["subscribers"])])
+    yield ("schwab_bot_sse_published_total", "counter", "Push payloads computed.",
+           [({}, push["published"])])
+
+    if JOURNAL is not None:
+        yield ("schwab_bot_journal_records", "gauge", "Records in the candle journal.",
+               [({}, JOURNAL.records)])
+
+# -------------------------------------------------
+# On-demand profiling (admin only)
+# -------------------------------------------------
+# ADMIN_TOKEN=...  -> enables ?profile=1 (or X-Profile: 1) together with
+#                     the X-Admin-Token: ... header; unset = off. Header
+#                     only: query strings end up in access logs and in
+#                     the profile listing
+# PROFILE_RING_SIZE=8 -> profiles kept per route, see /debug/profiles
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+PROFILE_RING_SIZE = int(os.environ.get("PROFILE_RING_SIZE", "8"))
+
+PROFILER = RequestProfiler(per_route=PROFILE_RING_SIZE)
+
+# cProfile only sees the request thread, so profiled requests run the
+# /mtf-signal fan-out inline instead of on the pool
+MTF_INLINE = MTFFanOut(MARKET, kind="none")
+
+def _is_admin() -> bool:
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+def _fanout() -> MTFFanOut:
+    return MTF_INLINE if "profile" in g else MTF
+
+@app.before_request
+def _start_profile():
+    flag = request.args.get("profile") or request.headers.get("X-Profile") or ""
+    if flag.lower() not in ("1", "true", "yes"):
+        return None
+    if not _is_admin():
+        return jsonify({"ok": False, "error": "profiling needs a valid admin token"}), 403
+    g.profile_started = time.perf_counter()
+    g.uncached = True  # the body gets a profile added: no 304s, no ETag
+    g.profile = PROFILER.start()
+    return None
+
+@app.after_request
+def _finish_profile(response):
+    profile = g.pop("profile", None)
+    if profile is None:
+        return response
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    entry = PROFILER.finish(profile, route, request.full_path, g.profile_started)
+    response.headers["X-Profile-Id"] = str(entry["id"])
+
+    # JSON answers carry the summary inline; the full text stays in the ring
+    if response.is_json and not response.is_streamed:
+        body = response.get_json(silent=True)
+        if isinstance(body, dict):
+            body["profile"] = {k: entry[k] for k in ("id", "route", "elapsed_ms", "top_self", "focus")}
+            response.set_data(json.dumps(body))
+            # The ETag was for the body without the profile
+            del response.headers["ETag"]
+            response.headers["Cache-Control"] = "no-store"
+    return response
+
+@app.teardown_request
+def _drop_profile(exc):
+    profile = g.pop("profile", None)
+    if profile is not None:  # after_request never ran
+        profile.disable()
+
 # -------------------------------------------------
 # Basic routes (health + status)
 # -------------------------------------------------
@@ -30,13 +271,22 @@ def healthz():
 @app.route("/status")
 def status():
     # Count total stored candles across symbols/timeframes
-    total_candles = sum(len(tf_list) for symbol in CANDLES.values() for tf_list in symbol.values())
+    total_candles = CANDLES.total_candles()
     data = {
         "bot": "schwab-bot",
         "version": "0.2.0",
         "mode": "signal_only",        # later: 'live_trading'
         "schwab_connected": False,    # later: True when OAuth works
         "stored_candles": total_candles,
+        "shared_store": SHARED_STORE_PATH or None,
+        "snapshot_cache": MARKET.snapshots.stats(),
+        "push": HUB.stats(),
+        "live_feed": LIVE_FEED_SINK.stats() if LIVE_FEED_SINK else None,
+        "journal": {
+            "path": JOURNAL_PATH or None,
+            "records": JOURNAL.records if JOURNAL else 0,
+            "replayed_at_startup": JOURNAL_REPLAYED,
+        },
     }
     return jsonify(data)
 
@@ -46,7 +296,11 @@ def status():
 @app.route("/feed/candle", methods=["POST"])
 def feed_candle():
     """
-    Accepts one candle and stores it under CANDLES[symbol][timeframe].
+    Accepts one candle and stores it in CANDLES under (symbol, timeframe).
+
+    1m candles are also rolled up into the 5m/15m/30m/1h/day series
+    (regular session only). Send "rollup": false to skip that, e.g. when
+    you feed those timeframes yourself.
 
     Example JSON body:
     {
@@ -60,40 +314,111 @@ def feed_candle():
       "volume": 420000
     }
     """
-    data = request.get_json(force=True) or {}
+    with timed("feed.parse"):
+        data = request.get_json(force=True) or {}
+
+        try:
+            symbol, timeframe, ts, open_, high, low, close, volume = parse_candle(data)
+        except ValueError as e:
+            return jsonify({
+                "ok": False,
+                "error": str(e)
+            }), 400
+
+    # Append to the ring buffer (oldest bar drops out once full)
+    series, rolled = MARKET.ingest(
+        symbol, timeframe, ts, open_, high, low, close, volume,
+        rollup=bool(data.get("rollup", True)),
+    )
+
+    return jsonify({
+        "ok": True,
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "stored_count": len(series),
+        "last_candle": series.last_candle(),
+        "rolled_up": rolled,
+    })
+
+# -------------------------------------------------
+# Batch feed endpoint (backfills / replays)
+# -------------------------------------------------
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+MAX_REPORTED_ERRORS = 20
+
+
+NDJSON_CHUNK_BYTES = 1 << 16
+
+
+def _iter_ndjson(stream):
+    """
+    Yield one parsed object per non-empty line of a streamed body.
+    Lines that are not valid JSON come through as None (reported as bad rows).
 
-    symbol = str(data.get("symbol", "SPX"))
-    timeframe = str(data.get("timeframe", "1m"))
+    Reads fixed-size chunks; per-line readline() on the WSGI stream is
+    far slower than the JSON parsing itself.
+    """
+    pending = b""
+    while True:
+        chunk = stream.read(NDJSON_CHUNK_BYTES)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield from _parse_ndjson_line(line)
+    yield from _parse_ndjson_line(pending)
+
+
+def _parse_ndjson_line(line):
+    line = line.strip()
+    if not line:
+        return
+    try:
+        yield json.loads(line)
+    except ValueError:
+        yield None
+
+
+@app.route("/feed/candles", methods=["POST"])
+def feed_candles():
+    """
+    Accepts many candles in one request, any mix of symbols/timeframes.
 
-    required_keys = ["timestamp", "open", "high", "low", "close"]
-    missing = [k for k in required_keys if k not in data]
-    if missing:
+    Body is either:
+      - a JSON array of /feed/candle objects (or {"candles": [...]})
+      - NDJSON (Content-Type: application/x-ndjson), one object per line,
+        read as a stream
+
+    The whole batch is validated first; if any row is bad nothing is stored.
+    Query param rollup=0 skips the 1m -> higher timeframe rollup.
+    """
+    rollup = request.args.get("rollup", "1").lower() not in ("0", "false", "no")
+
+    if request.mimetype in NDJSON_MIMETYPES:
+        rows = _iter_ndjson(request.stream)
+    else:
+        body = request.get_json(force=True, silent=True)
+        rows = body.get("candles") if isinstance(body, dict) else body
+        if not isinstance(rows, list):
+            return jsonify({
+                "ok": False,
+                "error": "Body must be a JSON array of candles, {\"candles\": [...]}, or NDJSON."
+            }), 400
+
+    result = MARKET.ingest_batch(rows, rollup=rollup)
+
+    if result["errors"]:
         return jsonify({
             "ok": False,
-            "error": f"Missing keys: {missing}"
+            "error": f"{len(result['errors'])} invalid candle(s); nothing stored.",
+            "errors": result["errors"][:MAX_REPORTED_ERRORS],
         }), 400
 
-    candle = {
-        "timestamp": str(data["timestamp"]),
-        "timeframe": timeframe,
-        "symbol": symbol,
-        "open": float(data["open"]),
-        "high": float(data["high"]),
-        "low": float(data["low"]),
-        "close": float(data["close"]),
-        "volume": float(data.get("volume", 0.0)),
-    }
-
-    # Append to nested store and trim per timeframe
-    CANDLES[symbol][timeframe].append(candle)
-    CANDLES[symbol][timeframe] = CANDLES[symbol][timeframe][-MAX_CANDLES_PER_TIMEFRAME:]
-
     return jsonify({
         "ok": True,
-        "symbol": symbol,
-        "timeframe": timeframe,
-        "stored_count": len(CANDLES[symbol][timeframe]),
-        "last_candle": candle
+        "ingested": result["ingested"],
+        "series": result["series"],
     })
 
 # -------------------------------------------------
@@ -107,35 +432,13 @@ def analysis():
     Query params:
       symbol: e.g. "SPX" (defaults to "SPX")
       timeframe: e.g. "1m", "5m", "15m" (defaults to "1m")
+      since_version: optional, only return what changed since that version
+
+    Send If-None-Match with the last ETag to get a 304 when nothing changed.
     """
     symbol = request.args.get("symbol", "SPX")
     timeframe = request.args.get("timeframe", "1m")
-
-    candles_for_tf = CANDLES.get(symbol, {}).get(timeframe, [])
-
-    if not candles_for_tf:
-        return jsonify({
-            "ok": False,
-            "error": f"No candles stored for symbol '{symbol}' and timeframe '{timeframe}' yet."
-        }), 400
-
-    latest, _all_rows = compute_indicators(candles_for_tf)
-
-    if latest is None:
-        return jsonify({
-            "ok": False,
-            "error": "Not enough data to compute indicators."
-        }), 400
-
-    clean_latest = sanitize_latest_indicators(latest)
-
-    return jsonify({
-        "ok": True,
-        "symbol": symbol,
-        "timeframe": timeframe,
-        "candle_count": len(candles_for_tf),
-        "latest": clean_latest
-    })
+    return _series_response("analysis", symbol, timeframe, ["candle_count", "latest"])
 
 # -------------------------------------------------
 # Signal endpoint (trend classification)
@@ -145,31 +448,70 @@ def signal():
     """Returns latest indicators and classified trend for the requested symbol/timeframe."""
     symbol = request.args.get("symbol", "SPX")
     timeframe = request.args.get("timeframe", "1m")
+    return _series_response("signal", symbol, timeframe, ["latest", "signal"])
 
-    candles_for_tf = CANDLES.get(symbol, {}).get(timeframe, [])
+
+def _series_response(route, symbol, timeframe, fields):
+    """
+    Shared body of /analysis and /signal: the snapshot fields, tagged with
+    an ETag from the series version (304 on If-None-Match without
+    computing anything), or just the changed fields for since_version.
+    """
+    candles_for_tf = CANDLES.get(symbol, timeframe)
     if not candles_for_tf:
         return jsonify({
             "ok": False,
             "error": f"No candles stored for symbol '{symbol}' and timeframe '{timeframe}' yet."
         }), 400
 
-    latest, _all_rows = compute_indicators(candles_for_tf)
-    if latest is None:
+    version = candles_for_tf.version
+    since = request.args.get("since_version")
+    etag = make_etag(CANDLES.epoch, route, (symbol, timeframe, since), {timeframe: version})
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({"ok": False, "error": "since_version must be an integer"}), 400
+
+    snap = MARKET.snapshot(symbol, timeframe)
+    if snap is None:
         return jsonify({
             "ok": False,
             "error": "Not enough data to compute indicators."
         }), 400
 
-    clean_latest = sanitize_latest_indicators(latest)
-    signal_data = classify_trend(clean_latest)
+    body = {"ok": True, "symbol": symbol, "timeframe": timeframe, "version": version}
+    for field in fields:
+        body[field] = snap[field]
+
+    if since is not None:
+        body["since_version"] = since
+        old = MARKET.snapshot_at(symbol, timeframe, since)
+        if since == version:
+            for field in fields:
+                del body[field]
+            body["unchanged"] = True
+        elif old is not None:
+            # Only what moved; "removed" lists keys that disappeared
+            removed = {}
+            for field in fields:
+                if isinstance(snap[field], dict):
+                    body[field], gone = dict_delta(old[field], snap[field])
+                    if gone:
+                        removed[field] = gone
+                elif old[field] == snap[field]:
+                    del body[field]
+            body["delta"] = True
+            if removed:
+                body["removed"] = removed
+        else:
+            body["delta"] = False  # too old to diff against: full response
 
-    return jsonify({
-        "ok": True,
-        "symbol": symbol,
-        "timeframe": timeframe,
-        "latest": clean_latest,
-        "signal": signal_data,
-    })
+    return tag(jsonify(body), etag)
 
 # -------------------------------------------------
 # Multi-Timeframe Signal endpoint (MTA)
@@ -183,49 +525,292 @@ def mtf_signal():
         return jsonify({"ok": False, "error": "symbol and timeframes are required"}), 400
 
     tf_list = [tf.strip() for tf in tf_param.split(",") if tf.strip()]
-    timeframes_data = {}
-
-    for tf in tf_list:
-        candles_for_tf = CANDLES.get(symbol, {}).get(tf, [])
-        if not candles_for_tf:
-            timeframes_data[tf] = None
-            continue
-
-        latest_indicators, _ = compute_indicators(candles_for_tf)
-        if latest_indicators is None:
-            timeframes_data[tf] = None
-            continue
-
-        latest_candle = candles_for_tf[-1]
-        snapshot = sanitize_snapshot(latest_candle, latest_indicators)
-
-        trend_info = classify_trend(snapshot)
-        if isinstance(trend_info, dict):
-            snapshot["trend_label"] = trend_info.get("trend")
-            snapshot["trend_strength"] = trend_info.get("strength")
-            snapshot["trend_reason"] = trend_info.get("reason")
-        else:
-            # If classify_trend returns just a string like "BULLISH"/"BEARISH"/"CHOP"
-            snapshot["trend_label"] = trend_info
 
-        timeframes_data[tf] = snapshot
+    # Everything the answer depends on; same versions -> same answer
+    versions = {tf: MARKET.version(symbol, tf) for tf in tf_list}
+    versions["environment"] = environment_version(symbol)
+    since_param = request.args.get("since")
+    etag = make_etag(CANDLES.epoch, "mtf-signal", (symbol, tuple(tf_list), since_param), versions)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    try:
+        since = parse_since(since_param) if since_param is not None else None
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    try:
+        deadline_ms = min(int(request.args.get("deadline_ms", MTF_DEADLINE_MS)), MTF_DEADLINE_MS)
+    except ValueError:
+        return jsonify({"ok": False, "error": "deadline_ms must be an integer"}), 400
+
+    # Per-timeframe snapshots + environment (daily/weekly/monthly context),
+    # concurrently; anything past the deadline comes back as None
+    fanout = _fanout().run(symbol, tf_list, deadline=max(deadline_ms, 0) / 1000.0)
+    timeframes_data = fanout["timeframes"]
 
     day_mode_info = classify_day_mode(timeframes_data)
 
-    # Get environment data (daily/weekly/monthly context)
-    environment_data = get_environment(symbol)
-
-    return jsonify({
+    response = {
         "ok": True,
         "symbol": symbol,
         "timeframes": timeframes_data,
         "day_mode": day_mode_info.get("day_mode"),
         "day_mode_reason": day_mode_info.get("reason"),
-        "environment": environment_data
-    })
+        "environment": fanout["environment"],
+        "versions": versions,
+    }
+    if since is not None:
+        _apply_mtf_since(response, symbol, since)
+    if fanout["timed_out"]:
+        response["partial"] = True
+        response["timed_out"] = fanout["timed_out"]
+    if fanout.get("errors"):
+        response["errors"] = fanout["errors"]
+    if response.get("partial") or response.get("errors"):
+        return jsonify(response)  # not cacheable
+    return tag(jsonify(response), etag)
+
+
+def _apply_mtf_since(response, symbol, since):
+    """
+    Trim an /mtf-signal response to what changed since the versions the
+    client sent (?since=5m:12,1h:3,environment:ab12cd34).
+    Unchanged timeframes are dropped, changed ones carry only their
+    changed fields when the old snapshot is still cached.
+    """
+    versions = response["versions"]
+    timeframes_data = response["timeframes"]
+    unchanged = []
+    delta = []
+
+    for tf, have in since.items():
+        if tf == "environment" or tf not in timeframes_data:
+            continue
+        if have == str(versions[tf]):
+            del timeframes_data[tf]
+            unchanged.append(tf)
+            continue
+        try:
+            old = MARKET.snapshot_at(symbol, tf, int(have))
+        except ValueError:
+            old = None
+        if old and old["mtf"] and timeframes_data[tf]:
+            timeframes_data[tf], _gone = dict_delta(old["mtf"], timeframes_data[tf])
+            delta.append(tf)
+
+    if since.get("environment") == versions["environment"]:
+        del response["environment"]
+        unchanged.append("environment")
+
+    response["unchanged"] = unchanged
+    response["delta_timeframes"] = delta
+
+@app.route("/mtf-signal/batch", methods=["GET", "POST"])
+def mtf_signal_batch():
+    """
+    /mtf-signal for many symbols in one request.
+
+    GET  /mtf-signal/batch?symbols=SPX,QQQ,IWM&timeframes=5m,15m,1h,day
+    POST {"symbols": ["SPX", "QQQ"], "timeframes": ["5m", "1h", "day"],
+          "environment": true}
+
+    Every symbol x timeframe is scored in one vectorized pass and the
+    environment loads run concurrently, all under one deadline
+    (deadline_ms, like /mtf-signal).
+    """
+    if request.method == "POST":
+        body = request.get_json(force=True, silent=True)
+        if not isinstance(body, dict):
+            return jsonify({"ok": False, "error": "Body must be a JSON object"}), 400
+        params = body
+    else:
+        params = request.args
+
+    def as_list(value):
+        if isinstance(value, str):
+            value = value.split(",")
+        if not isinstance(value, list):
+            return []
+        return list(dict.fromkeys(str(v).strip() for v in value if str(v).strip()))
+
+    symbols = as_list(params.get("symbols"))
+    tf_list = as_list(params.get("timeframes"))
+    if not symbols or not tf_list:
+        return jsonify({"ok": False, "error": "symbols and timeframes are required"}), 400
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({"ok": False, "error": f"At most {MAX_BATCH_SYMBOLS} symbols per request"}), 400
+
+    environment = str(params.get("environment", "true")).lower() not in ("0", "false", "no")
+    try:
+        deadline_ms = min(int(params.get("deadline_ms", MTF_DEADLINE_MS)), MTF_DEADLINE_MS)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "deadline_ms must be an integer"}), 400
+
+    fanout = _fanout().run_many(symbols, tf_list, deadline=max(deadline_ms, 0) / 1000.0, environment=environment)
+
+    # Score every (symbol, timeframe) snapshot at once
+    present = [
+        (symbol, tf, snap)
+        for symbol in symbols
+        for tf, snap in fanout["symbols"][symbol]["timeframes"].items()
+        if snap
+    ]
+    scores = {}
+    for (symbol, tf, _snap), score in zip(present, score_snapshots([snap for _s, _tf, snap in present])):
+        scores.setdefault(symbol, {})[tf] = score
+
+    results = {}
+    for symbol in symbols:
+        part = fanout["symbols"][symbol]
+        symbol_scores = scores.get(symbol, {})
+        day_mode_info = classify_day_mode(part["timeframes"], scores=symbol_scores)
+        results[symbol] = {
+            "timeframes": part["timeframes"],
+            "scores": symbol_scores,
+            "day_mode": day_mode_info.get("day_mode"),
+            "day_mode_reason": day_mode_info.get("reason"),
+            "environment": part["environment"],
+        }
+
+    response = {
+        "ok": True,
+        "symbols": symbols,
+        "timeframes": tf_list,
+        "results": results,
+    }
+    if fanout["timed_out"]:
+        response["partial"] = True
+        response["timed_out"] = fanout["timed_out"]
+    if fanout["errors"]:
+        response["errors"] = fanout["errors"]
+    return jsonify(response)
+
+@app.route("/stream/mtf-signal", methods=["GET"])
+def stream_mtf_signal():
+    """
+    Server-Sent Events version of /mtf-signal.
+
+    GET /stream/mtf-signal?symbol=SPX&timeframes=5m,15m,1h,day
+
+    Sends the current state right away, then a new "signal" event every
+    time a bar changes one of those series (snapshots, trend_labels,
+    day_mode, and which timeframes changed). Comment heartbeats keep
+    proxies from closing an idle stream. Reconnecting clients just get
+    the current state again.
+
+    Each open stream holds a server thread: run threaded (the dev server
+    does) or with gunicorn's gthread / gevent workers.
+    """
+    symbol = request.args.get("symbol")
+    tf_param = request.args.get("timeframes")
+    if not symbol or not tf_param:
+        return jsonify({"ok": False, "error": "symbol and timeframes are required"}), 400
+    tf_list = [tf.strip() for tf in tf_param.split(",") if tf.strip()]
+
+    try:
+        sub = HUB.subscribe(symbol, tf_list)
+    except RuntimeError as e:
+        return jsonify({"ok": False, "error": str(e)}), 503
+
+    def events():
+        last_id = 0
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                item = sub.wait(last_id, timeout=SSE_HEARTBEAT_SECONDS)
+                if sub.closed:
+                    return
+                if item is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                last_id, payload = item
+                yield f"id: {last_id}\nevent: signal\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            HUB.unsubscribe(sub)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# -------------------------------------------------
+# Universe scanner
+# -------------------------------------------------
+@app.route("/scan", methods=["GET"])
+def scan():
+    """
+    Rank every stored symbol by its score on one timeframe.
+
+    /scan?timeframe=day&n=10
+         &timeframes=5m,15m,30m,1h,day     (used for day_mode)
+         &filter=SQUEEZE_ON==true&filter=DIST_EMA20_PCT>1.5
+         &day_mode=KILL,SCALP_ONLY
+         &symbols=SPX,QQQ                  (optional, default: all stored)
+
+    Returns the top N and bottom N rows (best first / worst first).
+    """
+    timeframe = request.args.get("timeframe", "day").strip()
+    tf_param = request.args.get("timeframes")
+    timeframes = [tf.strip() for tf in tf_param.split(",") if tf.strip()] if tf_param else DEFAULT_SCAN_TIMEFRAMES
+
+    try:
+        n = int(request.args.get("n", 10))
+    except ValueError:
+        return jsonify({"ok": False, "error": "n must be an integer"}), 400
+
+    try:
+        filters = [parse_filter(f) for f in request.args.getlist("filter")]
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    day_modes = {m.strip().upper() for m in request.args.get("day_mode", "").split(",") if m.strip()}
+    symbols_param = request.args.get("symbols")
+    symbols = [s.strip() for s in symbols_param.split(",") if s.strip()] if symbols_param else None
+
+    result = scan_universe(
+        MARKET, timeframe, timeframes, n=n, filters=filters,
+        day_modes=day_modes or None, symbols=symbols,
+    )
+    return jsonify({"ok": True, **result})
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """
+    Prometheus scrape target: per-route latency, per-stage timers
+    (feed parse, ingest, indicators, environment), store sizes, caches.
+    """
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/debug/profiles", methods=["GET"])
+def list_profiles():
+    """
+    Stored request profiles (newest first), optionally for one route:
+    /debug/profiles?route=/mtf-signal
+    """
+    if not _is_admin():
+        return jsonify({"ok": False, "error": "admin token required"}), 403
+    return jsonify({"ok": True, "profiles": PROFILER.list(request.args.get("route"))})
+
+@app.route("/debug/profiles/<int:profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    """
+    One stored profile; ?format=text returns the pstats listing.
+    """
+    if not _is_admin():
+        return jsonify({"ok": False, "error": "admin token required"}), 403
+    entry = PROFILER.get(profile_id)
+    if entry is None:
+        return jsonify({"ok": False, "error": f"No profile {profile_id} (ring buffers keep {PROFILE_RING_SIZE} per route)"}), 404
+    if request.args.get("format") == "text":
+        return Response(entry["text"], mimetype="text/plain")
+    return jsonify({"ok": True, "profile": entry})
 
 # -------------------------------------------------
 # Local dev entry point (Render ignores this)
 # -------------------------------------------------
 if __name__ == "__main__":
+    warm_environment()
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,364 @@
+import json
+
+import pytest
+
+import app as bot
+from candle_store import format_epoch, to_epoch
+
+
+@pytest.fixture
+def client():
+    return bot.app.test_client()
+
+
+def minute_rows(symbol, n, start="2025-11-26T09:30:00", price=100.0, timeframe="1m"):
+    """
+    /feed/candle bodies one minute apart.
+    """
+    first = to_epoch(start)
+    rows = []
+    for i in range(n):
+        close = price + (i % 7) - 3 + i * 0.1
+        rows.append({
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "timestamp": format_epoch(first + 60 * i),
+            "open": close - 0.2,
+            "high": close + 0.5,
+            "low": close - 0.5,
+            "close": close,
+            "volume": 1000 + i,
+        })
+    return rows
+
+
+def ndjson(rows) -> str:
+    return "".join((row if isinstance(row, str) else json.dumps(row)) + "\n" for row in rows)
+
+
+# -----------------------------
+# /feed/candles
+# -----------------------------
+def test_ndjson_batch_is_stored(client, monkeypatch):
+    monkeypatch.setattr(bot, "NDJSON_CHUNK_BYTES", 7)  # lines split across reads
+    rows = minute_rows("NDJ1", 30) + minute_rows("NDJ2", 5, timeframe="5m")
+    body = ndjson(rows[:10]) + "\n  \n" + ndjson(rows[10:]).rstrip("\n")  # blank lines, no final newline
+    r = client.post("/feed/candles", data=body, content_type="application/x-ndjson")
+
+    assert r.status_code == 200, r.get_json()
+    out = r.get_json()
+    assert out["ingested"] == 35
+    series = {(s["symbol"], s["timeframe"]): s for s in out["series"]}
+    assert series[("NDJ1", "1m")]["count"] == 30 and series[("NDJ2", "5m")]["count"] == 5
+    assert "5m" in series[("NDJ1", "1m")]["rolled_up"]
+    assert [c["close"] for c in bot.CANDLES.get("NDJ1", "1m").candles()] == [row["close"] for row in rows[:30]]
+
+
+def test_ndjson_partial_errors_store_nothing(client):
+    rows = minute_rows("NDJBAD", 6)
+    lines = [
+        rows[0],
+        "{not json",
+        {k: v for k, v in rows[2].items() if k != "close"},
+        dict(rows[3], high="lots"),
+        rows[4],
+        dict(rows[5], timestamp="yesterday"),
+    ]
+    r = client.post("/feed/candles", data=ndjson(lines), content_type="application/x-ndjson")
+
+    assert r.status_code == 400
+    out = r.get_json()
+    assert out["ok"] is False and out["error"].startswith("4 invalid candle(s)")
+    errors = {e["index"]: e["error"] for e in out["errors"]}
+    assert sorted(errors) == [1, 2, 3, 5]
+    assert "Missing keys: ['close']" in errors[2]
+    assert "must be numbers" in errors[3]
+    assert "Bad timestamp" in errors[5]
+    assert bot.CANDLES.get("NDJBAD", "1m") is None
+
+
+def test_error_list_is_capped(client):
+    lines = ["nope"] * (bot.MAX_REPORTED_ERRORS + 5)
+    out = client.post("/feed/candles", data=ndjson(lines), content_type="application/x-ndjson").get_json()
+    assert out["error"].startswith(f"{bot.MAX_REPORTED_ERRORS + 5} invalid")
+    assert len(out["errors"]) == bot.MAX_REPORTED_ERRORS
+
+
+def test_json_bodies(client):
+    rows = minute_rows("JSB", 4)
+    assert client.post("/feed/candles", json=rows[:2]).get_json()["ingested"] == 2
+    assert client.post("/feed/candles?rollup=0", json={"candles": rows[2:]}).get_json()["series"][0]["rolled_up"] == []
+    assert len(bot.CANDLES.get("JSB", "1m")) == 4
+
+    r = client.post("/feed/candles", json={"rows": rows})
+    assert r.status_code == 400 and "JSON array" in r.get_json()["error"]
+
+
+# -----------------------------
+# /mtf-signal/batch
+# -----------------------------
+def feed(client, rows):
+    r = client.post("/feed/candles", json=rows)
+    assert r.status_code == 200, r.get_json()
+
+
+def test_batch_partial_results(client):
+    feed(client, minute_rows("BAT1", 90))
+    feed(client, minute_rows("BAT2", 90, price=50.0))
+
+    r = client.post("/mtf-signal/batch", json={
+        "symbols": ["BAT1", "BAT2", "BATNONE"], "timeframes": ["1m", "5m", "15m"], "environment": False,
+    })
+    assert r.status_code == 200
+    out = r.get_json()
+    assert out["symbols"] == ["BAT1", "BAT2", "BATNONE"] and "partial" not in out
+
+    for symbol in ("BAT1", "BAT2"):
+        result = out["results"][symbol]
+        assert set(result["timeframes"]) == {"1m", "5m", "15m"}
+        assert all(result["timeframes"].values())
+        assert set(result["scores"]) == {"1m", "5m", "15m"}
+        # Same answer as the single-symbol route
+        single = client.get(f"/mtf-signal?symbol={symbol}&timeframes=1m,5m,15m").get_json()
+        assert result["day_mode"] == single["day_mode"]
+        assert json.dumps(result["timeframes"], sort_keys=True) == json.dumps(single["timeframes"], sort_keys=True)
+
+    # Unknown symbol: empty slots, not an error
+    missing = out["results"]["BATNONE"]
+    assert missing["timeframes"] == {"1m": None, "5m": None, "15m": None}
+    assert missing["scores"] == {} and missing["day_mode"] is None
+
+    # GET form, duplicates dropped
+    out = client.get("/mtf-signal/batch?symbols=BAT1,BAT1,BAT2&timeframes=5m&environment=0").get_json()
+    assert out["symbols"] == ["BAT1", "BAT2"]
+
+
+def test_batch_environment_timeout(client, monkeypatch):
+    import time
+
+    import mtf_fanout
+
+    feed(client, minute_rows("BATSLOW", 30))
+
+    def slow_environment(symbol):
+        time.sleep(0.5)
+        return {"symbol": symbol}
+
+    monkeypatch.setattr(mtf_fanout, "get_environment", slow_environment)
+    r = client.get("/mtf-signal/batch?symbols=BATSLOW&timeframes=1m,5m&deadline_ms=100")
+    out = r.get_json()
+    assert r.status_code == 200
+    assert out["partial"] is True
+    assert out["timed_out"] == {"BATSLOW": ["environment"]}
+    result = out["results"]["BATSLOW"]
+    assert result["environment"] is None
+    assert result["timeframes"]["1m"] is not None  # the snapshots still made it
+
+
+def test_batch_environment_errors_are_per_symbol(client):
+    feed(client, minute_rows("BATNOENV", 30))
+    out = client.get("/mtf-signal/batch?symbols=BATNOENV&timeframes=1m").get_json()
+    assert "FileNotFoundError" in out["errors"]["BATNOENV"]["environment"]
+    assert out["results"]["BATNOENV"]["timeframes"]["1m"] is not None
+
+
+@pytest.mark.parametrize("query, error", [
+    ("timeframes=1m", "symbols and timeframes are required"),
+    ("symbols=A&timeframes=1m&deadline_ms=soon", "deadline_ms must be an integer"),
+    ("symbols=" + ",".join(f"S{i}" for i in range(201)) + "&timeframes=1m", "At most 200 symbols"),
+])
+def test_batch_rejects_bad_requests(client, query, error):
+    r = client.get(f"/mtf-signal/batch?{query}")
+    assert r.status_code == 400 and error in r.get_json()["error"]
+
+
+# -----------------------------
+# /stream/mtf-signal
+# -----------------------------
+def next_event(chunks) -> dict:
+    """
+    Next "signal" event off an SSE body, skipping retry / keep-alive lines.
+    """
+    for chunk in chunks:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        fields = dict(line.split(": ", 1) for line in text.strip().splitlines() if not line.startswith(":") and ": " in line)
+        if fields.get("event") == "signal":
+            return {"id": int(fields["id"]), "data": json.loads(fields["data"])}
+    raise AssertionError("stream ended")
+
+
+def test_stream_pushes_after_an_ingest(client, monkeypatch):
+    monkeypatch.setattr(bot, "SSE_HEARTBEAT_SECONDS", 0.05)
+    rows = minute_rows("SSE1", 40)
+    feed(client, rows[:30])
+
+    r = client.get("/stream/mtf-signal?symbol=SSE1&timeframes=1m,5m", buffered=False)
+    assert r.status_code == 200 and r.mimetype == "text/event-stream"
+    chunks = iter(r.response)
+    try:
+        first = next_event(chunks)
+        assert first["data"]["symbol"] == "SSE1"
+        assert first["data"]["changed"] == ["1m", "5m"]
+        assert first["data"]["timeframes"]["1m"]["close"] == rows[29]["close"]
+
+        r2 = client.post("/feed/candle", json=rows[30])
+        assert r2.status_code == 200
+
+        second = next_event(chunks)
+        assert second["id"] > first["id"]
+        assert "1m" in second["data"]["changed"]
+        assert second["data"]["versions"]["1m"] > first["data"]["versions"]["1m"]
+        assert second["data"]["timeframes"]["1m"]["close"] == rows[30]["close"]
+    finally:
+        r.close()
+    assert bot.HUB.stats()["subscribers"] == 0
+
+
+def test_stream_requires_symbol_and_timeframes(client):
+    r = client.get("/stream/mtf-signal?symbol=SSE1")
+    assert r.status_code == 400
+
+
+# -----------------------------
+# ETags and since deltas
+# -----------------------------
+def test_analysis_etag_and_since_version(client):
+    rows = minute_rows("ETAG1", 40)
+    feed(client, rows[:30])
+
+    r = client.get("/analysis?symbol=ETAG1&timeframe=1m")
+    etag = r.headers["ETag"]
+    version = r.get_json()["version"]
+    assert r.status_code == 200 and r.headers["Cache-Control"] == "no-cache"
+
+    r = client.get("/analysis?symbol=ETAG1&timeframe=1m", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.headers["ETag"] == etag and not r.data
+
+    # Same ETag, other route: no match
+    r = client.get("/signal?symbol=ETAG1&timeframe=1m", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+
+    r = client.get(f"/analysis?symbol=ETAG1&timeframe=1m&since_version={version}")
+    assert r.get_json()["unchanged"] is True and "latest" not in r.get_json()
+
+    feed(client, rows[30:31])
+    r = client.get("/analysis?symbol=ETAG1&timeframe=1m", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["ETag"] != etag
+    full = r.get_json()
+    assert full["version"] > version
+
+    delta = client.get(f"/analysis?symbol=ETAG1&timeframe=1m&since_version={version}").get_json()
+    assert delta["delta"] is True and delta["since_version"] == version
+    assert delta["candle_count"] == full["candle_count"] == 31
+    assert delta["latest"]
+    assert all(full["latest"][k] == v for k, v in delta["latest"].items())
+    assert len(delta["latest"]) < len(full["latest"])  # only what moved
+
+    r = client.get("/analysis?symbol=ETAG1&timeframe=1m&since_version=x")
+    assert r.status_code == 400
+
+
+def test_mtf_signal_etag_and_since(client):
+    rows = minute_rows("SPX", 40, start="2025-11-24T09:30:00")
+    feed(client, rows[:30])
+    url = "/mtf-signal?symbol=SPX&timeframes=1m,5m"
+    client.get(url)  # loads the environment
+
+    r = client.get(url)
+    assert r.status_code == 200 and r.get_json()["environment"]
+    etag, versions = r.headers["ETag"], r.get_json()["versions"]
+
+    r = client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 304
+
+    feed(client, rows[30:31])
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+    since = ",".join(f"{tf}:{v}" for tf, v in versions.items())
+    out = client.get(f"{url}&since={since}").get_json()
+    assert out["delta_timeframes"] == ["1m", "5m"]  # the new minute also moved the forming 5m bar
+    assert out["unchanged"] == ["environment"] and "environment" not in out
+    assert out["timeframes"]["1m"]["close"] == rows[30]["close"]
+    assert "symbol" not in out["timeframes"]["1m"]  # only the fields that moved
+
+    out = client.get(f"{url}&since=1m:{out['versions']['1m']},5m:{out['versions']['5m']}").get_json()
+    assert out["unchanged"] == ["1m", "5m"] and out["timeframes"] == {}
+
+
+# -----------------------------
+# /metrics
+# -----------------------------
+def scrape(client, sample: str) -> float:
+    """
+    Value of one sample line ("name{labels}") off /metrics, 0 if absent.
+    """
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.mimetype == "text/plain"
+    for line in r.get_data(as_text=True).splitlines():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_metrics_counters_increment(client):
+    healthz = 'schwab_bot_request_seconds_count{route="/healthz",method="GET",status="200"}'
+    parse = 'schwab_bot_stage_seconds_count{stage="feed.parse"}'
+    apply = 'schwab_bot_stage_seconds_count{stage="ingest.apply"}'
+    candles = 'schwab_bot_series_candles{symbol="MET1",timeframe="1m"}'
+    before = {name: scrape(client, name) for name in (healthz, parse, apply)}
+
+    for _ in range(3):
+        assert client.get("/healthz").status_code == 200
+    rows = minute_rows("MET1", 5)
+    feed(client, rows[:4])
+    assert client.post("/feed/candle", json=rows[4]).status_code == 200
+
+    assert scrape(client, healthz) == before[healthz] + 3
+    assert scrape(client, parse) == before[parse] + 1  # /feed/candle only
+    assert scrape(client, apply) >= before[apply] + 2
+    assert scrape(client, candles) == 5
+
+
+# -----------------------------
+# Profiling
+# -----------------------------
+def test_profiling_needs_the_admin_header(client, monkeypatch):
+    monkeypatch.setattr(bot, "ADMIN_TOKEN", "s3cret")
+    feed(client, minute_rows("PROF1", 30))
+    url = "/analysis?symbol=PROF1&timeframe=1m"
+
+    assert client.get(url + "&profile=1").status_code == 403
+    assert client.get(url, headers={"X-Profile": "1"}).status_code == 403
+    assert client.get(url + "&profile=1", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/debug/profiles").status_code == 403
+    assert client.get("/debug/profiles", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+    # No token configured: always off
+    monkeypatch.setattr(bot, "ADMIN_TOKEN", "")
+    assert client.get(url + "&profile=1", headers={"X-Admin-Token": ""}).status_code == 403
+
+
+def test_profiled_bodies_are_not_tagged(client, monkeypatch):
+    monkeypatch.setattr(bot, "ADMIN_TOKEN", "s3cret")
+    feed(client, minute_rows("PROF2", 30))
+    url = "/analysis?symbol=PROF2&timeframe=1m"
+    etag = client.get(url).headers["ETag"]
+    admin = {"X-Admin-Token": "s3cret"}
+
+    # A matching ETag still gets the full, profiled body
+    r = client.get(url + "&profile=1", headers={**admin, "If-None-Match": etag})
+    assert r.status_code == 200
+    body = r.get_json()
+    assert body["ok"] is True and body["latest"]
+    assert body["profile"]["id"] == int(r.headers["X-Profile-Id"])
+    assert body["profile"]["route"] == "/analysis"
+    assert "ETag" not in r.headers
+    assert r.headers["Cache-Control"] == "no-store"
+
+    listed = client.get("/debug/profiles?route=/analysis", headers=admin).get_json()["profiles"]
+    assert listed[0]["id"] == body["profile"]["id"]
+    r = client.get(f"/debug/profiles/{body['profile']['id']}?format=text", headers=admin)
+    assert r.status_code == 200 and r.mimetype == "text/plain"
+
+    # Unprofiled requests are cached as before
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
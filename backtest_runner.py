@@ -0,0 +1,164 @@
+import argparse
+import glob
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from candle_store import format_epoch
+from replay_engine import DEFAULT_TIMEFRAMES, load_minute_csv, replay_in_process, write_timeline
+
+# This file runs the in-process replay over MANY session CSVs at once.
+#
+# Each session is independent (fresh MarketState), so the days are sharded
+# across a ProcessPoolExecutor, one process per core. Workers send back a
+# small summary per day (not the per-bar timeline) and the parent merges:
+# - day-mode distribution (final mode per day, and bars spent in each mode)
+# - time of day of KILL flips
+# - per-day wall time
+#
+# Usage:
+#   python backtest_runner.py "minute_data/SPX_*_1m.csv" --workers 8 --out summary.json
+
+
+def find_sessions(pattern: str) -> list:
+    """
+    A directory (all *.csv inside) or a glob pattern -> sorted file list.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.csv")
+    return sorted(glob.glob(pattern))
+
+
+def run_session(path: str, symbol: str = "SPX", timeframes=None, timeline_dir: str = None) -> dict:
+    """
+    Replay one session CSV and summarize it. Runs inside a worker process.
+    """
+    started = time.perf_counter()
+    try:
+        bars = load_minute_csv(path)
+        result = replay_in_process(bars, symbol, timeframes)
+    except Exception as e:  # one bad file shouldn't sink the whole run
+        return {"file": path, "error": f"{type(e).__name__}: {e}"}
+
+    modes = Counter()
+    kill_flips = []
+    prev_mode = None
+    for ts, _close, mode, _reason, _labels in result["timeline"]:
+        modes[str(mode)] += 1
+        if mode == "KILL" and prev_mode != "KILL":
+            kill_flips.append(format_epoch(ts)[11:16])
+        prev_mode = mode
+
+    if timeline_dir:
+        name = os.path.splitext(os.path.basename(path))[0]
+        write_timeline(result, os.path.join(timeline_dir, f"{name}_timeline.csv"), timeframes)
+
+    first_ts = result["timeline"][0][0] if result["timeline"] else None
+    return {
+        "file": path,
+        "session": format_epoch(first_ts)[:10] if first_ts is not None else None,
+        "bars": result["bars"],
+        "final_mode": result["final_mode"],
+        "bar_modes": dict(modes),
+        "kill_flips": kill_flips,
+        "wall_time": time.perf_counter() - started,
+    }
+
+
+def merge_summaries(days: list) -> dict:
+    """
+    Merge per-day summaries into one report.
+    """
+    ok = [d for d in days if "error" not in d]
+    final_modes = Counter(str(d["final_mode"]) for d in ok)
+    bar_modes = Counter()
+    flip_times = Counter()
+    for d in ok:
+        bar_modes.update(d["bar_modes"])
+        flip_times.update(d["kill_flips"])
+
+    wall = [d["wall_time"] for d in ok]
+    return {
+        "sessions": len(ok),
+        "failed": [{"file": d["file"], "error": d["error"]} for d in days if "error" in d],
+        "final_day_mode": dict(final_modes),
+        "bar_day_mode": dict(bar_modes),
+        "kill_flip_times": dict(sorted(flip_times.items())),
+        "days_with_kill": sum(1 for d in ok if d["kill_flips"]),
+        "wall_time_total": sum(wall),
+        "wall_time_max": max(wall) if wall else 0.0,
+        "per_day": [
+            {k: d[k] for k in ("session", "file", "bars", "final_mode", "kill_flips", "wall_time")}
+            for d in sorted(ok, key=lambda d: d["session"] or "")
+        ],
+    }
+
+
+def run_backtest(paths: list, symbol: str = "SPX", timeframes=None, workers: int = None,
+                 timeline_dir: str = None) -> dict:
+    """
+    Replay every session in paths across a process pool and merge the results.
+    workers=1 runs in this process (handy for debugging / profiling).
+    """
+    timeframes = list(timeframes or DEFAULT_TIMEFRAMES)
+    workers = workers or os.cpu_count() or 1
+    if timeline_dir:
+        os.makedirs(timeline_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    if workers == 1 or len(paths) <= 1:
+        days = [run_session(p, symbol, timeframes, timeline_dir) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_session, p, symbol, timeframes, timeline_dir) for p in paths]
+            days = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+
+    summary = merge_summaries(days)
+    summary["workers"] = workers
+    summary["elapsed"] = elapsed
+    # > 1 means the pool is actually overlapping work
+    summary["speedup"] = summary["wall_time_total"] / elapsed if elapsed > 0 else None
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay many 1-minute sessions in parallel.")
+    parser.add_argument("sessions", help="directory of session CSVs, or a glob like 'data/minute/SPX_*_1m.csv'")
+    parser.add_argument("--symbol", default="SPX")
+    parser.add_argument("--timeframes", default=",".join(DEFAULT_TIMEFRAMES))
+    parser.add_argument("--workers", type=int, default=None, help="default: all cores")
+    parser.add_argument("--timelines", default=None, help="folder to write per-day timeline CSVs")
+    parser.add_argument("--out", default=None, help="write the merged summary JSON here")
+    args = parser.parse_args()
+
+    paths = find_sessions(args.sessions)
+    if not paths:
+        print(f"No session CSVs match {args.sessions!r}")
+        return
+
+    timeframes = [tf.strip() for tf in args.timeframes.split(",") if tf.strip()]
+    print(f"Replaying {len(paths)} sessions on {args.workers or os.cpu_count()} workers…")
+    summary = run_backtest(paths, args.symbol, timeframes, args.workers, args.timelines)
+
+    print(f"\nDone in {summary['elapsed']:.2f}s (speedup x{summary['speedup']:.1f})")
+    print(f"Final day mode:  {summary['final_day_mode']}")
+    print(f"Bars per mode:   {summary['bar_day_mode']}")
+    print(f"Days with KILL:  {summary['days_with_kill']}")
+    if summary["kill_flip_times"]:
+        print("KILL flips by time of day:")
+        for hhmm, n in summary["kill_flip_times"].items():
+            print(f"  {hhmm}  {n}")
+    for failed in summary["failed"]:
+        print(f"⚠️ {failed['file']}: {failed['error']}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nSummary saved → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import pytest
+
+from backtest_runner import find_sessions, merge_summaries, run_backtest, run_session
+from replay_engine_test import write_session
+
+PER_DAY = ("session", "file", "bars", "final_mode", "kill_flips")
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return [
+        write_session(tmp_path / f"SPX_{day}_1m.csv", day=day, n=n, seed=seed)
+        for day, n, seed in (("2024-10-28", 200, 1), ("2024-10-29", 390, 2),
+                             ("2024-10-30", 120, 3), ("2024-10-31", 300, 4))
+    ]
+
+
+def test_pool_matches_serial(sessions):
+    serial = run_backtest(sessions, workers=1)
+    pooled = run_backtest(list(reversed(sessions)), workers=2)
+
+    assert pooled["workers"] == 2 and serial["sessions"] == pooled["sessions"] == len(sessions)
+    assert [{k: d[k] for k in PER_DAY} for d in pooled["per_day"]] == \
+        [{k: d[k] for k in PER_DAY} for d in serial["per_day"]]
+    for key in ("final_day_mode", "bar_day_mode", "kill_flip_times", "days_with_kill", "failed"):
+        assert pooled[key] == serial[key], key
+    assert sum(serial["bar_day_mode"].values()) == 200 + 390 + 120 + 300
+
+
+def test_session_summary_counts_every_bar(sessions):
+    day = run_session(sessions[1])
+    assert day["session"] == "2024-10-29" and day["bars"] == 390
+    assert sum(day["bar_modes"].values()) == 390
+    assert all("09:30" <= t <= "16:00" for t in day["kill_flips"])
+
+
+def test_bad_file_is_reported_not_fatal(sessions, tmp_path):
+    bad = tmp_path / "SPX_2024-11-01_1m.csv"
+    bad.write_text("timestamp,open\n2024-11-01T09:30:00,1\n")  # no high/low/close
+    summary = run_backtest(sessions[:2] + [str(bad)], workers=2)
+    assert summary["sessions"] == 2
+    assert [f["file"] for f in summary["failed"]] == [str(bad)]
+    assert "KeyError" in summary["failed"][0]["error"]
+
+
+def test_find_sessions(sessions, tmp_path):
+    assert find_sessions(str(tmp_path)) == sorted(sessions)
+    assert find_sessions(str(tmp_path / "SPX_2024-10-3*_1m.csv")) == sorted(sessions[2:])
+
+
+def test_merge_summaries_without_sessions():
+    merged = merge_summaries([])
+    assert merged["sessions"] == 0 and merged["wall_time_max"] == 0.0 and merged["per_day"] == []
@@ -0,0 +1,316 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bar_columns import sync_columns
+from candle_store import TIMESTAMP_FORMAT
+
+# This file is the on-disk historical bar cache behind the data pullers
+# (alpha_env_fetcher.fetch_series, schwab_data_manager.get_price_history).
+#
+# - one CSV per (symbol, interval): <root>/<interval>/<SYMBOL>_<interval>.csv,
+#   i.e. the same files env_brain reads for daily / weekly / monthly
+# - a coverage index next to it (<SYMBOL>_<interval>.coverage.json): the
+#   time ranges already fetched, INCLUDING ranges that had no bars
+#   (weekends, holidays), so those are never asked for again
+# - missing() = requested range minus coverage; fetch() asks the source
+#   for just those gaps and merges the result
+# - merging appends in place when the new bars are newer than the file
+#   (the usual daily refresh); the last row is replaced when the source
+#   sends a newer version of it. Only backfills rewrite the file.
+# - after a merge the columnar copy (bar_columns.py) is rebuilt too
+#
+# Times are wall-clock market seconds (see candle_store.to_epoch). A range
+# that reaches "now" is only covered up to the start of its newest bar,
+# which may still be forming; the next fetch re-asks from there.
+
+# Intervals whose newest bar keeps changing its own date while it forms
+# (Alpha Vantage dates a weekly bar by its latest trading day, ...)
+WEEKLY_INTERVALS = ("week", "weekly")
+MONTHLY_INTERVALS = ("month", "monthly")
+DATE_ONLY_INTERVALS = ("day", "daily") + WEEKLY_INTERVALS + MONTHLY_INTERVALS
+
+BAR_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+def _safe_symbol(symbol: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]", "_", symbol.lstrip("$"))
+
+
+def period_keys(timestamps, interval: str) -> np.ndarray:
+    """
+    The key rows are deduplicated on: the timestamp itself, or the week /
+    month it belongs to for weekly / monthly bars.
+    """
+    ts = np.asarray(timestamps, dtype=np.int64)
+    if interval in WEEKLY_INTERVALS:
+        days = ts // 86400
+        return days - (days + 3) % 7  # Monday of that week (1970-01-01 was a Thursday)
+    if interval in MONTHLY_INTERVALS:
+        return ts.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+    return ts
+
+
+def _merge_ranges(ranges) -> list:
+    out = []
+    for start, end in sorted((int(s), int(e)) for s, e in ranges if e > s):
+        if out and start <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], end)
+        else:
+            out.append([start, end])
+    return out
+
+
+def subtract_ranges(start: int, end: int, covered) -> list:
+    """
+    [start, end) minus the covered ranges, as a list of (start, end) gaps.
+    """
+    gaps = []
+    cursor = start
+    for c_start, c_end in _merge_ranges(covered):
+        if c_end <= cursor:
+            continue
+        if c_start >= end:
+            break
+        if c_start > cursor:
+            gaps.append((cursor, min(c_start, end)))
+        cursor = max(cursor, c_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def in_ranges(timestamps, ranges) -> np.ndarray:
+    """
+    Boolean mask: which timestamps fall inside one of the [start, end) ranges.
+    """
+    ts = np.asarray(timestamps, dtype=np.int64)
+    merged = _merge_ranges(ranges)
+    if not merged or len(ts) == 0:
+        return np.zeros(len(ts), dtype=bool)
+    starts = np.array([r[0] for r in merged], dtype=np.int64)
+    ends = np.array([r[1] for r in merged], dtype=np.int64)
+    idx = np.searchsorted(starts, ts, side="right") - 1
+    return (idx >= 0) & (ts < ends[np.maximum(idx, 0)])
+
+
+def empty_bars() -> dict:
+    return {
+        "timestamp": np.empty(0, dtype=np.int64),
+        **{col: np.empty(0, dtype=np.float64) for col in BAR_COLUMNS},
+    }
+
+
+def _read_bars(path: str) -> dict:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return empty_bars()
+
+    df = pd.read_csv(path)
+    # Columns by position: the env CSVs use Alpha Vantage names ("1. open", ...)
+    ts = pd.to_datetime(df.iloc[:, 0]).values.astype("datetime64[s]").astype(np.int64)
+    bars = {"timestamp": ts}
+    for i, col in enumerate(BAR_COLUMNS, start=1):
+        bars[col] = df.iloc[:, i].to_numpy(dtype=np.float64)
+
+    if len(ts) > 1 and np.any(ts[1:] < ts[:-1]):
+        order = np.argsort(ts, kind="stable")
+        bars = {k: v[order] for k, v in bars.items()}
+    return bars
+
+
+def _tail(path: str):
+    """
+    (byte offset of the last data row, its timestamp), or None if the
+    file has no data rows.
+    """
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        block = min(size, 4096)
+        f.seek(size - block)
+        data = f.read(block).rstrip(b"\n")
+    cut = data.rfind(b"\n")
+    if cut < 0:
+        return None  # header only (rows are far shorter than the block)
+    offset = size - block + cut + 1
+    stamp = data[cut + 1:].split(b",", 1)[0].decode()
+    return offset, pd.Timestamp(stamp).value // 10**9
+
+
+class BarCache:
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Paths / coverage
+    # -----------------------------
+    def path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, interval, f"{_safe_symbol(symbol)}_{interval}.csv")
+
+    def _coverage_path(self, symbol: str, interval: str) -> str:
+        return self.path(symbol, interval)[:-len(".csv")] + ".coverage.json"
+
+    def coverage(self, symbol: str, interval: str) -> list:
+        """
+        Covered [start, end) ranges, merged and sorted.
+
+        A CSV without an index (written before the cache existed) counts
+        as covered from its first bar up to the start of its last one.
+        """
+        cov_path = self._coverage_path(symbol, interval)
+        if os.path.exists(cov_path):
+            with open(cov_path, encoding="utf-8") as f:
+                return _merge_ranges(json.load(f).get("ranges", []))
+
+        bars = self.load(symbol, interval)
+        if len(bars["timestamp"]) < 2:
+            return []
+        return [[int(bars["timestamp"][0]), int(bars["timestamp"][-1])]]
+
+    def _write_coverage(self, symbol: str, interval: str, ranges) -> None:
+        path = self._coverage_path(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)  # an empty first pull writes no CSV
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ranges": _merge_ranges(ranges)}, f)
+        os.replace(tmp, path)
+
+    def missing(self, symbol: str, interval: str, start: int, end: int) -> list:
+        """
+        Gaps of [start, end) that aren't cached yet.
+        """
+        return subtract_ranges(int(start), int(end), self.coverage(symbol, interval))
+
+    # -----------------------------
+    # Bars
+    # -----------------------------
+    def load(self, symbol: str, interval: str, start: int = None, end: int = None) -> dict:
+        """
+        Cached bars as arrays (timestamp + open/high/low/close/volume),
+        oldest first, optionally limited to [start, end).
+        """
+        bars = _read_bars(self.path(symbol, interval))
+        if start is not None or end is not None:
+            lo = np.searchsorted(bars["timestamp"], start) if start is not None else 0
+            hi = np.searchsorted(bars["timestamp"], end) if end is not None else len(bars["timestamp"])
+            bars = {k: v[lo:hi] for k, v in bars.items()}
+        return bars
+
+    def _format_rows(self, bars: dict, interval: str) -> str:
+        fmt = "%Y-%m-%d" if interval in DATE_ONLY_INTERVALS else TIMESTAMP_FORMAT
+        stamps = pd.to_datetime(bars["timestamp"], unit="s").strftime(fmt)
+        lines = []
+        for i, stamp in enumerate(stamps):
+            values = []
+            for col in BAR_COLUMNS:
+                v = float(bars[col][i])
+                values.append(str(int(v)) if v.is_integer() else repr(v))
+            lines.append(f"{stamp},{','.join(values)}\n")
+        return "".join(lines)
+
+    def merge(self, symbol: str, interval: str, bars: dict, start: int, end: int, now: int = None) -> int:
+        """
+        Store bars fetched for [start, end) and mark that range covered.
+        Newer rows win over cached rows with the same key (timestamp, or
+        week / month for those intervals).
+
+        now: if end reaches it, coverage stops at the newest bar's start
+        (that bar may still be forming). Returns the number of bars written
+        (bars inside already-covered ranges are skipped).
+        """
+        ts = np.asarray(bars.get("timestamp", []), dtype=np.int64)
+        new = {"timestamp": ts, **{col: np.asarray(bars[col], dtype=np.float64) for col in BAR_COLUMNS}} \
+            if len(ts) else empty_bars()
+
+        # Sort, and keep the last row per key within the new bars
+        if len(ts):
+            order = np.argsort(ts, kind="stable")
+            new = {k: v[order] for k, v in new.items()}
+            keys = period_keys(new["timestamp"], interval)
+            keep = np.r_[keys[1:] != keys[:-1], True]
+            new = {k: v[keep] for k, v in new.items()}
+
+        covered_end = int(end)
+        if now is not None and end >= now:
+            covered_end = int(new["timestamp"][-1]) if len(new["timestamp"]) else int(start)
+
+        with self._lock:
+            path = self.path(symbol, interval)
+            ranges = self.coverage(symbol, interval)
+            # Rows the cache already covers are skipped, so an overlapping
+            # pull (Alpha Vantage 'compact') still only appends what's new
+            fresh = ~in_ranges(new["timestamp"], ranges)
+            if not fresh.all():
+                new = {k: v[fresh] for k, v in new.items()}
+            written = self._write_bars(path, interval, new)
+            # Bars first, coverage second: a crash in between just means a re-fetch
+            self._write_coverage(symbol, interval, ranges + [[int(start), covered_end]])
+            if written:
+                try:
+                    sync_columns(path)
+                except OSError as e:  # loaders rebuild it on their next read anyway
+                    print(f"⚠️ Could not refresh columns for {path}: {e}")
+        return written
+
+    def _write_bars(self, path: str, interval: str, new: dict) -> int:
+        n = len(new["timestamp"])
+        if n == 0:
+            return 0
+
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("date," + ",".join(BAR_COLUMNS) + "\n")
+                f.write(self._format_rows(new, interval))
+            return n
+
+        tail = _tail(path)
+        new_keys = period_keys(new["timestamp"], interval)
+        if tail is None or new_keys[0] >= period_keys([tail[1]], interval)[0]:
+            # Append in place; a newer version of the last row replaces it
+            with open(path, "r+b") as f:
+                if tail is not None and new_keys[0] == period_keys([tail[1]], interval)[0]:
+                    f.truncate(tail[0])
+                elif f.seek(-1, os.SEEK_END) >= 0 and f.read(1) != b"\n":
+                    f.write(b"\n")  # file saved without a final newline
+                f.seek(0, os.SEEK_END)
+                f.write(self._format_rows(new, interval).encode())
+            return n
+
+        # Backfill / overlap: merge everything and rewrite once
+        old = _read_bars(path)
+        combined = {k: np.concatenate([old[k], new[k]]) for k in new}
+        keys = period_keys(combined["timestamp"], interval)
+        order = np.lexsort((np.r_[np.zeros(len(old["timestamp"])), np.ones(n)], keys))
+        combined = {k: v[order] for k, v in combined.items()}
+        keys = keys[order]
+        keep = np.r_[keys[1:] != keys[:-1], True]  # the new row sorts last within a key
+        combined = {k: v[keep] for k, v in combined.items()}
+
+        with open(path, encoding="utf-8") as f:
+            header = f.readline()
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(header)
+            f.write(self._format_rows(combined, interval))
+        os.replace(tmp, path)
+        return n
+
+    # -----------------------------
+    # Fetch through the cache
+    # -----------------------------
+    def fetch(self, symbol: str, interval: str, start: int, end: int, fetcher, now: int = None) -> dict:
+        """
+        Bars for [start, end): fetcher(symbol, interval, gap_start, gap_end)
+        -> bars dict is called only for the gaps; everything else comes
+        from disk.
+        """
+        for gap_start, gap_end in self.missing(symbol, interval, start, end):
+            self.merge(symbol, interval, fetcher(symbol, interval, gap_start, gap_end), gap_start, gap_end, now=now)
+        return self.load(symbol, interval, start, end)
@@ -0,0 +1,240 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_cache import BarCache, _merge_ranges, in_ranges, period_keys, subtract_ranges
+from candle_store import to_epoch
+
+DAY = 86400
+
+
+def daily(start, end, seed=3):
+    """
+    Daily bars on business days in [start, end) as a bars dict.
+    """
+    days = pd.bdate_range(start, end, inclusive="left")
+    ts = np.array([to_epoch(d.strftime("%Y-%m-%dT00:00:00")) for d in days], dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    close = np.round(100 + np.cumsum(rng.normal(0, 1, len(ts))), 2)
+    return {
+        "timestamp": ts,
+        "open": close - 0.5,
+        "high": close + 1,
+        "low": close - 1,
+        "close": close,
+        "volume": rng.integers(1000, 5000, len(ts)).astype(np.float64),
+    }
+
+
+def window(bars, start, end):
+    ts = bars["timestamp"]
+    keep = (ts >= start) & (ts < end)
+    return {k: v[keep] for k, v in bars.items()}
+
+
+class RecordingFetcher:
+    """
+    Serves a fixed bar set and records every (start, end) it is asked for.
+    """
+
+    def __init__(self, bars):
+        self.bars = bars
+        self.calls = []
+
+    def __call__(self, symbol, interval, start, end):
+        self.calls.append((start, end))
+        return window(self.bars, start, end)
+
+
+def assert_bars(got, expected):
+    np.testing.assert_array_equal(got["timestamp"], expected["timestamp"])
+    for col in ("open", "high", "low", "close", "volume"):
+        np.testing.assert_allclose(got[col], expected[col])
+
+
+# -----------------------------
+# Range math
+# -----------------------------
+@pytest.mark.parametrize("ranges, expected", [
+    ([], []),
+    ([(5, 5)], []),
+    ([(10, 20), (0, 5)], [[0, 5], [10, 20]]),
+    ([(0, 10), (10, 20)], [[0, 20]]),
+    ([(0, 15), (5, 10), (12, 30)], [[0, 30]]),
+])
+def test_merge_ranges(ranges, expected):
+    assert _merge_ranges(ranges) == expected
+
+
+@pytest.mark.parametrize("start, end, covered, expected", [
+    (0, 100, [], [(0, 100)]),
+    (0, 100, [(0, 100)], []),
+    (0, 100, [(-50, 200)], []),
+    (0, 100, [(20, 40)], [(0, 20), (40, 100)]),
+    (0, 100, [(60, 80), (20, 40)], [(0, 20), (40, 60), (80, 100)]),
+    (0, 100, [(-10, 30), (90, 150)], [(30, 90)]),
+    (0, 100, [(100, 200), (-100, 0)], [(0, 100)]),
+    (50, 60, [(0, 10), (200, 300)], [(50, 60)]),
+])
+def test_subtract_ranges(start, end, covered, expected):
+    assert subtract_ranges(start, end, covered) == expected
+
+
+def test_subtract_ranges_matches_brute_force():
+    rng = np.random.default_rng(7)
+    for _ in range(200):
+        covered = [tuple(sorted(rng.integers(0, 100, 2))) for _ in range(rng.integers(0, 5))]
+        start, end = sorted(rng.integers(0, 100, 2))
+        points = np.arange(start, end)
+        expected = ~in_ranges(points, covered)
+        got = np.zeros(len(points), dtype=bool)
+        for g_start, g_end in subtract_ranges(int(start), int(end), covered):
+            assert start <= g_start < g_end <= end
+            got |= (points >= g_start) & (points < g_end)
+        np.testing.assert_array_equal(got, expected)
+
+
+def test_in_ranges_is_half_open():
+    mask = in_ranges([-1, 0, 9, 10, 15, 20, 25], [(0, 10), (20, 30)])
+    assert mask.tolist() == [False, True, True, False, False, True, True]
+    assert in_ranges([1, 2], []).tolist() == [False, False]
+
+
+def test_period_keys_group_weeks_and_months():
+    # Mon 2025-11-24 .. Fri 2025-11-28, then Mon 2025-12-01
+    ts = [to_epoch(f"{d}T00:00:00") for d in
+          ("2025-11-24", "2025-11-26", "2025-11-28", "2025-11-30", "2025-12-01")]
+    weeks = period_keys(ts, "weekly")
+    assert len(set(weeks[:4])) == 1 and weeks[4] == weeks[0] + 7
+    months = period_keys(ts, "monthly")
+    assert len(set(months[:4])) == 1 and months[4] == months[0] + 1
+    np.testing.assert_array_equal(period_keys(ts, "daily"), ts)
+
+
+# -----------------------------
+# Fetch / merge
+# -----------------------------
+def test_fetch_asks_only_for_gaps(tmp_path):
+    source = daily("2025-01-01", "2025-06-01")
+    cache = BarCache(str(tmp_path))
+    fetcher = RecordingFetcher(source)
+
+    a, b = to_epoch("2025-02-01T00:00:00"), to_epoch("2025-03-01T00:00:00")
+    assert_bars(cache.fetch("SPY", "daily", a, b, fetcher), window(source, a, b))
+    assert fetcher.calls == [(a, b)]
+
+    # Wider range: only the two sides are fetched, the middle comes from disk
+    lo, hi = to_epoch("2025-01-01T00:00:00"), to_epoch("2025-04-01T00:00:00")
+    assert_bars(cache.fetch("SPY", "daily", lo, hi, fetcher), window(source, lo, hi))
+    assert fetcher.calls[1:] == [(lo, a), (b, hi)]
+
+    # Fully covered: no fetch at all, even for a weekend-only range
+    cache.fetch("SPY", "daily", a, hi, fetcher)
+    cache.fetch("SPY", "daily", to_epoch("2025-03-01T00:00:00"), to_epoch("2025-03-03T00:00:00"), fetcher)
+    assert len(fetcher.calls) == 3
+    assert cache.missing("SPY", "daily", lo, hi) == []
+    assert_bars(cache.load("SPY", "daily"), window(source, lo, hi))
+
+
+def test_empty_range_is_still_covered(tmp_path):
+    cache = BarCache(str(tmp_path))
+    fetcher = RecordingFetcher(daily("2025-01-01", "2025-02-01"))
+    sat, mon = to_epoch("2025-01-04T00:00:00"), to_epoch("2025-01-06T00:00:00")
+    assert len(cache.fetch("SPY", "daily", sat, mon, fetcher)["timestamp"]) == 0
+    cache.fetch("SPY", "daily", sat, mon, fetcher)
+    assert fetcher.calls == [(sat, mon)]
+
+
+def test_forming_bar_is_refetched_and_replaced(tmp_path):
+    source = daily("2025-01-01", "2025-02-01")
+    cache = BarCache(str(tmp_path))
+    fetcher = RecordingFetcher(source)
+    start = to_epoch("2025-01-01T00:00:00")
+    today = to_epoch("2025-01-15T00:00:00")
+    now = today + 12 * 3600
+
+    cache.fetch("SPY", "daily", start, now, fetcher, now=now)
+    # Coverage stops at the start of today's bar, which may still be forming
+    assert cache.coverage("SPY", "daily") == [[start, today]]
+    assert cache.missing("SPY", "daily", start, now) == [(today, now)]
+
+    # Later the same day the source has a newer version of today's bar
+    source["close"][source["timestamp"] == today] += 5
+    later = now + 3600
+    got = cache.fetch("SPY", "daily", start, later, fetcher, now=later)
+    assert fetcher.calls[-1] == (today, later)
+    assert_bars(got, window(source, start, later))
+    with open(cache.path("SPY", "daily")) as f:
+        rows = f.read().splitlines()
+    assert len(rows) == 1 + len(window(source, start, later)["timestamp"])
+    assert rows[-1].startswith("2025-01-15,")
+
+
+def test_overlapping_pull_only_appends_new_rows(tmp_path):
+    source = daily("2025-01-01", "2025-03-01")
+    cache = BarCache(str(tmp_path))
+    a = to_epoch("2025-01-01T00:00:00")
+    b = to_epoch("2025-02-01T00:00:00")
+    c = to_epoch("2025-03-01T00:00:00")
+    assert cache.merge("SPY", "daily", window(source, a, b), a, b) == len(window(source, a, b)["timestamp"])
+
+    # A 'compact'-style pull that overlaps what's cached; the overlap is skipped
+    stale = window(source, a, c)
+    stale["close"] = stale["close"] + 100
+    written = cache.merge("SPY", "daily", stale, b, c)
+    assert written == len(window(source, b, c)["timestamp"])
+    got = cache.load("SPY", "daily")
+    assert_bars(window(got, a, b), window(source, a, b))
+    np.testing.assert_allclose(window(got, b, c)["close"], window(source, b, c)["close"] + 100)
+
+
+def test_backfill_rewrites_in_order(tmp_path):
+    source = daily("2025-01-01", "2025-04-01")
+    cache = BarCache(str(tmp_path))
+    fetcher = RecordingFetcher(source)
+    a = to_epoch("2025-01-01T00:00:00")
+    b = to_epoch("2025-02-01T00:00:00")
+    c = to_epoch("2025-04-01T00:00:00")
+
+    cache.fetch("SPY", "daily", b, c, fetcher)
+    cache.fetch("SPY", "daily", a, c, fetcher)
+    assert fetcher.calls == [(b, c), (a, b)]
+    assert cache.coverage("SPY", "daily") == [[a, c]]
+
+    dates = pd.read_csv(cache.path("SPY", "daily")).iloc[:, 0]
+    assert dates.is_monotonic_increasing and dates.is_unique
+    assert_bars(cache.load("SPY", "daily"), source)
+
+
+def test_weekly_bar_redated_while_forming(tmp_path):
+    cache = BarCache(str(tmp_path))
+    start = to_epoch("2025-11-17T00:00:00")
+
+    def week(dates, closes):
+        ts = np.array([to_epoch(f"{d}T00:00:00") for d in dates], dtype=np.int64)
+        c = np.array(closes, dtype=np.float64)
+        return {"timestamp": ts, "open": c, "high": c, "low": c, "close": c, "volume": np.ones(len(ts))}
+
+    # Wednesday: this week's bar is dated by its latest trading day
+    wed = to_epoch("2025-11-26T12:00:00")
+    cache.merge("SPY", "weekly", week(["2025-11-21", "2025-11-26"], [100, 101]), start, wed, now=wed)
+    # Friday: same week, new date -> replaces the row instead of adding one
+    fri = to_epoch("2025-11-28T12:00:00")
+    cache.merge("SPY", "weekly", week(["2025-11-28"], [103]), to_epoch("2025-11-26T00:00:00"), fri, now=fri)
+
+    got = cache.load("SPY", "weekly")
+    assert pd.to_datetime(got["timestamp"], unit="s").strftime("%Y-%m-%d").tolist() == ["2025-11-21", "2025-11-28"]
+    assert got["close"].tolist() == [100, 103]
+
+
+def test_coverage_without_index_uses_file_span(tmp_path):
+    cache = BarCache(str(tmp_path))
+    source = daily("2025-01-01", "2025-02-01")
+    path = cache.path("SPY", "daily")
+    tmp_path.joinpath("daily").mkdir()
+    with open(path, "w") as f:
+        f.write("date,open,high,low,close,volume\n")
+        f.write(cache._format_rows(source, "daily"))
+    first, last = int(source["timestamp"][0]), int(source["timestamp"][-1])
+    assert cache.coverage("SPY", "daily") == [[first, last]]
+    assert cache.missing("SPY", "daily", first, last + DAY) == [(last, last + DAY)]
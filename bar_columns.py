@@ -0,0 +1,175 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# This file keeps a columnar binary copy of each history CSV in data/
+# so loads don't parse text, rename columns and sort every time.
+#
+#   data/daily/SPX_daily.csv  ->  data/daily/SPX_daily.cols/
+#       current.json           which version is live + the CSV it came from
+#       <version>/date.npy     int64 wall-clock seconds (sorted)
+#       <version>/open.npy ... one .npy per column
+#
+# - the CSV stays the source of truth: a load whose CSV changed (mtime or
+#   size) rebuilds the columns first; bar_cache also rebuilds right after
+#   it merges new bars
+# - a rebuild writes a new version directory and then swaps current.json
+#   atomically, so readers never see half-written columns
+# - load_columns() memory-maps the .npy files and slices them by date with
+#   a binary search: a 20-year daily history costs a few page faults, not
+#   a CSV parse. column_range() answers "how far does the file go" from
+#   current.json alone, so callers can pick a start before loading
+
+COLUMNS_SUFFIX = ".cols"
+
+# Header names -> our names (Alpha Vantage style, or capitalized)
+PLAIN_NAMES = {
+    "1. open": "open",
+    "2. high": "high",
+    "3. low": "low",
+    "4. close": "close",
+    "5. volume": "volume",
+    "Open": "open",
+    "High": "high",
+    "Low": "low",
+    "Close": "close",
+    "Volume": "volume",
+}
+
+
+def columns_dir(csv_path: str) -> str:
+    return csv_path[:-len(".csv")] + COLUMNS_SUFFIX if csv_path.endswith(".csv") else csv_path + COLUMNS_SUFFIX
+
+
+def _source_signature(csv_path: str) -> list:
+    st = os.stat(csv_path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _read_current(folder: str):
+    try:
+        with open(os.path.join(folder, "current.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def sync_columns(csv_path: str, force: bool = False) -> bool:
+    """
+    Make sure the columnar copy matches the CSV. Returns True if it had
+    to be (re)built. Raises OSError if the CSV is missing or the folder
+    isn't writable.
+    """
+    source = _source_signature(csv_path)
+    folder = columns_dir(csv_path)
+    current = _read_current(folder)
+    if not force and current is not None and current.get("source") == source:
+        return False
+
+    df = pd.read_csv(csv_path)
+    date_col = df.columns[0]
+    dates = pd.to_datetime(df[date_col]).values.astype("datetime64[s]").astype(np.int64)
+    order = np.argsort(dates, kind="stable")
+
+    version = f"v{source[0]}-{source[1]}-{os.getpid()}"
+    target = os.path.join(folder, version)
+    os.makedirs(target, exist_ok=True)
+
+    names = {}
+    np.save(os.path.join(target, "date.npy"), dates[order])
+    for col in df.columns[1:]:
+        name = PLAIN_NAMES.get(col, col)
+        names[name] = col
+        # to_numeric: a header-only CSV reads as object columns, which can't be mapped
+        np.save(os.path.join(target, f"{name}.npy"), pd.to_numeric(df[col]).to_numpy()[order])
+
+    meta = {
+        "version": version,
+        "source": source,
+        "rows": int(len(dates)),
+        "first": int(dates[order[0]]) if len(dates) else None,
+        "last": int(dates[order[-1]]) if len(dates) else None,
+        "date_column": date_col,
+        "columns": names,  # our name -> header name in the CSV
+    }
+    tmp = os.path.join(folder, f"current.json.tmp{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(folder, "current.json"))
+
+    # Older versions: readers that already mapped them keep their mapping.
+    # Re-read current.json: another process may have swapped in its own.
+    live = (_read_current(folder) or {}).get("version")
+    for entry in os.listdir(folder):
+        path = os.path.join(folder, entry)
+        if entry not in (version, live) and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+    return True
+
+
+def load_columns(csv_path: str, start: int = None, end: int = None) -> dict:
+    """
+    {"timestamp": int64 seconds, "open": ..., ...} as read-only memory
+    maps, limited to [start, end) (wall-clock seconds) if given.
+    Syncs from the CSV first when it changed.
+    """
+    folder = columns_dir(csv_path)
+    for attempt in range(2):
+        sync_columns(csv_path, force=attempt > 0)
+        meta = _read_current(folder)
+        target = os.path.join(folder, meta["version"])
+        try:
+            dates = np.load(os.path.join(target, "date.npy"), mmap_mode="r")
+            cols = {name: np.load(os.path.join(target, f"{name}.npy"), mmap_mode="r") for name in meta["columns"]}
+            break
+        except FileNotFoundError:
+            if attempt:  # rebuilt and still gone: give up
+                raise
+
+    lo = int(np.searchsorted(dates, start)) if start is not None else 0
+    hi = int(np.searchsorted(dates, end)) if end is not None else len(dates)
+    out = {"timestamp": dates[lo:hi]}
+    for name, values in cols.items():
+        out[name] = values[lo:hi]
+    out["_meta"] = meta
+    return out
+
+
+def column_range(csv_path: str):
+    """
+    (first, last) timestamp in the CSV as wall-clock seconds, or None if
+    it has no rows. Only reads current.json (syncing first, like
+    load_columns()).
+    """
+    folder = columns_dir(csv_path)
+    sync_columns(csv_path)
+    meta = _read_current(folder)
+    if meta is None or "last" not in meta:  # copy from before the range was recorded
+        sync_columns(csv_path, force=True)
+        meta = _read_current(folder)
+    if not meta["rows"]:
+        return None
+    return meta["first"], meta["last"]
+
+
+def load_frame(csv_path: str, start: int = None, end: int = None, original_names: bool = False) -> pd.DataFrame:
+    """
+    The columns as a DataFrame: datetime index + open/high/low/close/volume
+    (env_brain's shape), or with original_names=True the CSV's own layout
+    (a date column + header names, like pd.read_csv would give).
+    """
+    cols = load_columns(csv_path, start, end)
+    meta = cols.pop("_meta")
+    dates = pd.to_datetime(np.asarray(cols.pop("timestamp")), unit="s")
+
+    if original_names:
+        data = {meta["date_column"]: dates}
+        data.update({meta["columns"][name]: np.asarray(values) for name, values in cols.items()})
+        return pd.DataFrame(data)
+
+    df = pd.DataFrame({name: np.asarray(values) for name, values in cols.items()}, index=dates)
+    df.index.name = "date"
+    return df
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_columns import column_range, columns_dir, load_columns, load_frame, sync_columns
+from candle_store import to_epoch
+
+HEADER = "date,1. open,2. high,3. low,4. close,5. volume\n"
+
+
+def write_csv(path, days, first_close=110.0, mtime=None):
+    with open(path, "w") as f:
+        f.write(HEADER)
+        for i, day in enumerate(days):
+            c = first_close + i
+            f.write(f"{day},{c - 0.5},{c + 1},{c - 1},{c},{1000 + i}\n")
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = str(tmp_path / "SPX_daily.csv")
+    write_csv(path, [d.strftime("%Y-%m-%d") for d in pd.bdate_range("2025-01-01", periods=60)])
+    return path
+
+
+def test_columns_match_the_csv(csv_path):
+    assert sync_columns(csv_path) is True
+    assert sync_columns(csv_path) is False  # unchanged CSV: nothing to do
+
+    cols = load_columns(csv_path)
+    df = pd.read_csv(csv_path)
+    expected = pd.to_datetime(df["date"]).values.astype("datetime64[s]").astype(np.int64)
+    np.testing.assert_array_equal(cols["timestamp"], expected)
+    for name, header in (("open", "1. open"), ("close", "4. close"), ("volume", "5. volume")):
+        np.testing.assert_array_equal(cols[name], df[header].to_numpy())
+    # Memory maps, not copies
+    assert isinstance(cols["close"], np.memmap)
+    assert not cols["close"].flags.writeable
+
+    pd.testing.assert_frame_equal(load_frame(csv_path, original_names=True), df.assign(date=pd.to_datetime(df["date"])))
+    assert list(load_frame(csv_path).columns) == ["open", "high", "low", "close", "volume"]
+    assert column_range(csv_path) == (int(expected[0]), int(expected[-1]))
+
+
+def test_stale_copy_is_rebuilt_when_the_csv_changes(csv_path):
+    before = load_columns(csv_path)
+    version = before["_meta"]["version"]
+    stat = os.stat(csv_path)
+
+    # Same size, different content, newer mtime
+    days = [d.strftime("%Y-%m-%d") for d in pd.bdate_range("2025-01-01", periods=60)]
+    write_csv(csv_path, days, first_close=210.0, mtime=stat.st_mtime_ns + 10**9)
+    assert os.stat(csv_path).st_size == stat.st_size
+
+    after = load_columns(csv_path)
+    assert after["_meta"]["version"] != version
+    assert after["close"][0] == 210.0
+    # The mapping taken before the rebuild still reads the old version
+    assert before["close"][0] == 110.0
+    # Only the live version is left on disk
+    live = [e for e in os.listdir(columns_dir(csv_path)) if e != "current.json"]
+    assert live == [after["_meta"]["version"]]
+
+    # More rows: the range follows
+    write_csv(csv_path, days + ["2025-03-26", "2025-03-27"], mtime=stat.st_mtime_ns + 2 * 10**9)
+    assert column_range(csv_path)[1] == to_epoch("2025-03-27T00:00:00")
+    assert len(load_columns(csv_path)["timestamp"]) == 62
+
+
+def test_unsorted_csv_is_sorted(tmp_path):
+    path = str(tmp_path / "x.csv")
+    write_csv(path, ["2025-01-03", "2025-01-01", "2025-01-02"])
+    cols = load_columns(path)
+    assert np.all(np.diff(cols["timestamp"]) > 0)
+    assert cols["close"].tolist() == [111.0, 112.0, 110.0]
+
+
+@pytest.mark.parametrize("start, end, first, count", [
+    (None, None, "2025-01-01", 60),
+    ("2025-02-03", None, "2025-02-03", 37),
+    ("2025-02-01", "2025-02-08", "2025-02-03", 5),   # weekend start: next trading day
+    ("2025-02-03", "2025-02-04", "2025-02-03", 1),   # end is exclusive
+    (None, "2025-01-03", "2025-01-01", 2),
+    ("2024-01-01", "2030-01-01", "2025-01-01", 60),
+])
+def test_range_slicing(csv_path, start, end, first, count):
+    start = to_epoch(f"{start}T00:00:00") if start else None
+    end = to_epoch(f"{end}T00:00:00") if end else None
+    cols = load_columns(csv_path, start, end)
+    assert len(cols["timestamp"]) == len(cols["close"]) == count
+    assert cols["timestamp"][0] == to_epoch(f"{first}T00:00:00")
+    frame = load_frame(csv_path, start, end)
+    assert len(frame) == count and frame.index[0] == pd.Timestamp(first)
+
+
+def test_empty_ranges(csv_path):
+    day = to_epoch("2025-02-03T00:00:00")
+    assert len(load_columns(csv_path, day, day)["timestamp"]) == 0
+    assert len(load_columns(csv_path, to_epoch("2030-01-01T00:00:00"))["timestamp"]) == 0
+
+    empty = csv_path.replace(".csv", "_empty.csv")
+    with open(empty, "w") as f:
+        f.write(HEADER)
+    assert column_range(empty) is None
+    assert len(load_columns(empty)["timestamp"]) == 0
@@ -0,0 +1,239 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+# This file is an append-only binary journal of every candle the bot
+# ingests, so a restart / deploy doesn't wipe the store.
+#
+# - fixed-width records (RECORD_DTYPE, 88 bytes), written before the
+#   candle is acknowledged
+# - load_records() memory-maps the file; MarketState.replay_journal()
+#   rebuilds the store and indicator state from it in file order, one
+#   vectorized batch per run of records for the same series
+# - compaction rewrites the file as "what the store holds right now"
+#   (tmp file + fsync + rename, so a crash mid-compaction is harmless)
+# - a torn last record (crash mid-write) is dropped on open
+#
+# fsync policy (how much an OS crash / power loss can lose):
+#   "always"   fsync before every acknowledgement
+#   "interval" at most one fsync per interval seconds (default)
+#   "never"    leave it to the OS
+# A plain process crash never loses acknowledged candles: write() has
+# already handed them to the kernel.
+#
+# Several processes may append to one journal (shared store mode) as long
+# as they serialize on the store's write_lock; a writer notices when
+# another one compacted the file and reopens it.
+
+
+MAGIC = b"SBJ1"
+HEADER_SIZE = 16
+
+MAX_SYMBOL_BYTES = 31
+MAX_TIMEFRAME_BYTES = 8
+
+FLAG_ROLLUP = 1  # the bar was ingested with 1m -> higher timeframe rollup on
+
+RECORD_DTYPE = np.dtype([
+    ("symbol", f"S{MAX_SYMBOL_BYTES}"),
+    ("flags", "u1"),
+    ("timeframe", f"S{MAX_TIMEFRAME_BYTES}"),
+    ("ts", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+def _header() -> bytes:
+    return MAGIC + RECORD_DTYPE.itemsize.to_bytes(4, "little") + b"\0" * (HEADER_SIZE - 8)
+
+
+def encode_key(symbol: str, timeframe: str) -> tuple:
+    """
+    (symbol bytes, timeframe bytes); ValueError if they don't fit a record.
+    """
+    sym = symbol.encode("utf-8")
+    tf = timeframe.encode("utf-8")
+    if len(sym) > MAX_SYMBOL_BYTES:
+        raise ValueError(f"symbol must be at most {MAX_SYMBOL_BYTES} bytes")
+    if len(tf) > MAX_TIMEFRAME_BYTES:
+        raise ValueError(f"timeframe must be at most {MAX_TIMEFRAME_BYTES} bytes")
+    return sym, tf
+
+
+def make_records(symbol: str, timeframe: str, ts, open_, high, low, close, volume, flags: int = 0) -> np.ndarray:
+    """
+    Structured record array for one series (scalars or equal-length arrays).
+    """
+    sym, tf = encode_key(symbol, timeframe)
+    n = np.size(ts)
+    rec = np.empty(n, dtype=RECORD_DTYPE)
+    rec["symbol"] = sym
+    rec["flags"] = flags
+    rec["timeframe"] = tf
+    rec["ts"] = ts
+    rec["open"] = open_
+    rec["high"] = high
+    rec["low"] = low
+    rec["close"] = close
+    rec["volume"] = volume
+    return rec
+
+
+def load_records(path: str) -> np.ndarray:
+    """
+    Memory-map a journal and return its records (read-only view).
+    Empty array if the file is missing or empty. A torn tail is ignored.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) <= HEADER_SIZE:
+        return np.empty(0, dtype=RECORD_DTYPE)
+
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if header[:4] != MAGIC or int.from_bytes(header[4:8], "little") != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} is not a candle journal (or has a different record layout)")
+
+    count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+class CandleJournal:
+    def __init__(self, path: str, fsync: str = "interval", fsync_interval: float = 1.0,
+                 compact_min_records: int = 100_000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_min_records = compact_min_records
+        self.compact_at = compact_min_records
+
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+        self._fd = None
+        self.records = 0
+        self._open()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+
+        size = os.fstat(fd).st_size
+        if size < HEADER_SIZE:
+            os.ftruncate(fd, 0)
+            os.write(fd, _header())
+            os.fsync(fd)
+            size = HEADER_SIZE
+        else:
+            header = os.pread(fd, HEADER_SIZE, 0)
+            if header[:4] != MAGIC or int.from_bytes(header[4:8], "little") != RECORD_DTYPE.itemsize:
+                os.close(fd)
+                raise ValueError(f"{self.path} is not a candle journal (or has a different record layout)")
+
+        # Drop a torn last record left by a crash mid-write
+        body = size - HEADER_SIZE
+        whole = body - body % RECORD_DTYPE.itemsize
+        if whole != body:
+            os.ftruncate(fd, HEADER_SIZE + whole)
+
+        self._fd = fd
+        self.records = whole // RECORD_DTYPE.itemsize
+
+    def append(self, records: np.ndarray) -> None:
+        """
+        Write records; returns once they are as durable as the fsync policy says.
+        """
+        if len(records) == 0:
+            return
+        data = np.ascontiguousarray(records, dtype=RECORD_DTYPE).tobytes()
+
+        with self._lock:
+            self._reopen_if_replaced()
+            view = memoryview(data)
+            while view:
+                written = os.write(self._fd, view)
+                view = view[written:]
+            # From the file, not a local count: other workers append too
+            self.records = (os.fstat(self._fd).st_size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+            self._maybe_sync()
+
+    def _reopen_if_replaced(self):
+        # Another process (shared store mode) may have compacted the file
+        # out from under our descriptor
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(self._fd).st_ino:
+            os.close(self._fd)
+            self._open()
+
+    def _maybe_sync(self):
+        if self.fsync == "always":
+            os.fsync(self._fd)
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_sync >= self.fsync_interval:
+                os.fsync(self._fd)
+                self._last_sync = now
+
+    def sync(self) -> None:
+        with self._lock:
+            if self._fd is not None:
+                os.fsync(self._fd)
+                self._last_sync = time.monotonic()
+
+    def needs_compaction(self, live_records) -> bool:
+        """
+        True once the journal is both big and mostly bars the store already
+        dropped. live_records is a callable (store size), only called when
+        the record count crosses the next checkpoint.
+        """
+        if self.records <= self.compact_at:
+            return False
+        live = live_records()
+        if self.records > 4 * live:
+            return True
+        self.compact_at = max(self.compact_min_records, 4 * live)
+        return False
+
+    def rewrite(self, records: np.ndarray) -> None:
+        """
+        Atomically replace the journal with these records (compaction).
+        """
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_header())
+            f.write(np.ascontiguousarray(records, dtype=RECORD_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self._lock:
+            os.replace(tmp, self.path)
+            dir_fd = os.open(os.path.dirname(self.path) or ".", os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+            os.close(self._fd)
+            self._open()
+            self._last_sync = time.monotonic()
+            self.compact_at = max(self.compact_min_records, 4 * self.records)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd is not None:
+                os.fsync(self._fd)
+                os.close(self._fd)
+                self._fd = None
@@ -0,0 +1,159 @@
+import os
+
+import numpy as np
+import pytest
+
+from candle_journal import HEADER_SIZE, RECORD_DTYPE, CandleJournal, load_records
+from candle_store import format_epoch, to_epoch
+from indicator_engine_test import assert_same, make_candles
+from market_state import MarketState
+from market_state_test import feed
+
+TIMEFRAMES = ("1m", "5m", "15m", "1h", "day")
+
+
+def assert_same_market(a, b, symbols=("SPX",)):
+    for symbol in symbols:
+        assert sorted(a.store.timeframes(symbol)) == sorted(b.store.timeframes(symbol))
+        for tf in a.store.timeframes(symbol):
+            assert a.store.get(symbol, tf).candles() == b.store.get(symbol, tf).candles(), tf
+            assert_same(a.latest_indicators(symbol, tf), b.latest_indicators(symbol, tf))
+
+
+def journaled(path, **kwargs):
+    market = MarketState(capacity=300)
+    market.journal = CandleJournal(str(path), fsync="never", **kwargs)
+    return market
+
+
+def test_replay_rebuilds_store_and_rollups(tmp_path):
+    path = tmp_path / "candles.journal"
+    live = journaled(path)
+    candles = make_candles(400)
+    feed(live, candles[:150])
+    head = candles[150:300]
+    live.ingest_many(
+        "SPX", "1m", [to_epoch(c["timestamp"]) for c in head],
+        [c["open"] for c in head], [c["high"] for c in head], [c["low"] for c in head],
+        [c["close"] for c in head], [c["volume"] for c in head],
+    )
+    feed(live, candles[300:], symbol="QQQ")
+    feed(live, make_candles(30, seed=9), timeframe="1h", rollup=False)  # fed directly, no rollup
+    live.journal.close()
+
+    restored = MarketState(capacity=300)
+    n = restored.replay_journal(load_records(str(path)))
+    assert n == 150 + 150 + 100 + 30
+    assert_same_market(live, restored, symbols=("SPX", "QQQ"))
+
+
+def test_replay_keeps_cross_series_order(tmp_path):
+    path = tmp_path / "candles.journal"
+    live = journaled(path)
+    minutes = make_candles(15)
+    for i, c in enumerate(minutes):
+        c["timestamp"] = format_epoch(to_epoch("2025-11-26T10:00:00") + 60 * i)
+
+    feed(live, minutes[:5])  # rolls up the 10:00 5m bar
+    feed(live, minutes[5:6], timeframe="5m", rollup=False)  # 10:05 fed directly
+    feed(live, minutes[10:])  # rolls up the 10:10 5m bar
+    feed(live, minutes[:3], symbol="QQQ")
+    feed(live, minutes[3:6], symbol="QQQ", rollup=False)
+    live.journal.close()
+
+    stamps = [c["timestamp"] for c in live.store.get("SPX", "5m").candles()]
+    assert [format_epoch(to_epoch(t))[11:16] for t in stamps] == ["10:00", "10:05", "10:10"]
+
+    restored = MarketState(capacity=300)
+    restored.replay_journal(load_records(str(path)))
+    assert_same_market(live, restored, symbols=("SPX", "QQQ"))
+
+
+def test_failed_apply_is_not_journaled(tmp_path, monkeypatch):
+    path = tmp_path / "candles.journal"
+    live = journaled(path)
+    candles = make_candles(30)
+    feed(live, candles[:20])
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("shared candle store is full")
+
+    with monkeypatch.context() as m:
+        m.setattr(live, "_apply", broken)
+        m.setattr(live, "_apply_many", broken)
+        with pytest.raises(RuntimeError):
+            feed(live, candles[20:21], symbol="QQQ")
+        with pytest.raises(RuntimeError):
+            live.ingest_batch([dict(c, symbol="QQQ") for c in candles[20:25]])
+    assert live.journal.records == 20
+
+    feed(live, candles[20:])
+    live.journal.close()
+    restored = MarketState(capacity=300)
+    assert restored.replay_journal(load_records(str(path))) == 30
+    assert_same_market(live, restored)
+    assert restored.store.get("QQQ", "1m") is None
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    path = tmp_path / "candles.journal"
+    live = journaled(path)
+    feed(live, make_candles(20))
+    live.journal.close()
+    with open(path, "ab") as f:
+        f.write(b"\x01" * (RECORD_DTYPE.itemsize // 2))  # crash mid-write
+
+    assert len(load_records(str(path))) == 20
+    journal = CandleJournal(str(path), fsync="never")
+    assert journal.records == 20
+    assert os.path.getsize(path) == HEADER_SIZE + 20 * RECORD_DTYPE.itemsize
+    journal.close()
+
+
+def test_compaction_keeps_what_the_store_holds(tmp_path):
+    path = tmp_path / "candles.journal"
+    live = MarketState(capacity=50)
+    live.journal = CandleJournal(str(path), fsync="never", compact_min_records=100)
+    feed(live, make_candles(600))
+    # The store keeps 50 bars per series; the journal was compacted on the way
+    assert live.journal.records < 600
+    live.journal.sync()
+
+    restored = MarketState(capacity=50)
+    restored.replay_journal(load_records(str(path)))
+    for tf in TIMEFRAMES:
+        if live.store.get("SPX", tf) is None:
+            continue
+        assert restored.store.get("SPX", tf).candles() == live.store.get("SPX", tf).candles(), tf
+    # Rollups resume from the compacted forming bars
+    more = make_candles(650)[600:]
+    feed(live, more)
+    feed(restored, more)
+    for tf in TIMEFRAMES:
+        if live.store.get("SPX", tf) is not None:
+            assert restored.store.get("SPX", tf).candles() == live.store.get("SPX", tf).candles(), tf
+    live.journal.close()
+
+
+def test_compaction_then_append(tmp_path):
+    path = tmp_path / "candles.journal"
+    market = journaled(path)
+    feed(market, make_candles(10))
+    market.compact_journal()
+    assert market.journal.records == len(market.journal_records())
+    feed(market, make_candles(12)[10:])
+    market.journal.close()
+    assert np.array_equal(load_records(str(path))[-1]["close"], make_candles(12)[-1]["close"])
+
+
+def test_not_a_journal(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"hello world, not a journal at all")
+    with pytest.raises(ValueError):
+        load_records(str(path))
+    with pytest.raises(ValueError):
+        CandleJournal(str(path))
+
+
+def test_missing_journal_is_empty(tmp_path):
+    assert len(load_records(str(tmp_path / "nope.journal"))) == 0
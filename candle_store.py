@@ -0,0 +1,281 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from indicators import PRICE_COLUMNS
+
+# This file replaces the nested CANDLES lists in app.py:
+# - one CandleSeries per (symbol, timeframe), backed by preallocated numpy arrays
+# - O(1) append with wraparound (no list slicing on every POST)
+# - int64 timestamps, zero-copy array views for the indicator code
+#
+# The ring is "mirrored": every row is written at pos and pos + capacity,
+# so the last N rows are always one contiguous slice, even after wrapping.
+
+
+# Timestamps are stored as wall-clock seconds in market time (what the
+# replay CSVs and the feed already send). Aware / epoch inputs get converted.
+MARKET_TZ = "America/New_York"
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+try:
+    from zoneinfo import ZoneInfo
+    MARKET_ZONE = ZoneInfo(MARKET_TZ)
+except Exception:  # no tz database on this box
+    MARKET_ZONE = timezone.utc
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(value) -> int:
+    """
+    Candle timestamp -> int64 wall-clock seconds.
+
+    Accepts ISO strings ("2025-11-26T10:30:00", "2025-11-26 10:30"),
+    datetimes, or numeric epochs (seconds or milliseconds, UTC).
+    Raises ValueError if it can't be parsed.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Bad timestamp: {value!r}")
+
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        seconds = float(value)
+        if seconds > 1e11:  # milliseconds (Schwab pricehistory style)
+            seconds /= 1000.0
+        value = datetime.fromtimestamp(seconds, tz=timezone.utc)
+    elif not isinstance(value, datetime):
+        text = str(value).strip()
+        if text.endswith("Z"):
+            text = text[:-1] + "+00:00"
+        value = datetime.fromisoformat(text)
+
+    if value.tzinfo is not None:
+        value = value.astimezone(MARKET_ZONE).replace(tzinfo=None)
+
+    delta = value - _EPOCH
+    return delta.days * 86400 + delta.seconds
+
+
+def to_utc_epoch(seconds) -> float:
+    """
+    Wall-clock market seconds -> real UTC epoch seconds (inverse of to_epoch).
+    """
+    wall = _EPOCH + timedelta(seconds=int(seconds))
+    return wall.replace(tzinfo=MARKET_ZONE).timestamp()
+
+
+def format_epoch(seconds) -> str:
+    """
+    int64 wall-clock seconds -> "YYYY-MM-DDTHH:MM:SS".
+    """
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(int(seconds)))
+
+
+class CandleSeries:
+    """
+    Fixed-capacity candle history for ONE (symbol, timeframe).
+
+    version goes up by one on every change, so callers can tell
+    whether anything happened since they last looked.
+    """
+
+    def __init__(self, symbol: str, timeframe: str, capacity: int = 300):
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.capacity = capacity
+        self.version = 0
+
+        self._start = 0  # ring index of the oldest row
+        self._len = 0
+        self._ts = np.zeros(2 * capacity, dtype=np.int64)
+        self._cols = {col: np.zeros(2 * capacity, dtype=np.float64) for col in PRICE_COLUMNS}
+
+    def __len__(self):
+        return self._len
+
+    def _write(self, pos, ts, open_, high, low, close, volume):
+        for p in (pos, pos + self.capacity):
+            self._ts[p] = ts
+            self._cols["open"][p] = open_
+            self._cols["high"][p] = high
+            self._cols["low"][p] = low
+            self._cols["close"][p] = close
+            self._cols["volume"][p] = volume
+
+    def append(self, ts: int, open_: float, high: float, low: float, close: float, volume: float = 0.0) -> None:
+        """
+        Add one bar at the end, dropping the oldest when full. O(1).
+        """
+        if self._len < self.capacity:
+            pos = (self._start + self._len) % self.capacity
+            self._len += 1
+        else:
+            pos = self._start
+            self._start = (self._start + 1) % self.capacity
+
+        self._write(pos, ts, open_, high, low, close, volume)
+        self.version += 1
+
+    def append_many(self, ts, open_, high, low, close, volume) -> None:
+        """
+        Append many bars at once from equal-length arrays (oldest -> newest).
+        Same end state as calling append() per bar; only the rows that
+        survive the wraparound are written.
+        """
+        n = len(ts)
+        if n == 0:
+            return
+
+        keep = min(n, self.capacity)
+        first = self._start + self._len + (n - keep)
+        pos = (first + np.arange(keep)) % self.capacity
+
+        for p in (pos, pos + self.capacity):
+            self._ts[p] = ts[-keep:]
+            self._cols["open"][p] = open_[-keep:]
+            self._cols["high"][p] = high[-keep:]
+            self._cols["low"][p] = low[-keep:]
+            self._cols["close"][p] = close[-keep:]
+            self._cols["volume"][p] = volume[-keep:]
+
+        overflow = max(0, self._len + n - self.capacity)
+        self._start = (self._start + overflow) % self.capacity
+        self._len = min(self.capacity, self._len + n)
+        self.version += 1
+
+    def replace_last(self, ts: int, open_: float, high: float, low: float, close: float, volume: float = 0.0) -> None:
+        """
+        Overwrite the newest bar (a still-forming bar). Appends if empty.
+        """
+        if self._len == 0:
+            self.append(ts, open_, high, low, close, volume)
+            return
+
+        pos = (self._start + self._len - 1) % self.capacity
+        self._write(pos, ts, open_, high, low, close, volume)
+        self.version += 1
+
+    def append_candle(self, candle: dict) -> None:
+        """
+        Append from a candle dict shaped like /feed/candle's body.
+        """
+        self.append(
+            to_epoch(candle["timestamp"]),
+            float(candle["open"]),
+            float(candle["high"]),
+            float(candle["low"]),
+            float(candle["close"]),
+            float(candle.get("volume", 0.0)),
+        )
+
+    # -----------------------------
+    # Zero-copy views
+    # -----------------------------
+    def timestamps(self) -> np.ndarray:
+        return self._ts[self._start:self._start + self._len]
+
+    def arrays(self) -> dict:
+        """
+        open/high/low/close/volume as contiguous float64 views (oldest -> newest).
+        Views are only valid until the next append.
+        """
+        lo, hi = self._start, self._start + self._len
+        return {col: values[lo:hi] for col, values in self._cols.items()}
+
+    # -----------------------------
+    # Dict views (JSON output / older helpers)
+    # -----------------------------
+    def candle_at(self, index: int) -> dict:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("candle index out of range")
+
+        pos = self._start + index
+        candle = {
+            "timestamp": format_epoch(self._ts[pos]),
+            "timeframe": self.timeframe,
+            "symbol": self.symbol,
+        }
+        for col, values in self._cols.items():
+            candle[col] = float(values[pos])
+        return candle
+
+    def __getitem__(self, index):
+        # Lets a series stand in for a candle list, e.g.
+        # compute_indicators_from_arrays(series, series.arrays())
+        return self.candle_at(index)
+
+    def last_candle(self):
+        if self._len == 0:
+            return None
+        return self.candle_at(-1)
+
+    def candles(self) -> list:
+        """
+        Materialize every stored bar as a dict (oldest -> newest).
+        """
+        return [self.candle_at(i) for i in range(self._len)]
+
+    def frozen(self) -> "CandleSeries":
+        """
+        A series that won't change under the caller. Local series are only
+        touched by this process, so that's just self (see shared_store).
+        """
+        return self
+
+
+class CandleStore:
+    """
+    symbol -> timeframe -> CandleSeries.
+    """
+
+    shared = False
+
+    def __init__(self, capacity: int = 300):
+        self.capacity = capacity
+        self.write_lock = threading.RLock()  # held by MarketState while ingesting
+        # Versions restart at 0 with the process; epoch tells the two apart (ETags)
+        self.epoch = os.urandom(4).hex()
+        self._series = {}
+
+    def get(self, symbol: str, timeframe: str):
+        """
+        Returns the CandleSeries or None if nothing was stored yet.
+        """
+        return self._series.get(symbol, {}).get(timeframe)
+
+    def series_for(self, symbol: str, timeframe: str) -> CandleSeries:
+        """
+        Returns the CandleSeries, creating it if needed.
+        """
+        by_tf = self._series.setdefault(symbol, {})
+        series = by_tf.get(timeframe)
+        if series is None:
+            series = CandleSeries(symbol, timeframe, capacity=self.capacity)
+            by_tf[timeframe] = series
+        return series
+
+    def append(self, symbol: str, timeframe: str, candle: dict) -> CandleSeries:
+        series = self.series_for(symbol, timeframe)
+        series.append_candle(candle)
+        return series
+
+    def symbols(self) -> list:
+        return list(self._series)
+
+    def timeframes(self, symbol: str) -> list:
+        return list(self._series.get(symbol, {}))
+
+    def __iter__(self):
+        for by_tf in self._series.values():
+            yield from by_tf.values()
+
+    def total_candles(self) -> int:
+        return sum(len(series) for series in self)
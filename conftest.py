@@ -0,0 +1,5 @@
+import os
+
+# app.py journals to data/journal/ unless told otherwise; tests that
+# import it run with a memory-only store
+os.environ.setdefault("CANDLE_JOURNAL_PATH", "")
@@ -1,16 +1,33 @@
 import os
+import threading
+import zlib
 import pandas as pd
 
+from bar_columns import column_range, load_columns, load_frame
+from env_state import EnvState, column_bars, frame_bars
+from metrics import ENV_CACHE_LOOKUPS, timed
+
 # This file builds the "environment brain" for SPX:
-# - reads daily / weekly / monthly CSVs
-# - computes EMAs, Bollinger Bands, ATR (daily)
+# - reads daily / weekly / monthly CSVs (through their memory-mapped
+#   columnar copies, see bar_columns.py); the running state only reads
+#   the last LOOKBACK_DAYS of each, as arrays
+# - computes EMAs, Bollinger Bands, ATR (daily); compute_env_indicators()
+#   is the plain pandas version, kept as the reference for the tests
 # - returns a simple snapshot the bot can use
+# - keeps the indicators as running state per symbol (env_state.py) until
+#   one of the CSVs changes; add_daily_bar() moves it forward in O(1)
 
 
 # Where the data folder lives (data/daily, data/weekly, data/monthly)
 BASE_DIR = os.path.dirname(__file__)
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
+# How far back (in days before the newest daily bar) each series is read
+# when the running state is built: at least 1000 bars of each kind, by
+# which point EMA50 no longer depends on where the history starts
+# ((49/51)^1000 < 1e-17); Bollinger / ATR only need 20
+LOOKBACK_DAYS = {"daily": 1500, "weekly": 7 * 1000, "monthly": 31 * 1000}
+
 
 def _load_csv(path: str) -> pd.DataFrame:
     """
@@ -56,14 +73,40 @@ def _load_csv(path: str) -> pd.DataFrame:
     return df
 
 
+def _load_frame(path: str) -> pd.DataFrame:
+    """
+    Same frame as _load_csv(), from the memory-mapped columnar copy
+    (bar_columns.py); falls back to parsing the CSV if that can't be
+    written (read-only checkout, ...).
+    """
+    try:
+        return load_frame(path)
+    except OSError as e:
+        if not os.path.exists(path):
+            raise
+        print(f"⚠️ Columnar copy of {path} unavailable ({e}); reading the CSV")
+        return _load_csv(path)
+
+
+def env_paths(symbol: str = "SPX") -> dict:
+    """
+    CSV paths for a symbol: {"daily": ..., "weekly": ..., "monthly": ...}
+    """
+    return {
+        kind: os.path.join(DATA_DIR, kind, f"{symbol}_{kind}.csv")
+        for kind in ("daily", "weekly", "monthly")
+    }
+
+
 def load_env_data(symbol: str = "SPX") -> dict:
     """
     Load daily / weekly / monthly CSVs for a symbol.
     Returns a dict of DataFrames.
     """
-    daily_path = os.path.join(DATA_DIR, "daily", f"{symbol}_daily.csv")
-    weekly_path = os.path.join(DATA_DIR, "weekly", f"{symbol}_weekly.csv")
-    monthly_path = os.path.join(DATA_DIR, "monthly", f"{symbol}_monthly.csv")
+    paths = env_paths(symbol)
+    daily_path = paths["daily"]
+    weekly_path = paths["weekly"]
+    monthly_path = paths["monthly"]
 
     if not os.path.exists(daily_path):
         raise FileNotFoundError(f"Missing file: {daily_path}")
@@ -72,9 +115,9 @@ def load_env_data(symbol: str = "SPX") -> dict:
     if not os.path.exists(monthly_path):
         raise FileNotFoundError(f"Missing file: {monthly_path}")
 
-    daily_df = _load_csv(daily_path)
-    weekly_df = _load_csv(weekly_path)
-    monthly_df = _load_csv(monthly_path)
+    daily_df = _load_frame(daily_path)
+    weekly_df = _load_frame(weekly_path)
+    monthly_df = _load_frame(monthly_path)
 
     return {
         "daily": daily_df,
@@ -83,6 +126,46 @@ def load_env_data(symbol: str = "SPX") -> dict:
     }
 
 
+def _load_bars(path: str, start: int = None) -> tuple:
+    """
+    Bar arrays (env_state.frame_bars() layout) for [start, newest] straight
+    from the memory-mapped columns; falls back to parsing the CSV like
+    _load_frame().
+    """
+    try:
+        return column_bars(load_columns(path, start=start))
+    except OSError as e:
+        if not os.path.exists(path):
+            raise
+        print(f"⚠️ Columnar copy of {path} unavailable ({e}); reading the CSV")
+        df = _load_csv(path)
+        if start is not None:
+            df = df[df.index >= pd.to_datetime(start, unit="s")]
+        return frame_bars(df)
+
+
+def load_env_bars(symbol: str = "SPX") -> dict:
+    """
+    What EnvState needs from the three CSVs: {kind: bar arrays}, each
+    limited to LOOKBACK_DAYS before the newest daily bar. No DataFrames.
+    """
+    paths = env_paths(symbol)
+    for path in paths.values():
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Missing file: {path}")
+
+    try:
+        span = column_range(paths["daily"])
+    except OSError:
+        span = None  # _load_bars() reports it and reads everything
+    newest = span[1] if span else None
+
+    return {
+        kind: _load_bars(path, None if newest is None else newest - LOOKBACK_DAYS[kind] * 86400)
+        for kind, path in paths.items()
+    }
+
+
 def _compute_ema(series: pd.Series, span: int) -> float:
     return series.ewm(span=span, adjust=False).mean().iloc[-1]
 
@@ -123,6 +206,9 @@ def compute_env_indicators(df: pd.DataFrame, kind: str) -> dict:
     """
     Compute EMAs, Bollinger, ATR (if daily) and a simple trend for the LAST bar.
     kind: 'daily', 'weekly', 'monthly'
+
+    Reference only: the server uses the running state in env_state.py,
+    and env_state_test.py checks EnvState.snapshot() against this.
     """
     if df.empty:
         return {}
@@ -168,6 +254,52 @@ def compute_env_indicators(df: pd.DataFrame, kind: str) -> dict:
     }
 
 
+# -------------------------------------------------
+# Running state cache (CSV files change at most once a day)
+# -------------------------------------------------
+_ENV_CACHE = {}  # symbol -> (file signature, EnvState)
+_ENV_LOCK = threading.Lock()
+
+
+def _env_signature(symbol: str):
+    """
+    (mtime_ns, size) for each CSV. A missing file gives None so the
+    cache never hides a FileNotFoundError.
+    """
+    sig = []
+    for path in env_paths(symbol).values():
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        sig.append((st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+def build_env_state(symbol: str = "SPX") -> EnvState:
+    """
+    Load the CSVs into a fresh EnvState (no cache).
+    """
+    with timed("env.load_csv"):
+        bars = load_env_bars(symbol)
+
+    with timed("env.indicators"):
+        state = EnvState(symbol)
+        state.seed_bars(bars)
+    return state
+
+
+def environment_version(symbol: str = "SPX") -> str:
+    """
+    Short token that changes whenever get_environment(symbol) would
+    (used in ETags).
+    """
+    with _ENV_LOCK:
+        cached = _ENV_CACHE.get(symbol)
+    revision = cached[1].revision if cached is not None else 0
+    return format(zlib.crc32(repr((_env_signature(symbol), revision)).encode()), "08x")
+
+
 def get_environment(symbol: str = "SPX") -> dict:
     """
     Main function: returns a JSON-friendly environment snapshot:
@@ -177,16 +309,62 @@ def get_environment(symbol: str = "SPX") -> dict:
       "weekly": { ... },
       "monthly": { ... }
     }
+
+    The running state is cached per symbol; it is reloaded as soon as
+    any of the three CSVs changes mtime or size.
     """
-    dfs = load_env_data(symbol)
+    sig = _env_signature(symbol)
 
-    daily_info = compute_env_indicators(dfs["daily"], kind="daily")
-    weekly_info = compute_env_indicators(dfs["weekly"], kind="weekly")
-    monthly_info = compute_env_indicators(dfs["monthly"], kind="monthly")
+    with _ENV_LOCK:
+        cached = _ENV_CACHE.get(symbol)
+    if sig is not None and cached is not None and cached[0] == sig:
+        ENV_CACHE_LOOKUPS.inc("hit")
+        return cached[1].snapshot()
 
-    return {
-        "symbol": symbol,
-        "daily": daily_info,
-        "weekly": weekly_info,
-        "monthly": monthly_info,
-    }
\ No newline at end of file
+    ENV_CACHE_LOOKUPS.inc("miss")
+    state = build_env_state(symbol)
+
+    if sig is not None:
+        with _ENV_LOCK:
+            _ENV_CACHE[symbol] = (sig, state)
+    return state.snapshot()
+
+
+def add_daily_bar(symbol: str, bar: dict) -> bool:
+    """
+    Move a loaded symbol's environment forward by one daily bar (or
+    update today's): the daily snapshot and the forming weekly / monthly
+    bars change in O(1), no CSV reload. Returns False if the symbol isn't
+    loaded (get_environment() will read the CSVs when it is asked for).
+    """
+    with _ENV_LOCK:
+        cached = _ENV_CACHE.get(symbol)
+    if cached is None:
+        return False
+    cached[1].add_daily_bar(bar)
+    return True
+
+
+def warm_environment(symbols=("SPX",)) -> dict:
+    """
+    Pre-load the cache (e.g. at startup). Returns {symbol: error or None}.
+    """
+    results = {}
+    for symbol in symbols:
+        try:
+            get_environment(symbol)
+            results[symbol] = None
+        except (OSError, ValueError, KeyError) as e:
+            results[symbol] = str(e)
+    return results
+
+
+def invalidate_environment(symbol: str = None) -> None:
+    """
+    Drop one symbol from the cache, or everything if symbol is None.
+    """
+    with _ENV_LOCK:
+        if symbol is None:
+            _ENV_CACHE.clear()
+        else:
+            _ENV_CACHE.pop(symbol, None)
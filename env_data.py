@@ -1,29 +1,47 @@
 import os
 import pandas as pd
 
+from bar_columns import load_frame
+from candle_store import to_epoch
+
 # Base folder where we saved the CSVs
 BASE_PATH = os.path.join(os.path.dirname(__file__), "data")
 
 
-def _load_csv(subfolder: str, symbol_name: str, label: str) -> pd.DataFrame:
+def _load_csv(subfolder: str, symbol_name: str, label: str, start=None, end=None) -> pd.DataFrame:
     """
     Helper to load a CSV like:
     data/<subfolder>/<symbol_name>_<label>.csv
     Example: data/daily/SPX_daily.csv
+
+    start / end: optional [start, end) dates (anything to_epoch takes),
+    so only that slice of the history is turned into a DataFrame.
     """
     path = os.path.join(BASE_PATH, subfolder, f"{symbol_name}_{label}.csv")
+    start = to_epoch(start) if start is not None else None
+    end = to_epoch(end) if end is not None else None
+    try:
+        # Memory-mapped columnar copy, kept in sync with the CSV (bar_columns.py)
+        return load_frame(path, start, end, original_names=True)
+    except OSError:
+        if not os.path.exists(path):
+            raise
     df = pd.read_csv(path, parse_dates=["date"])
     df = df.sort_values("date").reset_index(drop=True)
-    return df
+    if start is not None:
+        df = df[df["date"] >= pd.to_datetime(start, unit="s")]
+    if end is not None:
+        df = df[df["date"] < pd.to_datetime(end, unit="s")]
+    return df.reset_index(drop=True)
 
 
-def load_daily(symbol_name: str = "SPX") -> pd.DataFrame:
-    return _load_csv("daily", symbol_name, "daily")
+def load_daily(symbol_name: str = "SPX", start=None, end=None) -> pd.DataFrame:
+    return _load_csv("daily", symbol_name, "daily", start, end)
 
 
-def load_weekly(symbol_name: str = "SPX") -> pd.DataFrame:
-    return _load_csv("weekly", symbol_name, "weekly")
+def load_weekly(symbol_name: str = "SPX", start=None, end=None) -> pd.DataFrame:
+    return _load_csv("weekly", symbol_name, "weekly", start, end)
 
 
-def load_monthly(symbol_name: str = "SPX") -> pd.DataFrame:
-    return _load_csv("monthly", symbol_name, "monthly")
\ No newline at end of file
+def load_monthly(symbol_name: str = "SPX", start=None, end=None) -> pd.DataFrame:
+    return _load_csv("monthly", symbol_name, "monthly", start, end)
@@ -0,0 +1,384 @@
+import math
+import threading
+from collections import deque
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from bar_cache import period_keys
+from candle_store import to_epoch
+from indicator_engine import _ema_step
+from indicators import compute_ema_series
+from timeframe_rollup import SECONDS_PER_DAY
+
+# This file keeps env_brain's indicator math (EMA5/10/20/50, Bollinger
+# 20/2, ATR14 on daily) as running state per (symbol, daily / weekly /
+# monthly) series, so a new daily bar costs O(1) instead of recomputing
+# 25 years of weekly and monthly history.
+#
+# - every series keeps its state up to the bar BEFORE the last one, plus
+#   the last bar itself; the snapshot applies the last bar on the fly, so
+#   replacing it (a forming bar) is just an assignment
+# - the weekly / monthly bar of the current period is built from daily
+#   bars: "base" (the period's earlier days) merged with today's bar
+# - the numbers match env_brain.compute_env_indicators() on the same bars
+#   (pandas' rolling sums can differ in the last few bits)
+
+EMA_SPANS = (5, 10, 20, 50)
+BOLL_WINDOW = 20
+BOLL_STD = 2.0
+ATR_WINDOW = 14
+
+HIGHER_KINDS = ("weekly", "monthly")
+
+_EPOCH_DAY = date(1970, 1, 1)
+
+# Bar tuple layout: (timestamp, open, high, low, close, volume)
+_TS, _OPEN, _HIGH, _LOW, _CLOSE, _VOLUME = range(6)
+
+
+def frame_bars(df: pd.DataFrame) -> tuple:
+    """
+    (int64 wall-clock seconds, open, high, low, close, volume arrays) for
+    an env_brain frame (datetime index + plain column names).
+    """
+    ts = df.index.values.astype("datetime64[s]").astype(np.int64)
+    cols = [df[col].to_numpy(dtype=np.float64) if col in df.columns else np.zeros(len(df))
+            for col in ("open", "high", "low", "close", "volume")]
+    return (ts, *cols)
+
+
+def column_bars(cols: dict) -> tuple:
+    """
+    Same arrays as frame_bars(), from bar_columns.load_columns(): the
+    memory-mapped float64 columns are used as they are, not copied.
+    """
+    ts = np.asarray(cols["timestamp"], dtype=np.int64)
+    values = [np.asarray(cols[col], dtype=np.float64) if col in cols else np.zeros(len(ts))
+              for col in ("open", "high", "low", "close", "volume")]
+    return (ts, *values)
+
+
+def _row(bars, i) -> tuple:
+    """
+    Bar tuple for row i of frame_bars() arrays.
+    """
+    return (int(bars[0][i]),) + tuple(float(col[i]) for col in bars[1:])
+
+
+def _merge(base, day) -> tuple:
+    """
+    A period bar so far (or None) with one more daily bar folded in.
+    """
+    if base is None:
+        return day
+    return (
+        day[_TS],
+        base[_OPEN],
+        max(base[_HIGH], day[_HIGH]),
+        min(base[_LOW], day[_LOW]),
+        day[_CLOSE],
+        base[_VOLUME] + day[_VOLUME],
+    )
+
+
+def _true_range(bar, prev_close) -> float:
+    if prev_close is None:
+        return bar[_HIGH] - bar[_LOW]
+    return max(
+        bar[_HIGH] - bar[_LOW],
+        abs(bar[_HIGH] - prev_close),
+        abs(bar[_LOW] - prev_close),
+    )
+
+
+class EnvSeries:
+    """
+    Running environment indicators for ONE (symbol, kind) series.
+
+        series = EnvSeries("weekly")
+        series.seed(*frame_bars(weekly_df))   # whole history, vectorized
+        series.append(bar)                    # next bar, O(1)
+        series.replace_last(bar)              # forming bar changed, O(1)
+        series.snapshot()                     # compute_env_indicators() shape
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.count = 0
+        self.last = None  # last bar tuple
+
+        # State through the bar before `last`
+        self._ema = {span: None for span in EMA_SPANS}
+        self._closes = deque(maxlen=BOLL_WINDOW - 1)
+        self._true_ranges = deque(maxlen=ATR_WINDOW - 1)
+        self._prev_close = None
+
+    @property
+    def last_ts(self):
+        return None if self.last is None else self.last[_TS]
+
+    def seed(self, ts, open_, high, low, close, volume) -> None:
+        """
+        Load a whole history at once (oldest -> newest arrays).
+        """
+        n = len(ts)
+        if n == 0:
+            return
+        if n > 1:
+            self._bulk(high[:-1], low[:-1], close[:-1])
+        self.last = _row((ts, open_, high, low, close, volume), -1)
+        self.count += 1
+
+    def _bulk(self, high, low, close):
+        for span in EMA_SPANS:
+            prev = self._ema[span]
+            values = close if prev is None else np.concatenate(([prev], close))
+            self._ema[span] = float(compute_ema_series(values, span)[-1])
+
+        prev_close = np.empty_like(close)
+        prev_close[0] = np.nan if self._prev_close is None else self._prev_close
+        prev_close[1:] = close[:-1]
+        true_range = np.fmax.reduce([
+            high - low,
+            np.abs(high - prev_close),
+            np.abs(low - prev_close),
+        ])
+
+        self._closes.extend(close[-self._closes.maxlen:].tolist())
+        self._true_ranges.extend(true_range[-self._true_ranges.maxlen:].tolist())
+        self._prev_close = float(close[-1])
+        self.count += len(close)
+
+    def append(self, bar) -> None:
+        """
+        Add the next bar: the current last bar becomes history.
+        """
+        last = self.last
+        if last is not None:
+            close = last[_CLOSE]
+            for span in EMA_SPANS:
+                self._ema[span] = _ema_step(self._ema[span], close, span)
+            self._closes.append(close)
+            self._true_ranges.append(_true_range(last, self._prev_close))
+            self._prev_close = close
+        self.last = tuple(bar)
+        self.count += 1
+
+    def replace_last(self, bar) -> None:
+        """
+        Swap the last bar for an updated version of it (forming bar).
+        """
+        if self.last is None:
+            self.append(bar)
+        else:
+            self.last = tuple(bar)
+
+    def snapshot(self) -> dict:
+        """
+        Same keys and values as env_brain.compute_env_indicators().
+        """
+        if self.last is None:
+            return {}
+
+        last_close = self.last[_CLOSE]
+        ema = {span: _ema_step(self._ema[span], last_close, span) for span in EMA_SPANS}
+
+        # Bollinger: sample std (pandas rolling().std()), NaN until the window fills
+        closes = list(self._closes)
+        closes.append(last_close)
+        if len(closes) < BOLL_WINDOW:
+            boll_mid = boll_upper = boll_lower = math.nan
+        else:
+            boll_mid = sum(closes) / BOLL_WINDOW
+            std = math.sqrt(sum((c - boll_mid) ** 2 for c in closes) / (BOLL_WINDOW - 1))
+            boll_upper = boll_mid + BOLL_STD * std
+            boll_lower = boll_mid - BOLL_STD * std
+
+        if ema[5] > ema[10] > ema[20] and last_close > ema[20]:
+            trend = "UPTREND"
+        elif ema[5] < ema[10] < ema[20] and last_close < ema[20]:
+            trend = "DOWNTREND"
+        else:
+            trend = "CHOP"
+
+        atr14 = None
+        if self.kind == "daily":
+            ranges = list(self._true_ranges)
+            ranges.append(_true_range(self.last, self._prev_close))
+            atr14 = sum(ranges) / ATR_WINDOW if len(ranges) == ATR_WINDOW else math.nan
+
+        return {
+            "trend": trend,
+            "close": float(last_close),
+            "ema5": float(ema[5]),
+            "ema10": float(ema[10]),
+            "ema20": float(ema[20]),
+            "ema50": float(ema[50]),
+            "boll_mid": float(boll_mid),
+            "boll_upper": float(boll_upper),
+            "boll_lower": float(boll_lower),
+            "atr14": atr14,
+        }
+
+
+def _period_key(ts: int, kind: str) -> int:
+    """
+    period_keys() for one timestamp, without the numpy round trip.
+    """
+    days = ts // SECONDS_PER_DAY
+    if kind == "weekly":
+        return days - (days + 3) % 7
+    day = _EPOCH_DAY + timedelta(days=days)
+    return (day.year - 1970) * 12 + day.month - 1
+
+
+class EnvState:
+    """
+    Daily / weekly / monthly EnvSeries for one symbol, kept in step:
+    add_daily_bar() updates the daily series and the forming weekly and
+    monthly bars in O(1).
+    """
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.revision = 0  # bumped by every add_daily_bar()
+        self.series = {kind: EnvSeries(kind) for kind in ("daily",) + HIGHER_KINDS}
+        # kind -> [period key, base bar (earlier days) or None, today's bar or None]
+        self._forming = {kind: None for kind in HIGHER_KINDS}
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Seeding from the CSV frames
+    # -----------------------------
+    def seed(self, dfs: dict) -> None:
+        """
+        Load the daily / weekly / monthly frames from env_brain.load_env_data().
+        """
+        self.seed_bars({kind: frame_bars(df) for kind, df in dfs.items()})
+
+    def seed_bars(self, bars: dict) -> None:
+        """
+        Load daily / weekly / monthly bar arrays (frame_bars() /
+        column_bars() layout, e.g. env_brain.load_env_bars()).
+        The current weekly / monthly bar is re-derived from the daily bars
+        so later daily bars can be folded into it.
+        """
+        daily = bars["daily"]
+        self.series["daily"].seed(*daily)
+        for kind in HIGHER_KINDS:
+            self._seed_higher(kind, bars[kind], daily)
+
+    def _seed_higher(self, kind, bars, daily) -> None:
+        series = self.series[kind]
+        d_ts = daily[0]
+        if len(d_ts) == 0:
+            series.seed(*bars)
+            if series.last is not None:
+                self._forming[kind] = [_period_key(series.last_ts, kind), series.last, None]
+            return
+
+        today = _row(daily, -1)
+        today_key = _period_key(today[_TS], kind)
+        keys = period_keys(bars[0], kind)
+        d_keys = period_keys(d_ts, kind)
+
+        # Higher file newer than the daily one: keep its last bar as is
+        if len(keys) and (keys[-1] > today_key or (keys[-1] == today_key and bars[0][-1] > today[_TS])):
+            series.seed(*bars)
+            self._forming[kind] = [int(keys[-1]), series.last, None]
+            return
+
+        done = int(np.searchsorted(keys, today_key))  # bars of earlier periods
+        series.seed(*(col[:done] for col in bars))
+
+        # Periods the higher file is missing (it lags the daily file)
+        after = keys[done - 1] if done else np.iinfo(np.int64).min
+        for key in np.unique(d_keys[(d_keys > after) & (d_keys < today_key)]):
+            rows = np.flatnonzero(d_keys == key)
+            bar = None
+            for i in rows:
+                bar = _merge(bar, _row(daily, i))
+            series.append(bar)
+
+        # This period's bar from the days strictly before today; today is
+        # folded in below exactly like add_daily_bar() would
+        earlier = np.flatnonzero((d_keys == today_key) & (d_ts < today[_TS]))
+        row = _row(bars, done) if done < len(keys) else None
+        if row is None or d_keys[0] < today_key or (row[_TS] == today[_TS] and len(earlier) == 0):
+            # The daily file has the whole period (or today opens it)
+            base = None
+            for i in earlier:
+                base = _merge(base, _row(daily, i))
+        elif row[_TS] < today[_TS]:
+            # The higher file's bar, plus the daily bars it doesn't have yet
+            base = row
+            for i in np.flatnonzero((d_ts > row[_TS]) & (d_ts < today[_TS])):
+                base = _merge(base, _row(daily, i))
+        else:
+            # The daily file starts inside this period and the higher bar
+            # already includes today: only its volume can be taken back out
+            base = row[:_VOLUME] + (row[_VOLUME] - today[_VOLUME],)
+
+        if base is not None:
+            series.append(base)
+            self._forming[kind] = [today_key, base, None]
+        self._fold(kind, today, new_day=True)
+
+    # -----------------------------
+    # Live updates
+    # -----------------------------
+    def add_daily_bar(self, bar: dict) -> None:
+        """
+        Apply one daily bar ({"timestamp", "open", "high", "low", "close",
+        "volume"}, timestamp as /feed/candle takes it). A bar for the last
+        day replaces it (today's bar still forming); an older day raises
+        ValueError.
+        """
+        ts = to_epoch(bar["timestamp"])
+        ts -= ts % SECONDS_PER_DAY
+        row = (ts, float(bar["open"]), float(bar["high"]), float(bar["low"]),
+               float(bar["close"]), float(bar.get("volume", 0.0)))
+
+        with self._lock:
+            daily = self.series["daily"]
+            last = daily.last_ts
+            if last is not None and ts < last:
+                raise ValueError(f"Daily bar {bar['timestamp']} is older than the last one")
+            new_day = last is None or ts > last
+            if new_day:
+                daily.append(row)
+            else:
+                daily.replace_last(row)
+
+            for kind in HIGHER_KINDS:
+                self._fold(kind, row, new_day)
+            self.revision += 1
+
+    def _fold(self, kind: str, row: tuple, new_day: bool) -> None:
+        """
+        Fold a daily bar into the forming weekly / monthly bar, or start
+        the next one.
+        """
+        key = _period_key(row[_TS], kind)
+        forming = self._forming[kind]
+        if forming is None or key > forming[0]:
+            self.series[kind].append(row)
+            self._forming[kind] = [key, None, row]
+        elif key == forming[0]:
+            if new_day and forming[2] is not None:
+                forming[1] = _merge(forming[1], forming[2])
+            forming[2] = row
+            self.series[kind].replace_last(_merge(forming[1], row))
+        # key < forming[0]: the higher file is ahead of the daily bars
+
+    def snapshot(self) -> dict:
+        """
+        Same shape as env_brain.get_environment().
+        """
+        with self._lock:
+            out = {"symbol": self.symbol}
+            for kind, series in self.series.items():
+                out[kind] = series.snapshot()
+            return out
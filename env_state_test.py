@@ -0,0 +1,157 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import env_brain
+from env_brain import build_env_state, compute_env_indicators, load_env_bars, load_env_data
+from env_state import EnvState
+
+KINDS = ("daily", "weekly", "monthly")
+FREQ = {"weekly": "W-FRI", "monthly": "M"}
+
+
+def make_daily(n=700, seed=5, start="2023-01-02"):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=n)
+    close = 400 + np.cumsum(rng.normal(0, 3, n))
+    open_ = close + rng.normal(0, 1, n)
+    df = pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + rng.uniform(0, 3, n),
+        "low": np.minimum(open_, close) - rng.uniform(0, 3, n),
+        "close": close,
+        "volume": rng.integers(1_000_000, 5_000_000, n).astype(np.int64),
+    }, index=dates)
+    df.index.name = "date"
+    return df
+
+
+def resample(daily, kind):
+    """
+    Weekly / monthly bars the way Alpha Vantage dates them: on the last
+    trading day of the period.
+    """
+    groups = daily.groupby(daily.index.to_period(FREQ[kind]))
+    out = pd.DataFrame({
+        "open": groups["open"].first(),
+        "high": groups["high"].max(),
+        "low": groups["low"].min(),
+        "close": groups["close"].last(),
+        "volume": groups["volume"].sum(),
+    })
+    out.index = pd.DatetimeIndex(groups.apply(lambda g: g.index[-1]).values, name="date")
+    return out
+
+
+def frames(daily):
+    return {"daily": daily, "weekly": resample(daily, "weekly"), "monthly": resample(daily, "monthly")}
+
+
+def bar(ts, row):
+    return {"timestamp": ts.strftime("%Y-%m-%d"), **{k: float(v) for k, v in row.items()}}
+
+
+def assert_matches_reference(state, dfs):
+    snap = state.snapshot()
+    for kind in KINDS:
+        expected = compute_env_indicators(dfs[kind], kind=kind)
+        assert snap[kind].keys() == expected.keys()
+        for key, value in expected.items():
+            got = snap[kind][key]
+            if isinstance(value, float) and math.isnan(value):
+                assert math.isnan(got), (kind, key)
+            elif isinstance(value, float):
+                assert got == pytest.approx(value, rel=1e-9), (kind, key)
+            else:
+                assert got == value, (kind, key)
+
+
+@pytest.mark.parametrize("n", [3, 15, 30, 120, 700])
+def test_seed_matches_reference(n):
+    dfs = frames(make_daily(n))
+    state = EnvState("X")
+    state.seed(dfs)
+    assert_matches_reference(state, dfs)
+
+
+@pytest.mark.parametrize("days", [1, 4, 9, 45])
+def test_daily_bars_match_full_recompute(days):
+    daily = make_daily(500)
+    state = EnvState("X")
+    state.seed(frames(daily.iloc[:-days]))
+    for ts, row in daily.iloc[-days:].iterrows():
+        # Today's bar while it forms, then the final one
+        partial = row.copy()
+        partial["high"] = row["high"] + 5  # an intraday high the final bar doesn't keep
+        partial["close"] = row["open"]
+        state.add_daily_bar(bar(ts, partial))
+        state.add_daily_bar(bar(ts, row))
+    assert_matches_reference(state, frames(daily))
+    assert state.revision == 2 * days
+
+
+def test_replacing_today_after_seed_undoes_its_high():
+    daily = make_daily(300)
+    seeded = daily.copy()
+    seeded.iloc[-1, seeded.columns.get_loc("high")] += 50  # weekly / monthly rows include it
+    state = EnvState("X")
+    state.seed(frames(seeded))
+    state.add_daily_bar(bar(daily.index[-1], daily.iloc[-1]))
+    assert_matches_reference(state, frames(daily))
+    # The snapshot only reads closes on weekly / monthly: check the bars
+    for kind in ("weekly", "monthly"):
+        expected = frames(daily)[kind].iloc[-1]
+        _, open_, high, low, close, volume = state.series[kind].last
+        assert (open_, high, low, close, volume) == pytest.approx(tuple(expected), rel=1e-12), kind
+
+
+def test_higher_files_lagging_the_daily_file():
+    daily = make_daily(400)
+    dfs = frames(daily)
+    lag = {"daily": daily, "weekly": dfs["weekly"].iloc[:-3], "monthly": dfs["monthly"].iloc[:-2]}
+    state = EnvState("X")
+    state.seed(lag)
+    assert_matches_reference(state, dfs)
+    for kind in ("weekly", "monthly"):
+        assert state.series[kind].count == len(dfs[kind])
+        assert state.series[kind].last[1:] == pytest.approx(tuple(dfs[kind].iloc[-1]), rel=1e-12)
+
+
+def test_older_day_is_rejected():
+    daily = make_daily(50)
+    state = EnvState("X")
+    state.seed(frames(daily))
+    with pytest.raises(ValueError):
+        state.add_daily_bar(bar(daily.index[-2], daily.iloc[-2]))
+
+
+def test_repo_data_matches_reference():
+    dfs = load_env_data("SPX")
+    state = EnvState("SPX")
+    state.seed(dfs)
+    assert_matches_reference(state, dfs)
+
+
+def test_windowed_load_matches_full_history(tmp_path, monkeypatch):
+    # ~23 years of dailies: more than LOOKBACK_DAYS of daily and weekly bars
+    dfs = frames(make_daily(6000, start="2002-01-01"))
+    monkeypatch.setattr(env_brain, "DATA_DIR", str(tmp_path))
+    for kind, df in dfs.items():
+        tmp_path.joinpath(kind).mkdir()
+        df.rename(columns=lambda c: {"open": "1. open", "high": "2. high", "low": "3. low",
+                                     "close": "4. close", "volume": "5. volume"}[c]) \
+            .to_csv(tmp_path / kind / f"X_{kind}.csv")
+
+    bars = load_env_bars("X")
+    newest = dfs["daily"].index[-1]
+    for kind, df in dfs.items():
+        ts = bars[kind][0]
+        first = pd.Timestamp(int(ts[0]), unit="s")
+        assert newest - first <= pd.Timedelta(days=env_brain.LOOKBACK_DAYS[kind]), kind
+        assert first == df.index[df.index >= newest - pd.Timedelta(days=env_brain.LOOKBACK_DAYS[kind])][0]
+        assert not bars[kind][4].flags.owndata  # the mapped column itself, not a copy
+    assert len(bars["daily"][0]) < len(dfs["daily"]) and len(bars["weekly"][0]) < len(dfs["weekly"])
+
+    assert_matches_reference(build_env_state("X"), dfs)
@@ -0,0 +1,420 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from datetime import time as dtime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from candle_store import MARKET_ZONE
+
+# This file bulk-downloads Schwab /pricehistory candles for many symbols
+# over a long date span.
+#
+# - the span is split into chunks (symbol x chunk_days); chunks run on a
+#   thread pool sharing one pooled requests.Session
+# - every request first takes a token from a token bucket, so N workers
+#   together stay under the API rate limit (Schwab: 120 requests/min)
+# - each finished chunk is written atomically to its own JSON file; that
+#   file IS the checkpoint: a killed run skips chunks that already exist
+# - 429 / 5xx / connection errors are retried with backoff (Retry-After
+#   is honoured); a 401 asks the token provider for a fresh token once
+#
+# StubPriceHistoryServer mimics /pricehistory locally (synthetic minute
+# candles, optional throttling / failures) so all of this can be run
+# without an account:
+#   python history_downloader.py SPX,QQQ --start 2024-09-01 --end 2024-10-31 --stub
+
+PRICEHISTORY_PATH = "/pricehistory"
+DEFAULT_OUT_DIR = os.path.join(os.path.dirname(__file__), "data", "pricehistory")
+
+DEFAULT_RATE = 2.0        # requests per second, across all workers
+DEFAULT_CHUNK_DAYS = 10   # minute history per request
+DEFAULT_RETRIES = 5
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, at most `burst`
+    banked. acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def market_day_ms(day: date) -> int:
+    """
+    Midnight (market time) of a calendar day as epoch milliseconds.
+    """
+    return int(datetime.combine(day, dtime(), tzinfo=MARKET_ZONE).timestamp() * 1000)
+
+
+def safe_name(symbol: str) -> str:
+    # "$SPX" -> "SPX", "BRK/B" -> "BRK_B"
+    return re.sub(r"[^A-Za-z0-9._-]", "_", symbol.lstrip("$"))
+
+
+def plan_chunks(symbols, start: date, end: date, chunk_days: int = DEFAULT_CHUNK_DAYS) -> list:
+    """
+    Split symbols x [start, end] (inclusive days) into request chunks.
+    Each chunk: {"id", "symbol", "start_ms", "end_ms"} with end_ms exclusive.
+    """
+    if end < start:
+        raise ValueError("end is before start")
+    chunks = []
+    for symbol in symbols:
+        day = start
+        while day <= end:
+            last = min(day + timedelta(days=chunk_days - 1), end)
+            chunks.append({
+                "id": f"{safe_name(symbol)}_{day:%Y%m%d}_{last:%Y%m%d}",
+                "symbol": symbol,
+                "start_ms": market_day_ms(day),
+                "end_ms": market_day_ms(last + timedelta(days=1)),
+            })
+            day = last + timedelta(days=1)
+    return chunks
+
+
+class BulkDownloader:
+    def __init__(self, base_url: str, out_dir: str = DEFAULT_OUT_DIR, token_provider=None,
+                 rate: float = DEFAULT_RATE, burst: float = None, workers: int = 4,
+                 retries: int = DEFAULT_RETRIES, timeout: float = 30.0,
+                 frequency_type: str = "minute", frequency: int = 1, extended_hours: bool = True):
+        """
+        token_provider: callable -> access token (called again after a 401),
+                        or None for servers without auth (the stub)
+        """
+        self.base_url = base_url.rstrip("/")
+        self.out_dir = out_dir
+        self.token_provider = token_provider
+        self.bucket = TokenBucket(rate, burst)
+        self.workers = workers
+        self.retries = retries
+        self.timeout = timeout
+        self.params = {
+            "periodType": "day",
+            "frequencyType": frequency_type,
+            "frequency": frequency,
+            "needExtendedHoursData": "true" if extended_hours else "false",
+        }
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._token = None
+        self._token_lock = threading.Lock()
+
+    # -----------------------------
+    # Checkpoints
+    # -----------------------------
+    def chunk_path(self, chunk: dict) -> str:
+        return os.path.join(self.out_dir, safe_name(chunk["symbol"]), f"{chunk['id']}.json")
+
+    def is_done(self, chunk: dict) -> bool:
+        return os.path.exists(self.chunk_path(chunk))
+
+    def _save(self, chunk: dict, candles: list) -> None:
+        path = self.chunk_path(chunk)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp{threading.get_ident()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**chunk, "candles": candles}, f)
+        os.replace(tmp, path)  # atomic: a chunk file is either complete or absent
+
+    # -----------------------------
+    # Requests
+    # -----------------------------
+    def _auth_header(self, refresh: bool = False) -> dict:
+        if self.token_provider is None:
+            return {}
+        with self._token_lock:
+            if self._token is None or refresh:
+                self._token = self.token_provider()
+            return {"Authorization": f"Bearer {self._token}"}
+
+    def fetch(self, chunk: dict) -> list:
+        """
+        Candles for one chunk (rate limited, with retries).
+        Raises RuntimeError once the retries are used up.
+        """
+        params = {
+            **self.params,
+            "symbol": chunk["symbol"],
+            "startDate": chunk["start_ms"],
+            "endDate": chunk["end_ms"],
+        }
+        refreshed = False
+        error = None
+        for attempt in range(self.retries):
+            self.bucket.acquire()
+            try:
+                r = self.session.get(
+                    f"{self.base_url}{PRICEHISTORY_PATH}", params=params,
+                    headers=self._auth_header(), timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                error = e
+                time.sleep(min(2 ** attempt, 30))
+                continue
+
+            if r.status_code == 200:
+                return r.json().get("candles", [])
+            if r.status_code == 401 and not refreshed and self.token_provider is not None:
+                self._auth_header(refresh=True)
+                refreshed = True
+                continue
+            if r.status_code == 429 or r.status_code >= 500:
+                error = f"status {r.status_code}"
+                retry_after = r.headers.get("Retry-After")
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    delay = min(2 ** attempt, 30)
+                time.sleep(delay)
+                continue
+            raise RuntimeError(f"status {r.status_code}: {r.text[:200]}")
+
+        raise RuntimeError(f"gave up after {self.retries} attempts: {error}")
+
+    def _download(self, chunk: dict) -> int:
+        candles = self.fetch(chunk)
+        self._save(chunk, candles)
+        return len(candles)
+
+    def run(self, chunks) -> dict:
+        """
+        Download every chunk that isn't checkpointed yet.
+        Returns {"chunks", "skipped", "downloaded", "failed", "candles", "elapsed", "errors"}.
+        """
+        started = time.perf_counter()
+        todo = [chunk for chunk in chunks if not self.is_done(chunk)]
+        summary = {
+            "chunks": len(chunks),
+            "skipped": len(chunks) - len(todo),
+            "downloaded": 0,
+            "failed": 0,
+            "candles": 0,
+            "errors": [],
+        }
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pricehistory") as pool:
+            futures = {pool.submit(self._download, chunk): chunk for chunk in todo}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    summary["candles"] += future.result()
+                    summary["downloaded"] += 1
+                except Exception as e:  # one bad chunk shouldn't stop the rest
+                    summary["failed"] += 1
+                    summary["errors"].append({"chunk": chunk["id"], "error": str(e)})
+
+        summary["elapsed"] = time.perf_counter() - started
+        return summary
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def load_downloaded(out_dir: str, symbol: str) -> list:
+    """
+    Every downloaded candle for a symbol, sorted by time, duplicates
+    (chunk overlaps) removed.
+    """
+    folder = os.path.join(out_dir, safe_name(symbol))
+    by_time = {}
+    if os.path.isdir(folder):
+        for name in sorted(os.listdir(folder)):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(folder, name), encoding="utf-8") as f:
+                for candle in json.load(f).get("candles", []):
+                    by_time[candle["datetime"]] = candle
+    return [by_time[k] for k in sorted(by_time)]
+
+
+# -------------------------------------------------
+# Local stub of /pricehistory
+# -------------------------------------------------
+class StubPriceHistoryServer:
+    """
+    Minimal /pricehistory look-alike on 127.0.0.1: regular-session minute
+    candles on weekdays, deterministic per symbol.
+
+    throttle_every: every Nth request gets a 429 (Retry-After: 0)
+    fail_every:     every Nth request gets a 500
+    """
+
+    def __init__(self, port: int = 0, throttle_every: int = 0, fail_every: int = 0):
+        self.throttle_every = throttle_every
+        self.fail_every = fail_every
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if not url.path.endswith(PRICEHISTORY_PATH):
+                    self._reply(404, {"error": "not found"})
+                    return
+                with stub._lock:
+                    stub.requests += 1
+                    n = stub.requests
+                if stub.throttle_every and n % stub.throttle_every == 0:
+                    self._reply(429, {"error": "throttled"}, {"Retry-After": "0"})
+                    return
+                if stub.fail_every and n % stub.fail_every == 0:
+                    self._reply(500, {"error": "boom"})
+                    return
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                try:
+                    symbol = query["symbol"]
+                    start_ms, end_ms = int(query["startDate"]), int(query["endDate"])
+                except (KeyError, ValueError):
+                    self._reply(400, {"error": "symbol, startDate and endDate are required"})
+                    return
+                candles = stub_candles(symbol, start_ms, end_ms)
+                self._reply(200, {"symbol": symbol, "empty": not candles, "candles": candles})
+
+            def _reply(self, status, body, headers=None):
+                raw = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *args):
+                pass  # quiet
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "StubPriceHistoryServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-pricehistory", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def stub_candles(symbol: str, start_ms: int, end_ms: int) -> list:
+    """
+    Deterministic 09:30-16:00 minute candles for weekdays in [start_ms, end_ms).
+    """
+    first = datetime.fromtimestamp(start_ms / 1000, tz=MARKET_ZONE).date()
+    last = datetime.fromtimestamp((end_ms - 1) / 1000, tz=MARKET_ZONE).date()
+    minutes = np.arange(390, dtype=np.int64) * 60_000
+    stamps = []
+    day = first
+    while day <= last:
+        if day.weekday() < 5:
+            open_ms = int(datetime.combine(day, dtime(9, 30), tzinfo=MARKET_ZONE).timestamp() * 1000)
+            stamps.append(open_ms + minutes)
+        day += timedelta(days=1)
+    if not stamps:
+        return []
+    ts = np.concatenate(stamps)
+    ts = ts[(ts >= start_ms) & (ts < end_ms)]
+
+    # Smooth, symbol-dependent price path (same candle for the same minute on every request)
+    seed = sum(ord(c) for c in symbol)
+    t = ts / 60_000.0
+    close = 100.0 + seed % 400 + 5.0 * np.sin(t / 97.0 + seed) + 2.0 * np.sin(t / 13.0)
+    open_ = close - 0.3 * np.cos(t / 7.0)
+    high = np.maximum(open_, close) + 0.25
+    low = np.minimum(open_, close) - 0.25
+    volume = 1000 + (ts // 60_000) % 500
+    return [
+        {"open": round(o, 2), "high": round(h, 2), "low": round(lo, 2), "close": round(c, 2),
+         "volume": int(v), "datetime": int(d)}
+        for o, h, lo, c, v, d in zip(open_.tolist(), high.tolist(), low.tolist(), close.tolist(),
+                                     volume.tolist(), ts.tolist())
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-download /pricehistory candles (resumable).")
+    parser.add_argument("symbols", help="comma-separated, e.g. '$SPX,QQQ'")
+    parser.add_argument("--start", required=True, help="first day, YYYY-MM-DD")
+    parser.add_argument("--end", required=True, help="last day, YYYY-MM-DD (inclusive)")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--chunk-days", type=int, default=DEFAULT_CHUNK_DAYS)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="requests per second")
+    parser.add_argument("--stub", action="store_true", help="run against a local stub server")
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    chunks = plan_chunks(symbols, date.fromisoformat(args.start), date.fromisoformat(args.end), args.chunk_days)
+
+    stub = None
+    if args.stub:
+        stub = StubPriceHistoryServer(throttle_every=7).start()
+        base_url, token_provider = stub.url, None
+        print(f"🧪 Using stub /pricehistory at {stub.url}")
+    else:
+        from schwab_data_manager import BASE_URL, authenticate
+
+        def token_provider():
+            tokens = authenticate()
+            if not tokens:
+                raise RuntimeError("Schwab authentication failed")
+            return tokens["access_token"]
+        base_url = BASE_URL
+
+    downloader = BulkDownloader(base_url, args.out, token_provider, rate=args.rate, workers=args.workers)
+    print(f"📥 {len(chunks)} chunks for {len(symbols)} symbol(s) → {args.out}")
+    try:
+        summary = downloader.run(chunks)
+    finally:
+        downloader.close()
+        if stub is not None:
+            stub.stop()
+
+    print(f"\n✅ Done in {summary['elapsed']:.1f}s: {summary['downloaded']} downloaded, "
+          f"{summary['skipped']} already done, {summary['failed']} failed, {summary['candles']:,} candles")
+    for err in summary["errors"]:
+        print(f"❌ {err['chunk']}: {err['error']}")
+
+
+if __name__ == "__main__":
+    main()
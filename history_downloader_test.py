@@ -0,0 +1,167 @@
+import json
+import os
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from history_downloader import (
+    BulkDownloader,
+    StubPriceHistoryServer,
+    TokenBucket,
+    load_downloaded,
+    market_day_ms,
+    plan_chunks,
+    stub_candles,
+)
+
+START = date(2024, 9, 2)
+END = date(2024, 9, 27)
+
+
+@pytest.fixture
+def stub():
+    server = StubPriceHistoryServer().start()
+    yield server
+    server.stop()
+
+
+def downloader(url, out_dir, **kwargs):
+    kwargs.setdefault("rate", 1000.0)
+    kwargs.setdefault("workers", 4)
+    return BulkDownloader(url, str(out_dir), **kwargs)
+
+
+def test_plan_chunks_tiles_the_span():
+    chunks = plan_chunks(["$SPX", "QQQ"], START, END, chunk_days=10)
+    # 26 days -> 10 + 10 + 6 per symbol
+    assert [c["id"] for c in chunks] == [
+        "SPX_20240902_20240911", "SPX_20240912_20240921", "SPX_20240922_20240927",
+        "QQQ_20240902_20240911", "QQQ_20240912_20240921", "QQQ_20240922_20240927",
+    ]
+    for symbol in ("$SPX", "QQQ"):
+        mine = [c for c in chunks if c["symbol"] == symbol]
+        assert mine[0]["start_ms"] == market_day_ms(START)
+        assert mine[-1]["end_ms"] == market_day_ms(END + timedelta(days=1))
+        for a, b in zip(mine, mine[1:]):
+            assert a["end_ms"] == b["start_ms"]
+
+    assert len(plan_chunks(["SPX"], START, START, chunk_days=10)) == 1
+    with pytest.raises(ValueError):
+        plan_chunks(["SPX"], END, START)
+
+
+def test_download_matches_the_source(stub, tmp_path):
+    chunks = plan_chunks(["SPX", "QQQ"], START, END, chunk_days=7)
+    dl = downloader(stub.url, tmp_path)
+    try:
+        summary = dl.run(chunks)
+    finally:
+        dl.close()
+
+    assert summary["downloaded"] == len(chunks) and summary["failed"] == 0
+    assert stub.requests == len(chunks)
+    for symbol in ("SPX", "QQQ"):
+        expected = stub_candles(symbol, market_day_ms(START), market_day_ms(END + timedelta(days=1)))
+        assert load_downloaded(str(tmp_path), symbol) == expected
+    assert summary["candles"] == 2 * 20 * 390  # 20 weekdays of regular-session minutes
+
+
+def test_retries_throttling_and_server_errors(tmp_path):
+    # Every 3rd request is a 429, every 7th a 500; all chunks still land
+    stub = StubPriceHistoryServer(throttle_every=3, fail_every=7).start()
+    chunks = plan_chunks(["SPX"], START, END, chunk_days=5)
+    dl = downloader(stub.url, tmp_path, workers=2)
+    try:
+        summary = dl.run(chunks)
+    finally:
+        dl.close()
+        stub.stop()
+
+    assert summary["failed"] == 0, summary["errors"]
+    assert summary["downloaded"] == len(chunks)
+    assert stub.requests > len(chunks)
+    assert load_downloaded(str(tmp_path), "SPX") == stub_candles(
+        "SPX", market_day_ms(START), market_day_ms(END + timedelta(days=1)))
+
+
+def test_gives_up_and_reports_the_chunk(tmp_path):
+    stub = StubPriceHistoryServer(throttle_every=1).start()  # always 429
+    chunks = plan_chunks(["SPX"], START, START, chunk_days=1)
+    dl = downloader(stub.url, tmp_path, retries=3)
+    try:
+        summary = dl.run(chunks)
+    finally:
+        dl.close()
+        stub.stop()
+
+    assert summary["failed"] == 1 and summary["downloaded"] == 0
+    assert summary["errors"][0]["chunk"] == chunks[0]["id"]
+    assert "status 429" in summary["errors"][0]["error"]
+    assert stub.requests == 3
+    assert not dl.is_done(chunks[0])
+
+
+def test_client_errors_are_not_retried(stub, tmp_path):
+    dl = downloader(stub.url, tmp_path)
+    bad = {"id": "bad", "symbol": "SPX", "start_ms": "soon", "end_ms": 0}
+    try:
+        with pytest.raises(RuntimeError, match="status 400"):
+            dl.fetch(bad)
+    finally:
+        dl.close()
+    assert stub.requests == 1
+
+
+def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate=50.0, burst=1)
+    started = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    # The first token is banked, the other 10 come at 50/s
+    assert time.monotonic() - started >= 10 / 50.0 * 0.9
+
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_downloader_shares_one_rate_limit(stub, tmp_path):
+    chunks = plan_chunks(["SPX", "QQQ"], START, END, chunk_days=5)  # 12 chunks
+    dl = downloader(stub.url, tmp_path, rate=40.0, burst=1, workers=6)
+    try:
+        summary = dl.run(chunks)
+    finally:
+        dl.close()
+    assert summary["downloaded"] == 12
+    # 6 workers, but together no faster than 40 requests/s
+    assert summary["elapsed"] >= 11 / 40.0 * 0.9
+
+
+def test_resume_skips_finished_chunks(stub, tmp_path):
+    chunks = plan_chunks(["SPX", "QQQ"], START, END, chunk_days=5)
+    first = downloader(stub.url, tmp_path)
+    try:
+        partial = first.run(chunks[:5])  # a run killed part way through
+    finally:
+        first.close()
+    assert partial["downloaded"] == 5
+    # A write that died before os.replace leaves only a tmp file behind
+    dead = first.chunk_path(chunks[5]) + ".tmp123"
+    os.makedirs(os.path.dirname(dead), exist_ok=True)
+    with open(dead, "w") as f:
+        f.write("{")
+
+    second = downloader(stub.url, tmp_path)
+    try:
+        resumed = second.run(chunks)
+    finally:
+        second.close()
+
+    assert resumed["skipped"] == 5
+    assert resumed["downloaded"] == len(chunks) - 5
+    assert stub.requests == len(chunks)  # nothing fetched twice
+    with open(second.chunk_path(chunks[5]), encoding="utf-8") as f:
+        assert json.load(f)["id"] == chunks[5]["id"]
+    for symbol in ("SPX", "QQQ"):
+        assert load_downloaded(str(tmp_path), symbol) == stub_candles(
+            symbol, market_day_ms(START), market_day_ms(END + timedelta(days=1)))
@@ -0,0 +1,70 @@
+import hashlib
+
+from flask import Response, g, request
+
+# This file holds the conditional-GET helpers for the read routes.
+#
+# - ETags are built from the versions of the series a response depends
+#   on (plus the store epoch, since versions restart with the process),
+#   so a route can answer If-None-Match with 304 before computing anything
+# - "since" requests get only the fields that changed since a version
+#   the client already has (the old snapshot comes from SnapshotCache's
+#   short history; if it's gone the client gets the full response)
+# - a request that sets g.uncached (profiled requests, see app.py) always
+#   gets the full body: its response is one of a kind
+
+
+def make_etag(epoch: str, route: str, params, versions: dict) -> str:
+    """
+    Strong ETag for one representation: route + the query args that shape
+    it + the versions it was built from.
+    """
+    raw = repr((route, tuple(params), sorted(versions.items())))
+    return f"{epoch}-{hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()}"
+
+
+def not_modified(etag: str):
+    """
+    A 304 response if the client's If-None-Match covers etag, else None.
+    """
+    if g.get("uncached"):
+        return None
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def tag(response, etag: str):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"  # always revalidate
+    return response
+
+
+def parse_since(text: str) -> dict:
+    """
+    "5m:12,1h:3,environment:ab12cd34" -> {"5m": "12", "1h": "3", ...}.
+    Raises ValueError with a client-facing message.
+    """
+    out = {}
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        key, sep, value = part.partition(":")
+        if not sep or not key.strip() or not value.strip():
+            raise ValueError(f"since must look like '5m:12,1h:3', got {part!r}")
+        out[key.strip()] = value.strip()
+    return out
+
+
+def dict_delta(old: dict, new: dict) -> tuple:
+    """
+    (changed, removed): keys of new whose value differs from old, and keys
+    that are gone.
+    """
+    old = old or {}
+    new = new or {}
+    changed = {k: v for k, v in new.items() if k not in old or old[k] != v}
+    removed = [k for k in old if k not in new]
+    return changed, removed
@@ -0,0 +1,333 @@
+import math
+from collections import deque
+
+import numpy as np
+
+from indicators import compute_distance_from_ema, compute_ema_series
+
+# This file keeps the indicator math from indicators.compute_indicators
+# as running state, so each new candle costs O(1) instead of a full
+# DataFrame rebuild over the whole candle list.
+#
+# The numbers match compute_indicators() bar for bar. The only caveat is
+# once the store trims its history: compute_indicators() re-seeds the EMAs
+# from the first kept candle, while the engine keeps the longer history.
+# With a 300 bar window that seed effect is below 1e-5 of the price move.
+
+
+EMA_SPANS = (5, 10, 20, 50)
+MA_WINDOWS = (5, 9, 20)
+BOLL_WINDOW = 20
+RSI_WINDOW = 14
+ATR_WINDOW = 14
+WILLR_WINDOW = 14
+AO_FAST = 5
+AO_SLOW = 34
+MOM_PERIOD = 10
+
+
+def _ema_step(prev, value, span):
+    """
+    One step of pandas ewm(span=span, adjust=False).mean().
+    """
+    if prev is None:
+        return value
+    alpha = 2.0 / (span + 1.0)
+    return alpha * value + (1.0 - alpha) * prev
+
+
+def _mean(values):
+    return sum(values) / len(values)
+
+
+def _nan_mean(values):
+    """
+    Mean that skips None, like pandas rolling(min_periods=1) skips NaN.
+    """
+    present = [v for v in values if v is not None]
+    if not present:
+        return math.nan
+    return sum(present) / len(present)
+
+
+def _seeded_ema(prev, values, span):
+    """
+    EMA series over values, continuing from a previous EMA value (or None).
+    """
+    if prev is None:
+        return compute_ema_series(values, span)
+    return compute_ema_series(np.concatenate(([prev], values)), span)[1:]
+
+
+_NOTHING = object()
+
+
+def _push(values, item, undo):
+    """
+    Append to a bounded deque, remembering what fell off the left so the
+    append can be undone (see IndicatorEngine.replace_last).
+    """
+    evicted = values[0] if len(values) == values.maxlen else _NOTHING
+    values.append(item)
+    undo.append((values, evicted))
+
+
+def _tail(values, n):
+    """
+    Last n items of a list (or all of them when there are fewer).
+    """
+    return values[-n:] if len(values) > n else values
+
+
+class IndicatorEngine:
+    """
+    Running indicator state for ONE (symbol, timeframe) series.
+
+    Usage:
+        engine = IndicatorEngine()
+        engine.update(candle)     # candle dict like /feed/candle stores
+        latest = engine.latest()  # same shape as compute_indicators()[0]
+
+    replace_last(candle) swaps the most recent bar for an updated one
+    (a still-forming bar), also in O(1).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._last_candle = None
+        self._prev_close = None
+
+        # EMA5/10/20/50 plus the MACD 12/26 pair and its 9 signal line
+        self._ema = {span: None for span in EMA_SPANS}
+        self._ema12 = None
+        self._ema26 = None
+        self._macd_signal = None
+
+        # Rolling windows (fixed size, so every update is O(1))
+        self._closes = deque(maxlen=max(BOLL_WINDOW, MOM_PERIOD + 1, max(MA_WINDOWS)))
+        self._gains = deque(maxlen=RSI_WINDOW)
+        self._losses = deque(maxlen=RSI_WINDOW)
+        self._true_ranges = deque(maxlen=ATR_WINDOW)
+        self._highs = deque(maxlen=WILLR_WINDOW)
+        self._lows = deque(maxlen=WILLR_WINDOW)
+        self._medians = deque(maxlen=AO_SLOW)
+
+        # What the last update() changed, so replace_last() can roll it back
+        self._undo = None
+
+    def update(self, candle: dict) -> None:
+        """
+        Feed the next candle (oldest -> newest order).
+        """
+        high = float(candle["high"])
+        low = float(candle["low"])
+        close = float(candle["close"])
+
+        pushed = []
+        self._undo = (
+            dict(self._ema), self._ema12, self._ema26, self._macd_signal,
+            self._prev_close, self._last_candle, pushed,
+        )
+
+        for span in EMA_SPANS:
+            self._ema[span] = _ema_step(self._ema[span], close, span)
+
+        self._ema12 = _ema_step(self._ema12, close, 12)
+        self._ema26 = _ema_step(self._ema26, close, 26)
+        self._macd_signal = _ema_step(self._macd_signal, self._ema12 - self._ema26, 9)
+
+        # RSI: the first bar has no delta (NaN in pandas)
+        if self._prev_close is None:
+            _push(self._gains, None, pushed)
+            _push(self._losses, None, pushed)
+            true_range = high - low
+        else:
+            delta = close - self._prev_close
+            _push(self._gains, max(delta, 0.0), pushed)
+            _push(self._losses, max(-delta, 0.0), pushed)
+            true_range = max(
+                high - low,
+                abs(high - self._prev_close),
+                abs(low - self._prev_close),
+            )
+
+        _push(self._true_ranges, true_range, pushed)
+        _push(self._closes, close, pushed)
+        _push(self._highs, high, pushed)
+        _push(self._lows, low, pushed)
+        _push(self._medians, (candle["high"] + candle["low"]) / 2, pushed)
+
+        self._prev_close = close
+        self._last_candle = candle
+        self.count += 1
+
+    def update_many(self, high, low, close, last_candle: dict) -> None:
+        """
+        Feed many candles at once from float64 arrays (oldest -> newest).
+        last_candle is the dict for the final bar (what latest() reports).
+
+        Same end state as calling update() per bar, but the EMAs run
+        vectorized and the windows only keep their tails.
+        """
+        n = len(close)
+        if n == 0:
+            return
+        if n > 1:
+            self._bulk(high[:-1], low[:-1], close[:-1])
+        # The last bar goes through update() so replace_last() still works
+        self.update(last_candle)
+
+    def _bulk(self, high, low, close):
+        for span in EMA_SPANS:
+            self._ema[span] = float(_seeded_ema(self._ema[span], close, span)[-1])
+
+        ema12 = _seeded_ema(self._ema12, close, 12)
+        ema26 = _seeded_ema(self._ema26, close, 26)
+        self._macd_signal = float(_seeded_ema(self._macd_signal, ema12 - ema26, 9)[-1])
+        self._ema12 = float(ema12[-1])
+        self._ema26 = float(ema26[-1])
+
+        prev_close = np.empty_like(close)
+        prev_close[0] = np.nan if self._prev_close is None else self._prev_close
+        prev_close[1:] = close[:-1]
+
+        delta = close - prev_close
+        gains = [None if math.isnan(d) else max(d, 0.0) for d in delta[-RSI_WINDOW:].tolist()]
+        losses = [None if math.isnan(d) else max(-d, 0.0) for d in delta[-RSI_WINDOW:].tolist()]
+        true_range = np.fmax.reduce([
+            high - low,
+            np.abs(high - prev_close),
+            np.abs(low - prev_close),
+        ])
+
+        self._gains.extend(gains)
+        self._losses.extend(losses)
+        self._true_ranges.extend(true_range[-ATR_WINDOW:].tolist())
+        self._closes.extend(close[-self._closes.maxlen:].tolist())
+        self._highs.extend(high[-WILLR_WINDOW:].tolist())
+        self._lows.extend(low[-WILLR_WINDOW:].tolist())
+        self._medians.extend(((high[-AO_SLOW:] + low[-AO_SLOW:]) / 2).tolist())
+
+        self._prev_close = float(close[-1])
+        self._last_candle = None
+        self._undo = None
+        self.count += len(close)
+
+    def replace_last(self, candle: dict) -> None:
+        """
+        Replace the most recent candle (e.g. a forming 5m bar that just got
+        another minute). Falls back to update() if there is nothing to replace.
+        """
+        if self._undo is None:
+            self.update(candle)
+            return
+
+        ema, ema12, ema26, macd_signal, prev_close, last_candle, pushed = self._undo
+        for values, evicted in reversed(pushed):
+            values.pop()
+            if evicted is not _NOTHING:
+                values.appendleft(evicted)
+
+        self._ema = ema
+        self._ema12 = ema12
+        self._ema26 = ema26
+        self._macd_signal = macd_signal
+        self._prev_close = prev_close
+        self._last_candle = last_candle
+        self.count -= 1
+
+        self.update(candle)
+
+    def latest(self):
+        """
+        Returns the indicator snapshot for the last candle, or None if empty.
+        Keys match compute_indicators()[0].
+        """
+        if self._last_candle is None:
+            return None
+
+        latest = dict(self._last_candle)
+        for col in ("open", "high", "low", "close", "volume"):
+            if col in latest:
+                latest[col] = float(latest[col])
+        close = latest["close"]
+
+        # EMAs / MAs
+        for span in EMA_SPANS:
+            latest[f"EMA{span}"] = self._ema[span]
+        closes = list(self._closes)
+        for window in MA_WINDOWS:
+            latest[f"MA{window}"] = _mean(_tail(closes, window))
+
+        # Bollinger Bands (population std, like rolling().std(ddof=0))
+        boll_closes = _tail(closes, BOLL_WINDOW)
+        mid = _mean(boll_closes)
+        std = math.sqrt(sum((c - mid) ** 2 for c in boll_closes) / len(boll_closes))
+        latest["BOLL_MID"] = mid
+        latest["BOLL_UPPER"] = mid + 2 * std
+        latest["BOLL_LOWER"] = mid - 2 * std
+
+        # MACD 12, 26, 9
+        macd_line = self._ema12 - self._ema26
+        latest["MACD_LINE"] = macd_line
+        latest["MACD_SIGNAL"] = self._macd_signal
+        latest["MACD_HIST"] = macd_line - self._macd_signal
+
+        # RSI 14
+        avg_gain = _nan_mean(self._gains)
+        avg_loss = _nan_mean(self._losses)
+        rs = avg_gain / (avg_loss + 1e-9)
+        latest["RSI14"] = 100 - (100 / (1 + rs))
+
+        # ATR 14
+        latest["ATR14"] = _mean(self._true_ranges)
+
+        # Williams %R 14
+        hh = max(self._highs)
+        ll = min(self._lows)
+        latest["WILLR14"] = -100 * ((hh - close) / (hh - ll + 1e-9))
+
+        # ---- PHASE 2 ADDITIONS ----
+        if self.count >= AO_SLOW:
+            medians = list(self._medians)
+            latest["AO"] = _mean(medians[-AO_FAST:]) - _mean(medians)
+        else:
+            latest["AO"] = None
+
+        if self.count >= MOM_PERIOD + 1:
+            latest["MOM10"] = self._closes[-1] - self._closes[-1 - MOM_PERIOD]
+        else:
+            latest["MOM10"] = None
+
+        # TTM Squeeze (same rules as compute_ttm_squeeze)
+        ema20 = latest["EMA20"]
+        atr14 = latest["ATR14"]
+        kc_upper = ema20 + atr14 * 1.5
+        kc_lower = ema20 - atr14 * 1.5
+        latest["KC_UPPER"] = kc_upper
+        latest["KC_LOWER"] = kc_lower
+        latest["SQUEEZE_ON"] = (latest["BOLL_UPPER"] < kc_upper) and (latest["BOLL_LOWER"] > kc_lower)
+        if self.count >= BOLL_WINDOW:
+            latest["SQUEEZE_MOM"] = closes[-1] - mid
+        else:
+            latest["SQUEEZE_MOM"] = None
+
+        # Distance from EMA20 / EMA50
+        dist_20, dist_20_pct = compute_distance_from_ema(close, ema20)
+        dist_50, dist_50_pct = compute_distance_from_ema(close, latest["EMA50"])
+        latest["DIST_EMA20"] = dist_20
+        latest["DIST_EMA20_PCT"] = dist_20_pct
+        latest["DIST_EMA50"] = dist_50
+        latest["DIST_EMA50_PCT"] = dist_50_pct
+
+        return latest
+
+
+def build_engine(candles) -> IndicatorEngine:
+    """
+    Replay a list of candles into a fresh engine.
+    """
+    engine = IndicatorEngine()
+    for candle in candles:
+        engine.update(candle)
+    return engine
@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+import pytest
+
+from indicator_engine import IndicatorEngine, build_engine
+from indicators import compute_indicators
+
+
+def make_candles(n, seed=1, start_price=100.0):
+    rng = np.random.default_rng(seed)
+    close = start_price + np.cumsum(rng.normal(0, 0.5, n))
+    candles = []
+    for i, c in enumerate(close):
+        o = c + rng.normal(0, 0.2)
+        candles.append({
+            "timestamp": f"2025-11-26T10:{i // 60:02d}:{i % 60:02d}",
+            "timeframe": "1m",
+            "symbol": "SPX",
+            "open": float(o),
+            "high": float(max(o, c) + abs(rng.normal(0, 0.3))),
+            "low": float(min(o, c) - abs(rng.normal(0, 0.3))),
+            "close": float(c),
+            "volume": float(rng.integers(100, 1000)),
+        })
+    return candles
+
+
+def assert_same(latest, expected):
+    assert latest.keys() == expected.keys()
+    for key, value in expected.items():
+        got = latest[key]
+        if isinstance(value, float) and not isinstance(value, bool):
+            if math.isnan(value):
+                assert math.isnan(got), key
+            else:
+                assert got == pytest.approx(value, rel=1e-9, abs=1e-9), key
+        else:
+            assert got == value, key
+
+
+@pytest.mark.parametrize("n", [1, 2, 13, 14, 20, 34, 35, 120])
+def test_update_matches_batch(n):
+    candles = make_candles(n)
+    assert_same(build_engine(candles).latest(), compute_indicators(candles)[0])
+
+
+def test_replace_last_matches_batch():
+    candles = make_candles(60)
+    engine = build_engine(candles)
+    forming = dict(candles[-1], high=candles[-1]["high"] + 2, close=candles[-1]["close"] + 1.5)
+    engine.replace_last(forming)
+    engine.replace_last(dict(forming, close=forming["close"] - 0.5))
+    expected = compute_indicators(candles[:-1] + [dict(forming, close=forming["close"] - 0.5)])[0]
+    assert_same(engine.latest(), expected)
+    assert engine.count == 60
+
+
+def test_update_many_matches_update():
+    candles = make_candles(80)
+    bulk = IndicatorEngine()
+    head = candles[:50]
+    bulk.update_many(
+        np.array([c["high"] for c in head]), np.array([c["low"] for c in head]),
+        np.array([c["close"] for c in head]), head[-1],
+    )
+    for candle in candles[50:]:
+        bulk.update(candle)
+    assert_same(bulk.latest(), build_engine(candles).latest())
+
+
+def test_empty_engine():
+    assert IndicatorEngine().latest() is None
@@ -1,5 +1,12 @@
+from collections.abc import Sequence
+
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from metrics import timed
+
+PRICE_COLUMNS = ("open", "high", "low", "close", "volume")
 
 # === PHASE 2 HELPERS & INDICATORS ===
 
@@ -21,15 +28,20 @@ def compute_ao(candles):
     if len(candles) < 34:
         return None
 
-    median_prices = [(c['high'] + c['low']) / 2 for c in candles]
+    high = np.array([c['high'] for c in candles], dtype=np.float64)
+    low = np.array([c['low'] for c in candles], dtype=np.float64)
+    return _ao_from_arrays(high, low)
 
-    sma5 = compute_sma(median_prices, 5)
-    sma34 = compute_sma(median_prices, 34)
 
-    if sma5 is None or sma34 is None:
+def _ao_from_arrays(high, low):
+    """
+    AO on already-extracted float64 high/low arrays.
+    """
+    if len(high) < 34:
         return None
 
-    return sma5 - sma34
+    median_prices = (high[-34:] + low[-34:]) / 2
+    return float(median_prices[-5:].mean() - median_prices.mean())
 
 
 def compute_momentum(candles, period=10):
@@ -44,13 +56,24 @@ def compute_momentum(candles, period=10):
     return close_now - close_past
 
 
-def compute_ttm_squeeze(candles, ema20, atr14, boll_mid, boll_upper, boll_lower):
+def _momentum_from_closes(closes, period=10):
+    """
+    MOM on an already-extracted float64 close array.
+    """
+    if len(closes) < period + 1:
+        return None
+    return float(closes[-1] - closes[-1 - period])
+
+
+def compute_ttm_squeeze(candles, ema20, atr14, boll_mid, boll_upper, boll_lower, closes=None):
     """
     Simplified TTM Squeeze:
 
     - Build Keltner Channels using EMA20 and ATR14 * 1.5
     - SQUEEZE_ON = Bollinger Bands inside Keltner
     - SQUEEZE_MOM = close_now - SMA20(close)
+
+    closes: optional float64 close array (skips walking the candle dicts)
     """
     if ema20 is None or atr14 is None or boll_mid is None or boll_upper is None or boll_lower is None:
         return {
@@ -66,12 +89,18 @@ def compute_ttm_squeeze(candles, ema20, atr14, boll_mid, boll_upper, boll_lower)
     # BB inside KC => squeeze ON
     squeeze_on = (boll_upper < kc_upper) and (boll_lower > kc_lower)
 
-    closes = [c['close'] for c in candles]
-    sma20 = compute_sma(closes, 20)
+    if closes is None:
+        closes = [c['close'] for c in candles]
+        sma20 = compute_sma(closes, 20)
+    elif len(closes) < 20:
+        sma20 = None
+    else:
+        sma20 = float(closes[-20:].mean())
+
     if sma20 is None:
         squeeze_mom = None
     else:
-        squeeze_mom = closes[-1] - sma20
+        squeeze_mom = float(closes[-1]) - sma20
 
     return {
         'KC_UPPER': kc_upper,
@@ -106,96 +135,246 @@ def compute_ema_slope(ema_series, lookback=5):
     return ema_now - ema_past
 
 
-def compute_indicators(candles):
+# === NUMPY CORE (no DataFrame) ===
+# Same math as the pandas version (ewm adjust=False, rolling min_periods=1,
+# NaN skipped inside windows), on contiguous float64 arrays.
+
+_EMA_CHUNK = 128
+
+
+def _to_float_array(values):
     """
-    candles: list of dicts with:
-    timestamp, timeframe, open, high, low, close, volume, symbol (symbol optional for older data)
+    float64 array from raw values; bad entries become NaN (like pd.to_numeric(errors="coerce")).
     """
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
 
-    if not candles:
-        return None, []
 
-    df = pd.DataFrame(candles).copy()
+def candles_to_arrays(candles) -> dict:
+    """
+    Extract open/high/low/close/volume from candle dicts into float64 arrays (one pass per column).
+    """
+    return {col: _to_float_array([c.get(col) for c in candles]) for col in PRICE_COLUMNS}
 
-    # Ensure numeric
-    for col in ["open", "high", "low", "close", "volume"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
 
-    # -----------------------------
+def compute_ema_series(values, span):
+    """
+    Same as pd.Series(values).ewm(span=span, adjust=False).mean().
+
+    The recursion is solved in closed form per chunk, so numpy does the work:
+    ema[j] = decay^(j+1) * prev + alpha * sum_k decay^(j-k) * x[k]
+    """
+    n = len(values)
+    if n == 0:
+        return np.empty(0)
+    if np.isnan(values).any():
+        # NaN weighting rules in pandas are not worth re-deriving here
+        return pd.Series(values).ewm(span=span, adjust=False).mean().to_numpy()
+
+    alpha = 2.0 / (span + 1.0)
+    decay = 1.0 - alpha
+
+    steps = np.arange(_EMA_CHUNK)
+    growth = decay ** -steps
+    shrink = decay ** steps
+
+    out = np.empty(n)
+    out[0] = values[0]
+    prev = values[0]
+    i = 1
+    while i < n:
+        chunk = values[i:i + _EMA_CHUNK]
+        m = len(chunk)
+        acc = np.cumsum(chunk * growth[:m]) * shrink[:m]
+        out[i:i + m] = shrink[:m] * decay * prev + alpha * acc
+        prev = out[i + m - 1]
+        i += m
+    return out
+
+
+def _windows(values, window):
+    """
+    (n, window) view of trailing windows; the head is padded with NaN so
+    every row holds up to 'window' values ending at that bar.
+    """
+    padded = np.concatenate([np.full(window - 1, np.nan), values])
+    return sliding_window_view(padded, window)
+
+
+def _rolling_mean(values, window):
+    w = _windows(values, window)
+    valid = ~np.isnan(w)
+    count = valid.sum(axis=1)
+    total = np.where(valid, w, 0.0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def _rolling_std(values, window):
+    """
+    Population std (ddof=0) over trailing windows.
+    """
+    w = _windows(values, window)
+    valid = ~np.isnan(w)
+    count = valid.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(valid, w, 0.0).sum(axis=1) / count
+        sq = np.where(valid, (w - mean[:, None]) ** 2, 0.0).sum(axis=1)
+        return np.where(count > 0, np.sqrt(sq / count), np.nan)
+
+
+def _rolling_max(values, window):
+    return np.fmax.reduce(_windows(values, window), axis=1)
+
+
+def _rolling_min(values, window):
+    return np.fmin.reduce(_windows(values, window), axis=1)
+
+
+def compute_indicator_columns(high, low, close) -> dict:
+    """
+    Full indicator columns (one value per bar) from float64 arrays.
+    Keys are the DataFrame columns compute_indicators used to add.
+    """
+    cols = {}
+
     # EMAs
-    # -----------------------------
     for span in (5, 10, 20, 50):
-        df[f"EMA{span}"] = df["close"].ewm(span=span, adjust=False).mean()
+        cols[f"EMA{span}"] = compute_ema_series(close, span)
 
-    # -----------------------------
     # MAs
-    # -----------------------------
     for window in (5, 9, 20):
-        df[f"MA{window}"] = df["close"].rolling(window=window, min_periods=1).mean()
+        cols[f"MA{window}"] = _rolling_mean(close, window)
 
-    # -----------------------------
     # Bollinger Bands
-    # -----------------------------
-    mid = df["close"].rolling(20, min_periods=1).mean()
-    std = df["close"].rolling(20, min_periods=1).std(ddof=0)
-
-    df["BOLL_MID"] = mid
-    df["BOLL_UPPER"] = mid + 2 * std
-    df["BOLL_LOWER"] = mid - 2 * std
+    mid = cols["MA20"]
+    std = _rolling_std(close, 20)
+    cols["BOLL_MID"] = mid
+    cols["BOLL_UPPER"] = mid + 2 * std
+    cols["BOLL_LOWER"] = mid - 2 * std
 
-    # -----------------------------
     # MACD 12, 26, 9
-    # -----------------------------
-    ema12 = df["close"].ewm(span=12, adjust=False).mean()
-    ema26 = df["close"].ewm(span=26, adjust=False).mean()
-
-    df["MACD_LINE"] = ema12 - ema26
-    df["MACD_SIGNAL"] = df["MACD_LINE"].ewm(span=9, adjust=False).mean()
-    df["MACD_HIST"] = df["MACD_LINE"] - df["MACD_SIGNAL"]
+    macd_line = compute_ema_series(close, 12) - compute_ema_series(close, 26)
+    cols["MACD_LINE"] = macd_line
+    cols["MACD_SIGNAL"] = compute_ema_series(macd_line, 9)
+    cols["MACD_HIST"] = macd_line - cols["MACD_SIGNAL"]
 
-    # -----------------------------
     # RSI 14
-    # -----------------------------
-    delta = df["close"].diff()
-    gains = delta.clip(lower=0)
-    losses = -delta.clip(upper=0)
+    delta = np.empty_like(close)
+    delta[:1] = np.nan
+    delta[1:] = close[1:] - close[:-1]
+    gains = np.clip(delta, 0, None)
+    losses = -np.clip(delta, None, 0)
+    avg_gain = _rolling_mean(gains, 14)
+    avg_loss = _rolling_mean(losses, 14)
+    rs = avg_gain / (avg_loss + 1e-9)
+    cols["RSI14"] = 100 - (100 / (1 + rs))
 
-    avg_gain = gains.rolling(14, min_periods=1).mean()
-    avg_loss = losses.rolling(14, min_periods=1).mean()
+    # ATR 14
+    prev_close = np.empty_like(close)
+    prev_close[:1] = np.nan
+    prev_close[1:] = close[:-1]
+    true_range = np.fmax.reduce([
+        high - low,
+        np.abs(high - prev_close),
+        np.abs(low - prev_close),
+    ])
+    cols["ATR14"] = _rolling_mean(true_range, 14)
 
-    RS = avg_gain / (avg_loss + 1e-9)
+    # Williams %R 14
+    hh = _rolling_max(high, 14)
+    ll = _rolling_min(low, 14)
+    cols["WILLR14"] = -100 * ((hh - close) / (hh - ll + 1e-9))
 
-    df["RSI14"] = 100 - (100 / (1 + RS))
+    return cols
 
-    # -----------------------------
-    # ATR 14
-    # -----------------------------
-    prev_close = df["close"].shift(1)
 
-    tr1 = df["high"] - df["low"]
-    tr2 = (df["high"] - prev_close).abs()
-    tr3 = (df["low"] - prev_close).abs()
+def compute_ao_series(high, low):
+    """
+    Per-bar AO (SMA5 - SMA34 of the median price); NaN until 34 bars exist.
+    """
+    median_prices = (high + low) / 2
+    out = np.full(len(median_prices), np.nan)
+    if len(median_prices) >= 34:
+        fast = sliding_window_view(median_prices, 5).mean(axis=1)
+        slow = sliding_window_view(median_prices, 34).mean(axis=1)
+        out[33:] = fast[29:] - slow
+    return out
 
-    true_range = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
 
-    df["ATR14"] = true_range.rolling(14, min_periods=1).mean()
+def compute_momentum_series(close, period=10):
+    """
+    Per-bar MOM (close - close n bars ago); NaN for the first n bars.
+    """
+    out = np.full(len(close), np.nan)
+    out[period:] = close[period:] - close[:-period]
+    return out
 
-    # -----------------------------
-    # Williams %R 14
-    # -----------------------------
-    hh = df["high"].rolling(14, min_periods=1).max()
-    ll = df["low"].rolling(14, min_periods=1).min()
 
-    df["WILLR14"] = -100 * ((hh - df["close"]) / (hh - ll + 1e-9))
+class IndicatorRows(Sequence):
+    """
+    Lazy stand-in for df.to_dict(orient="records").
+    Rows are only built when somebody actually indexes or iterates.
+    """
+
+    def __init__(self, candles, arrays, columns):
+        self._candles = candles
+        self._arrays = arrays
+        self._columns = columns
+
+    def __len__(self):
+        return len(self._candles)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+
+        row = dict(self._candles[index])
+        for col, values in self._arrays.items():
+            row[col] = float(values[index])
+        for col, values in self._columns.items():
+            row[col] = float(values[index])
+        return row
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+
+def compute_indicators_from_arrays(candles, arrays):
+    """
+    Same as compute_indicators(), for callers that already hold the float64
+    open/high/low/close/volume arrays (see candles_to_arrays).
+
+    candles: the matching candle dicts (only the last one is read eagerly)
+    """
+    if not candles:
+        return None, []
+
+    high = arrays["high"]
+    low = arrays["low"]
+    close = arrays["close"]
+
+    with timed("indicators.columns"):
+        columns = compute_indicator_columns(high, low, close)
 
     # -----------------------------
     # Return format base
     # -----------------------------
-    latest = df.iloc[-1].to_dict()
-    all_rows = df.to_dict(orient="records")
+    latest = dict(candles[-1])
+    for col, values in arrays.items():
+        latest[col] = float(values[-1])
+    for col, values in columns.items():
+        latest[col] = float(values[-1])
+    all_rows = IndicatorRows(candles, arrays, columns)
 
     # ---- PHASE 2 ADDITIONS ----
-    close = latest.get('close')
+    close_now = latest.get('close')
     ema20 = latest.get('EMA20')
     ema50 = latest.get('EMA50')
     atr14 = latest.get('ATR14')
@@ -204,10 +383,10 @@ def compute_indicators(candles):
     boll_lower = latest.get('BOLL_LOWER')
 
     # AO
-    latest['AO'] = compute_ao(candles)
+    latest['AO'] = _ao_from_arrays(high, low)
 
     # Momentum (MOM10)
-    latest['MOM10'] = compute_momentum(candles, period=10)
+    latest['MOM10'] = _momentum_from_closes(close, period=10)
 
     # TTM Squeeze
     ttm = compute_ttm_squeeze(
@@ -217,6 +396,7 @@ def compute_indicators(candles):
         boll_mid=boll_mid,
         boll_upper=boll_upper,
         boll_lower=boll_lower,
+        closes=close,
     )
     latest['KC_UPPER'] = ttm['KC_UPPER']
     latest['KC_LOWER'] = ttm['KC_LOWER']
@@ -224,8 +404,8 @@ def compute_indicators(candles):
     latest['SQUEEZE_MOM'] = ttm['SQUEEZE_MOM']
 
     # Distance from EMA20 / EMA50
-    dist_20, dist_20_pct = compute_distance_from_ema(close, ema20)
-    dist_50, dist_50_pct = compute_distance_from_ema(close, ema50)
+    dist_20, dist_20_pct = compute_distance_from_ema(close_now, ema20)
+    dist_50, dist_50_pct = compute_distance_from_ema(close_now, ema50)
 
     latest['DIST_EMA20'] = dist_20
     latest['DIST_EMA20_PCT'] = dist_20_pct
@@ -236,4 +416,21 @@ def compute_indicators(candles):
     # latest['SLOPE_EMA20'] = compute_ema_slope(ema20_series, lookback=5)
     # latest['SLOPE_EMA50'] = compute_ema_slope(ema50_series, lookback=5)
 
-    return latest, all_rows
\ No newline at end of file
+    return latest, all_rows
+
+
+def compute_indicators(candles):
+    """
+    candles: list of dicts with:
+    timestamp, timeframe, open, high, low, close, volume, symbol (symbol optional for older data)
+
+    Returns (latest, all_rows). all_rows is a lazy sequence of row dicts,
+    only built if the caller actually reads it.
+    """
+
+    if not candles:
+        return None, []
+
+    with timed("indicators.to_arrays"):
+        arrays = candles_to_arrays(candles)
+    return compute_indicators_from_arrays(candles, arrays)
@@ -0,0 +1,461 @@
+import numpy as np
+
+from candle_journal import FLAG_ROLLUP, RECORD_DTYPE, encode_key, make_records
+from candle_store import CandleStore, format_epoch, to_epoch
+from indicator_engine import IndicatorEngine
+from indicators import compute_indicators_from_arrays
+from metrics import timed
+from signal_logic import classify_trend
+from snapshot_cache import SnapshotCache
+from timeframe_rollup import BASE_TIMEFRAME, TimeframeRollup
+from utils import sanitize_latest_indicators, sanitize_snapshot
+
+# This file ties the pieces of the candle pipeline together:
+# - CandleStore (ring buffers per symbol/timeframe)
+# - one IndicatorEngine per series, kept in step with the store
+# - 1m -> 5m/15m/30m/1h/day rollup per symbol
+# - an LRU cache of per-series snapshots shared by /analysis, /signal
+#   and /mtf-signal, dropped whenever the series changes
+# - optionally a CandleJournal: every fed bar is written to it once it
+#   is applied, and replay_journal() rebuilds everything after a restart
+# - or a SharedCandleStore (shared_store.py) when several workers share
+#   one store; indicators and rollups are then derived from the shared
+#   bars instead of per-process state
+#
+# app.py holds one MarketState for the server; replays and tests can
+# build their own.
+
+REQUIRED_KEYS = ["timestamp", "open", "high", "low", "close"]
+
+
+def parse_candle(data: dict, default_symbol: str = "SPX", default_timeframe: str = "1m") -> tuple:
+    """
+    Validate one /feed/candle style dict.
+
+    Returns (symbol, timeframe, ts, open, high, low, close, volume).
+    Raises ValueError with a client-facing message.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Candle must be a JSON object")
+
+    missing = [k for k in REQUIRED_KEYS if k not in data]
+    if missing:
+        raise ValueError(f"Missing keys: {missing}")
+
+    try:
+        ts = to_epoch(data["timestamp"])
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise ValueError(f"Bad timestamp: {data['timestamp']!r}")
+
+    try:
+        prices = [float(data[k]) for k in ("open", "high", "low", "close")]
+        volume = float(data.get("volume", 0.0))
+    except (TypeError, ValueError):
+        raise ValueError("open/high/low/close/volume must be numbers")
+
+    symbol = str(data.get("symbol", default_symbol))
+    timeframe = str(data.get("timeframe", default_timeframe))
+    encode_key(symbol, timeframe)  # must fit a journal record
+
+    return (
+        symbol,
+        timeframe,
+        ts,
+        *prices,
+        volume,
+    )
+
+
+def build_series_snapshot(last_candle: dict, candle_count: int, latest: dict) -> dict:
+    """
+    Everything the read routes need for one series, computed once:
+      candle_count, latest (/analysis shape), signal (/signal),
+      mtf (/mtf-signal snapshot with trend_label/strength/reason)
+    """
+    clean_latest = sanitize_latest_indicators(latest)
+
+    snapshot = sanitize_snapshot(last_candle, latest)
+    trend_info = classify_trend(snapshot)
+    if isinstance(trend_info, dict):
+        snapshot["trend_label"] = trend_info.get("trend")
+        snapshot["trend_strength"] = trend_info.get("strength")
+        snapshot["trend_reason"] = trend_info.get("reason")
+    else:
+        # If classify_trend returns just a string like "BULLISH"/"BEARISH"/"CHOP"
+        snapshot["trend_label"] = trend_info
+
+    return {
+        "candle_count": candle_count,
+        "latest": clean_latest,
+        "signal": classify_trend(clean_latest),
+        "mtf": snapshot,
+    }
+
+
+def _latest_from_series(series):
+    # Full recompute from the stored window (shared mode has no engines)
+    return compute_indicators_from_arrays(series, series.arrays())[0]
+
+
+class MarketState:
+    def __init__(self, capacity: int = 300, rollup: bool = True, cache_size: int = 1024,
+                 journal=None, store=None):
+        self.store = store if store is not None else CandleStore(capacity=capacity)
+        # Shared store: other processes write too, so per-process engines /
+        # rollups would go stale
+        self.shared = self.store.shared
+        self.rollup = rollup
+        self.snapshots = SnapshotCache(maxsize=cache_size)
+        self.journal = journal  # CandleJournal or None
+        self.listeners = []  # fn(symbol, timeframes) after each ingest, e.g. SignalHub.notify
+        self._engines = {}  # (symbol, timeframe) -> IndicatorEngine
+        self._rollups = {}  # symbol -> TimeframeRollup
+        # Writers only: journal order must match apply order, and
+        # compaction must not race an ingest (cross-process when shared)
+        self._write_lock = self.store.write_lock
+
+    def engine(self, symbol: str, timeframe: str) -> IndicatorEngine:
+        key = (symbol, timeframe)
+        engine = self._engines.get(key)
+        if engine is None:
+            engine = IndicatorEngine()
+            self._engines[key] = engine
+        return engine
+
+    def _store_bar(self, symbol, timeframe, ts, open_, high, low, close, volume, replace=False):
+        series = self.store.series_for(symbol, timeframe)
+        if replace:
+            series.replace_last(ts, open_, high, low, close, volume)
+            if not self.shared:
+                self.engine(symbol, timeframe).replace_last(series.last_candle())
+        else:
+            series.append(ts, open_, high, low, close, volume)
+            if not self.shared:
+                self.engine(symbol, timeframe).update(series.last_candle())
+        self.snapshots.invalidate((symbol, timeframe))
+        return series
+
+    def _store_bars(self, symbol, timeframe, bars, replace_first=False):
+        """
+        Bulk version of _store_bar; bars is a dict of equal-length arrays.
+        """
+        if replace_first:
+            self._store_bar(
+                symbol, timeframe, int(bars["timestamp"][0]),
+                float(bars["open"][0]), float(bars["high"][0]), float(bars["low"][0]),
+                float(bars["close"][0]), float(bars["volume"][0]),
+                replace=True,
+            )
+            bars = {k: v[1:] for k, v in bars.items()}
+            if len(bars["timestamp"]) == 0:
+                return self.store.get(symbol, timeframe)
+
+        series = self.store.series_for(symbol, timeframe)
+        series.append_many(
+            bars["timestamp"], bars["open"], bars["high"], bars["low"], bars["close"], bars["volume"],
+        )
+        if not self.shared:
+            self.engine(symbol, timeframe).update_many(
+                bars["high"], bars["low"], bars["close"], series.last_candle(),
+            )
+        self.snapshots.invalidate((symbol, timeframe))
+        return series
+
+    def _roller(self, symbol: str) -> TimeframeRollup:
+        roller = self._rollups.get(symbol)
+        if roller is None or self.shared:
+            roller = TimeframeRollup()
+            # Pick up forming bars already in the store (journal replay,
+            # or another worker's minutes when shared), so the next minute
+            # extends them instead of duplicating them
+            for tf in roller.timeframes:
+                series = self.store.get(symbol, tf)
+                if series:
+                    arrays = series.arrays()
+                    bar = {col: float(values[-1]) for col, values in arrays.items()}
+                    bar["timestamp"] = int(series.timestamps()[-1])
+                    roller.seed(tf, bar)
+            self._rollups[symbol] = roller
+        return roller
+
+    def _maybe_compact(self) -> None:
+        # After the bar is applied, so the rewrite includes it
+        if self.journal is not None and self.journal.needs_compaction(self.store.total_candles):
+            self.compact_journal()
+
+    def ingest(self, symbol: str, timeframe: str, ts: int,
+               open_: float, high: float, low: float, close: float, volume: float = 0.0,
+               rollup: bool = True) -> tuple:
+        """
+        Append one bar and keep indicators (and rollups, for 1m bars) in step.
+
+        Returns (series, rolled) where rolled lists the higher timeframes
+        this bar updated.
+        """
+        with self._write_lock:
+            # Applied first: a bar that fails to apply is never journaled
+            # (it would fail again on every replay)
+            with timed("ingest.apply"):
+                result = self._apply(symbol, timeframe, ts, open_, high, low, close, volume, rollup)
+            if self.journal is not None:
+                with timed("ingest.journal"):
+                    self.journal.append(make_records(
+                        symbol, timeframe, ts, open_, high, low, close, volume,
+                        flags=FLAG_ROLLUP if rollup else 0,
+                    ))
+            self._maybe_compact()
+        self._notify(symbol, [timeframe] + result[1])
+        return result
+
+    def _apply(self, symbol, timeframe, ts, open_, high, low, close, volume, rollup):
+        series = self._store_bar(symbol, timeframe, ts, open_, high, low, close, volume)
+
+        rolled = []
+        if rollup and self.rollup and timeframe == BASE_TIMEFRAME:
+            roller = self._roller(symbol)
+            for tf, bar, is_new in roller.add(ts, open_, high, low, close, volume):
+                self._store_bar(
+                    symbol, tf, bar["timestamp"],
+                    bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"],
+                    replace=not is_new,
+                )
+                rolled.append(tf)
+
+        return series, rolled
+
+    def ingest_many(self, symbol: str, timeframe: str, ts, open_, high, low, close, volume,
+                    rollup: bool = True) -> tuple:
+        """
+        Append a run of bars for one series from arrays (oldest -> newest).
+        Same end state as calling ingest() per bar, in one pass.
+
+        Returns (series, rolled) like ingest().
+        """
+        bars = {
+            "timestamp": np.asarray(ts, dtype=np.int64),
+            "open": np.asarray(open_, dtype=np.float64),
+            "high": np.asarray(high, dtype=np.float64),
+            "low": np.asarray(low, dtype=np.float64),
+            "close": np.asarray(close, dtype=np.float64),
+            "volume": np.asarray(volume, dtype=np.float64),
+        }
+        if len(bars["timestamp"]) == 0:
+            return self.store.get(symbol, timeframe), []
+
+        with self._write_lock:
+            with timed("ingest.apply"):
+                result = self._apply_many(symbol, timeframe, bars, rollup)
+            if self.journal is not None:
+                with timed("ingest.journal"):
+                    self.journal.append(make_records(
+                        symbol, timeframe, bars["timestamp"], bars["open"], bars["high"],
+                        bars["low"], bars["close"], bars["volume"],
+                        flags=FLAG_ROLLUP if rollup else 0,
+                    ))
+            self._maybe_compact()
+        self._notify(symbol, [timeframe] + result[1])
+        return result
+
+    def _notify(self, symbol, timeframes) -> None:
+        for listener in self.listeners:
+            listener(symbol, timeframes)
+
+    def _apply_many(self, symbol, timeframe, bars, rollup):
+        series = self._store_bars(symbol, timeframe, bars)
+
+        rolled = []
+        if rollup and self.rollup and timeframe == BASE_TIMEFRAME:
+            roller = self._roller(symbol)
+            updates = roller.add_many(
+                bars["timestamp"], bars["open"], bars["high"], bars["low"], bars["close"], bars["volume"],
+            )
+            for tf, (tf_bars, continues) in updates.items():
+                self._store_bars(symbol, tf, tf_bars, replace_first=continues)
+                rolled.append(tf)
+
+        return series, rolled
+
+    def ingest_batch(self, rows, rollup: bool = True) -> dict:
+        """
+        Validate and ingest many candle dicts (any mix of symbols/timeframes).
+
+        Everything is validated first; if any row is bad nothing is stored.
+        Rows keep their given order within each (symbol, timeframe).
+
+        Returns {"ingested": n, "series": [...], "errors": [...]}.
+        """
+        groups = {}
+        errors = []
+        count = 0
+
+        for i, row in enumerate(rows):
+            try:
+                symbol, timeframe, *values = parse_candle(row)
+            except ValueError as e:
+                errors.append({"index": i, "error": str(e)})
+                continue
+            groups.setdefault((symbol, timeframe), []).append(values)
+            count += 1
+
+        if errors:
+            return {"ingested": 0, "series": [], "errors": errors}
+
+        series_out = []
+        for (symbol, timeframe), values in groups.items():
+            cols = np.array(values, dtype=np.float64).T
+            series, rolled = self.ingest_many(
+                symbol, timeframe,
+                np.array([v[0] for v in values], dtype=np.int64),
+                cols[1], cols[2], cols[3], cols[4], cols[5],
+                rollup=rollup,
+            )
+            series_out.append({
+                "symbol": symbol,
+                "timeframe": timeframe,
+                "count": len(values),
+                "stored_count": len(series),
+                "first_timestamp": format_epoch(values[0][0]),
+                "last_timestamp": format_epoch(values[-1][0]),
+                "rolled_up": rolled,
+            })
+
+        return {"ingested": count, "series": series_out, "errors": []}
+
+    def latest_indicators(self, symbol: str, timeframe: str):
+        """
+        Latest indicator snapshot for a stored series (None if nothing stored).
+        Same shape as indicators.compute_indicators()[0], but O(1).
+        """
+        if self.shared:
+            series = self.store.get(symbol, timeframe)
+            if not series:
+                return None
+            return _latest_from_series(series.frozen())
+
+        # The engine's windows change under ingest (other threads)
+        with self._write_lock:
+            engine = self._engines.get((symbol, timeframe))
+            if engine is None:
+                return None
+            return engine.latest()
+
+    def snapshot(self, symbol: str, timeframe: str):
+        """
+        Cached build_series_snapshot() for a series, or None if nothing is stored.
+        The returned dict is shared: don't mutate it. Safe to call from
+        any thread while others ingest.
+        """
+        series = self.store.get(symbol, timeframe)
+        if not series:
+            return None
+
+        def compute():
+            # Only the reads are locked; the build runs outside the lock, so
+            # timeframes computed on different threads overlap
+            with timed("snapshot.indicators"):
+                if self.shared:
+                    frozen = series.frozen()  # one consistent copy, with its own version
+                    version, count, last = frozen.version, len(frozen), frozen.last_candle()
+                    latest = _latest_from_series(frozen)
+                else:
+                    # Local series and engines change in place under ingest:
+                    # take the version, the indicators and the last bar together
+                    with self._write_lock:
+                        version, count, last = series.version, len(series), series.last_candle()
+                        latest = self.latest_indicators(symbol, timeframe)
+            if latest is None:
+                return version, None
+            with timed("snapshot.build"):
+                return version, build_series_snapshot(last, count, latest)
+
+        # A snapshot is cached under the version it was built from, never
+        # the (possibly older) one looked up here
+        return self.snapshots.get_or_compute((symbol, timeframe), series.version, compute)
+
+    def version(self, symbol: str, timeframe: str) -> int:
+        """
+        Monotonic change counter of a series (0 if nothing stored).
+        """
+        series = self.store.get(symbol, timeframe)
+        return series.version if series is not None else 0
+
+    def snapshot_at(self, symbol: str, timeframe: str, version: int):
+        """
+        The snapshot a client saw at an older version, if still cached.
+        """
+        return self.snapshots.at_version((symbol, timeframe), version)
+
+    def mtf_snapshots(self, symbol: str, timeframes) -> dict:
+        """
+        {timeframe: /mtf-signal snapshot or None}, the input classify_day_mode expects.
+        """
+        out = {}
+        for tf in timeframes:
+            snap = self.snapshot(symbol, tf)
+            out[tf] = snap["mtf"] if snap else None
+        return out
+
+    # -----------------------------
+    # Journal (durable restarts)
+    # -----------------------------
+    def replay_journal(self, records) -> int:
+        """
+        Rebuild the store from journal records (candle_journal.load_records).
+        Nothing is written back to the journal. Returns the number of records.
+
+        Records are applied in file order, so bars of different series
+        interleave exactly as they did live (a 5m bar fed between two runs
+        of 1m bars stays between their rollups). Consecutive records of
+        the same series and rollup flag go in one batch.
+        """
+        n = len(records)
+        if n == 0:
+            return 0
+
+        changed = np.zeros(n, dtype=bool)
+        for col in ("symbol", "timeframe", "flags"):
+            changed[1:] |= records[col][1:] != records[col][:-1]
+        cuts = [0, *np.flatnonzero(changed), n]
+
+        with self._write_lock:
+            for lo, hi in zip(cuts[:-1], cuts[1:]):
+                run = records[lo:hi]
+                bars = {"timestamp": run["ts"].astype(np.int64)}
+                for col in ("open", "high", "low", "close", "volume"):
+                    bars[col] = run[col].astype(np.float64)
+                self._apply_many(
+                    run["symbol"][0].decode("utf-8"), run["timeframe"][0].decode("utf-8"),
+                    bars, bool(run["flags"][0] & FLAG_ROLLUP),
+                )
+        return n
+
+    def journal_records(self) -> np.ndarray:
+        """
+        The store as journal records: what compaction writes. Rolled
+        timeframes come before the 1m series, so on replay the rollup
+        resumes from the stored forming bars.
+        """
+        chunks = []
+        for symbol in self.store.symbols():
+            timeframes = sorted(self.store.timeframes(symbol), key=lambda tf: tf == BASE_TIMEFRAME)
+            for tf in timeframes:
+                series = self.store.get(symbol, tf)
+                if not series:
+                    continue
+                arrays = series.arrays()
+                chunks.append(make_records(
+                    symbol, tf, series.timestamps(), arrays["open"], arrays["high"],
+                    arrays["low"], arrays["close"], arrays["volume"],
+                ))
+        if not chunks:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.concatenate(chunks)
+
+    def compact_journal(self) -> None:
+        """
+        Rewrite the journal as exactly what the store holds now.
+        """
+        with self._write_lock:
+            if self.journal is not None:
+                with timed("journal.compact"):
+                    self.journal.rewrite(self.journal_records())
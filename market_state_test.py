@@ -0,0 +1,95 @@
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from candle_store import to_epoch
+from indicator_engine_test import assert_same, make_candles
+from indicators import compute_ema_series, compute_indicators
+from market_state import MarketState
+
+
+def feed(market, candles, symbol="SPX", timeframe="1m", rollup=True):
+    for c in candles:
+        market.ingest(symbol, timeframe, to_epoch(c["timestamp"]), c["open"], c["high"],
+                      c["low"], c["close"], c["volume"], rollup=rollup)
+
+
+def test_snapshot_matches_batch_indicators():
+    candles = make_candles(150)
+    market = MarketState(capacity=300, rollup=False)
+    feed(market, candles)
+    stored = market.store.get("SPX", "1m").candles()
+    assert_same(market.latest_indicators("SPX", "1m"), compute_indicators(stored)[0])
+    assert market.snapshot("SPX", "1m")["candle_count"] == 150
+
+
+def test_ingest_many_matches_ingest():
+    candles = make_candles(200)
+    one = MarketState(capacity=300)
+    feed(one, candles)
+    many = MarketState(capacity=300)
+    many.ingest_many(
+        "SPX", "1m", [to_epoch(c["timestamp"]) for c in candles],
+        [c["open"] for c in candles], [c["high"] for c in candles], [c["low"] for c in candles],
+        [c["close"] for c in candles], [c["volume"] for c in candles],
+    )
+    for tf in ("1m", "5m", "15m", "1h"):
+        assert many.store.get("SPX", tf).candles() == one.store.get("SPX", tf).candles()
+        assert_same(many.latest_indicators("SPX", tf), one.latest_indicators("SPX", tf))
+
+
+def test_snapshot_is_consistent_under_concurrent_ingest():
+    # Switch threads as often as possible so reads land mid-ingest
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    candles = make_candles(3000)
+    closes = np.array([c["close"] for c in candles])
+    ema5 = compute_ema_series(closes, 5)
+    market = MarketState(capacity=300, rollup=False)
+    feed(market, candles[:50])
+    errors = []
+    done = threading.Event()
+
+    def write():
+        try:
+            feed(market, candles[50:])
+        finally:
+            done.set()
+
+    def read():
+        while not done.is_set():
+            try:
+                snap = market.snapshot("SPX", "1m")
+                latest = market.latest_indicators("SPX", "1m")
+                version = market.version("SPX", "1m")
+                assert latest is not None
+                # Every cached snapshot pairs the bars of its version with
+                # the indicators of that same version
+                past = market.snapshot_at("SPX", "1m", version)
+                for s in (snap, past):
+                    if s is None:
+                        continue
+                    i = [c["close"] for c in candles].index(s["latest"]["close"])
+                    assert s["mtf"]["close"] == s["latest"]["close"]
+                    assert s["latest"]["EMA5"] == pytest.approx(ema5[i], rel=1e-9)
+                    assert s["candle_count"] == min(i + 1, 300)
+            except Exception as e:  # noqa: BLE001 - collected for the assert below
+                errors.append(e)
+                return
+
+    try:
+        readers = [threading.Thread(target=read) for _ in range(3)]
+        writer = threading.Thread(target=write)
+        for t in readers + [writer]:
+            t.start()
+        for t in readers + [writer]:
+            t.join(timeout=120)
+    finally:
+        sys.setswitchinterval(old_interval)
+
+    assert errors == []
+    stored = market.store.get("SPX", "1m").candles()
+    assert market.snapshot("SPX", "1m")["mtf"]["close"] == pytest.approx(stored[-1]["close"])
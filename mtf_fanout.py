@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from env_brain import get_environment
+from market_state import MarketState
+from shared_store import SharedCandleStore
+
+# This file runs the /mtf-signal work (one snapshot per timeframe + the
+# environment load) concurrently, so the request costs about as much as
+# its slowest piece instead of the sum of all of them.
+#
+# Pool kinds:
+#   "thread"  (default) works with any store. MarketState.snapshot()
+#             only holds the store's write lock while it reads the series
+#             and its indicators, then builds outside it, so timeframes
+#             overlap with each other and with the environment load
+#   "process" each worker process maps the shared candle store
+#             (CANDLE_SHARED_STORE) and keeps its own snapshot cache; no
+#             GIL at all, but only works with the shared store
+#   "none"    everything inline, in order (handy for debugging)
+#
+# run_many() does the same for a whole list of symbols under one deadline
+# (/mtf-signal/batch).
+#
+# Every request has a deadline. Whatever isn't done by then comes back as
+# None and is listed in "timed_out", so the caller still gets an answer.
+
+
+POOL_KINDS = ("thread", "process", "none")
+ENVIRONMENT = "environment"  # the key used for the environment job
+
+# -----------------------------
+# Process workers
+# -----------------------------
+_WORKER_MARKET = None
+
+
+def _init_worker(store_path: str, capacity: int, max_series: int) -> None:
+    global _WORKER_MARKET
+    _WORKER_MARKET = MarketState(store=SharedCandleStore(store_path, capacity=capacity, max_series=max_series))
+
+
+def _worker_snapshot(symbol: str, timeframe: str):
+    snap = _WORKER_MARKET.snapshot(symbol, timeframe)
+    return snap["mtf"] if snap else None
+
+
+def _worker_mtf(symbol: str, timeframes: list) -> dict:
+    return _WORKER_MARKET.mtf_snapshots(symbol, timeframes)
+
+
+def _local_snapshot(market: MarketState, symbol: str, timeframe: str):
+    snap = market.snapshot(symbol, timeframe)
+    return snap["mtf"] if snap else None
+
+
+class MTFFanOut:
+    def __init__(self, market: MarketState, kind: str = "thread", workers: int = None):
+        if kind not in POOL_KINDS:
+            raise ValueError(f"pool kind must be one of {POOL_KINDS}")
+        if kind == "process" and not market.shared:
+            raise ValueError("a process pool needs the shared candle store (CANDLE_SHARED_STORE)")
+
+        self.market = market
+        self.kind = kind
+        self.workers = workers or (os.cpu_count() or 1) * (4 if kind == "thread" else 1)
+        self._pool = None  # created on first use (after any gunicorn fork)
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                if self.kind == "thread":
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="mtf")
+                else:
+                    store = self.market.store
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        initializer=_init_worker,
+                        initargs=(store.path, store.capacity, store.max_series),
+                    )
+            return self._pool
+
+    def _jobs(self, symbol: str, timeframes, environment: bool) -> dict:
+        # key -> (fn, args); keys are timeframes plus ENVIRONMENT
+        if self.kind == "process":
+            jobs = {tf: (_worker_snapshot, (symbol, tf)) for tf in timeframes}
+        else:
+            jobs = {tf: (_local_snapshot, (self.market, symbol, tf)) for tf in timeframes}
+        if environment:
+            jobs[ENVIRONMENT] = (get_environment, (symbol,))
+        return jobs
+
+    def run(self, symbol: str, timeframes, deadline: float, environment: bool = True) -> dict:
+        """
+        Snapshots for each timeframe (+ the environment) within deadline seconds.
+
+        Returns {"timeframes": {tf: snapshot or None}, "environment": ...,
+        "timed_out": [keys not finished in time], "elapsed": seconds}.
+        A job that raises counts as None (and is reported in "errors").
+        """
+        started = time.perf_counter()
+        jobs = self._jobs(symbol, timeframes, environment)
+        results, errors, timed_out = self._gather(jobs, started, deadline)
+
+        out = {
+            "timeframes": {tf: results.get(tf) for tf in timeframes},
+            "environment": results.get(ENVIRONMENT) if environment else None,
+            "timed_out": [key for key in jobs if key in timed_out],
+            "elapsed": time.perf_counter() - started,
+        }
+        if errors:
+            out["errors"] = errors
+        return out
+
+    def run_many(self, symbols, timeframes, deadline: float, environment: bool = True) -> dict:
+        """
+        run() for many symbols under one shared deadline. One job per
+        symbol for its timeframes (snapshots are cheap) plus one per
+        environment load (the part that can hit the disk).
+
+        Returns {"symbols": {symbol: {"timeframes", "environment"}},
+        "timed_out": {symbol: ["timeframes"/"environment"]}, "errors", "elapsed"}.
+        """
+        started = time.perf_counter()
+        timeframes = list(timeframes)
+        jobs = {}
+        for symbol in symbols:
+            if self.kind == "process":
+                jobs[(symbol, "timeframes")] = (_worker_mtf, (symbol, timeframes))
+            else:
+                jobs[(symbol, "timeframes")] = (self.market.mtf_snapshots, (symbol, timeframes))
+            if environment:
+                jobs[(symbol, ENVIRONMENT)] = (get_environment, (symbol,))
+        results, errors, timed_out = self._gather(jobs, started, deadline)
+
+        out = {"symbols": {}, "timed_out": {}, "errors": {}}
+        for symbol in symbols:
+            snaps = results.get((symbol, "timeframes")) or {tf: None for tf in timeframes}
+            out["symbols"][symbol] = {
+                "timeframes": snaps,
+                "environment": results.get((symbol, ENVIRONMENT)) if environment else None,
+            }
+        for symbol, part in timed_out:
+            out["timed_out"].setdefault(symbol, []).append(part)
+        for (symbol, part), error in errors.items():
+            out["errors"].setdefault(symbol, {})[part] = error
+        out["elapsed"] = time.perf_counter() - started
+        return out
+
+    def _gather(self, jobs: dict, started: float, deadline: float) -> tuple:
+        """
+        Run jobs ({key: (fn, args)}) until done or deadline seconds after started.
+        Returns (results, errors, timed_out keys).
+        """
+        results = {}
+        errors = {}
+        timed_out = []
+
+        if self.kind == "none":
+            for key, (fn, args) in jobs.items():
+                if time.perf_counter() - started > deadline:
+                    timed_out.append(key)
+                    continue
+                try:
+                    results[key] = fn(*args)
+                except Exception as e:
+                    errors[key] = f"{type(e).__name__}: {e}"
+        else:
+            pool = self._executor()
+            futures = {pool.submit(fn, *args): key for key, (fn, args) in jobs.items()}
+            pending = set(futures)
+            while pending:
+                left = deadline - (time.perf_counter() - started)
+                if left <= 0:
+                    break
+                done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = futures[future]
+                    try:
+                        results[key] = future.result()
+                    except Exception as e:
+                        errors[key] = f"{type(e).__name__}: {e}"
+            for future in pending:
+                future.cancel()  # no-op if it already started; the result is just dropped
+                timed_out.append(futures[future])
+
+        return results, errors, timed_out
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
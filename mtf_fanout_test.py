@@ -0,0 +1,102 @@
+import sys
+import threading
+import time
+
+import pytest
+
+import market_state
+from market_state import MarketState
+from market_state_test import feed
+from indicator_engine_test import make_candles
+from mtf_fanout import MTFFanOut
+
+TIMEFRAMES = ["1m", "5m", "15m", "1h"]
+
+
+@pytest.fixture
+def fast_switching():
+    # Switch threads as often as possible so reads land mid-ingest
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(old_interval)
+
+
+def test_thread_fanout_under_concurrent_ingest(fast_switching):
+    candles = make_candles(2000)
+    market = MarketState(capacity=300)
+    feed(market, candles[:60])
+    fanout = MTFFanOut(market, kind="thread", workers=4)
+    closes = {c["close"] for c in candles}
+    problems = []
+    done = threading.Event()
+
+    def write():
+        try:
+            feed(market, candles[60:])
+        finally:
+            done.set()
+
+    def read():
+        while not done.is_set():
+            try:
+                one = fanout.run("SPX", TIMEFRAMES, deadline=30.0, environment=False)
+                many = fanout.run_many(["SPX"], TIMEFRAMES, deadline=30.0, environment=False)
+            except Exception as e:  # noqa: BLE001 - collected for the assert below
+                problems.append(e)
+                return
+            if one.get("errors") or many["errors"] or one["timed_out"] or many["timed_out"]:
+                problems.append((one.get("errors"), many["errors"]))
+                return
+            for snaps in (one["timeframes"], many["symbols"]["SPX"]["timeframes"]):
+                for tf, snap in snaps.items():
+                    # Rolled bars close on a 1m close; every snapshot is a real bar
+                    if snap is None or snap["close"] not in closes:
+                        problems.append((tf, snap))
+                        return
+
+    try:
+        readers = [threading.Thread(target=read) for _ in range(2)]
+        writer = threading.Thread(target=write)
+        for t in readers + [writer]:
+            t.start()
+        for t in readers + [writer]:
+            t.join(timeout=120)
+    finally:
+        fanout.shutdown()
+
+    assert problems == []
+
+
+def test_inline_and_thread_fanout_agree():
+    market = MarketState(capacity=300)
+    feed(market, make_candles(300))
+    inline = MTFFanOut(market, kind="none").run("SPX", TIMEFRAMES, deadline=10.0, environment=False)
+    pooled = MTFFanOut(market, kind="thread", workers=2)
+    try:
+        threaded = pooled.run("SPX", TIMEFRAMES, deadline=10.0, environment=False)
+    finally:
+        pooled.shutdown()
+    assert threaded["timeframes"] == inline["timeframes"]
+    assert threaded["timed_out"] == []
+
+
+def test_thread_fanout_costs_the_slowest_timeframe(monkeypatch):
+    market = MarketState(capacity=300)
+    feed(market, make_candles(300))
+    build = market_state.build_series_snapshot
+
+    def slow_build(*args):
+        time.sleep(0.2)
+        return build(*args)
+
+    monkeypatch.setattr(market_state, "build_series_snapshot", slow_build)
+    pooled = MTFFanOut(market, kind="thread", workers=len(TIMEFRAMES))
+    try:
+        result = pooled.run("SPX", TIMEFRAMES, deadline=10.0, environment=False)
+    finally:
+        pooled.shutdown()
+
+    assert all(result["timeframes"].values())
+    # About one build, not len(TIMEFRAMES) of them back to back
+    assert result["elapsed"] < 0.2 * len(TIMEFRAMES) / 2
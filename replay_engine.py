@@ -0,0 +1,261 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from candle_store import MARKET_TZ, format_epoch
+from market_state import MarketState
+from signal_logic import classify_day_mode
+
+# This file replays a 1-minute session CSV through the bot's brain.
+#
+# Two modes:
+# - "inproc": feeds MarketState directly (same ingest, indicators,
+#   classify_trend and classify_day_mode as the server) and records the
+#   day mode after EVERY bar. Thousands of bars per second.
+# - "http": the original behavior, POSTing each bar to a running bot and
+#   asking /mtf-signal at the check times.
+#
+# Both write the same log format as replay_oct28_1m.py always did.
+
+
+DEFAULT_TIMEFRAMES = ["1m", "5m", "15m", "30m", "1h", "day"]
+
+# Forced checks at key market times
+KEY_TIMES = {
+    "09:30", "09:45", "10:00", "10:15", "10:30",
+    "11:00", "11:30", "12:00", "13:00",
+    "14:00", "15:00", "15:45", "16:00",
+}
+
+
+def load_minute_csv(path: str) -> dict:
+    """
+    Load a 1-minute CSV with columns: timestamp, open, high, low, close[, volume]
+
+    Returns {"timestamp": int64 wall-clock seconds, "open"...: float64 arrays}.
+    """
+    df = pd.read_csv(path)
+    stamps = pd.to_datetime(df["timestamp"])
+    if stamps.dt.tz is not None:
+        stamps = stamps.dt.tz_convert(MARKET_TZ).dt.tz_localize(None)
+
+    if "volume" not in df.columns:
+        df["volume"] = 0.0
+
+    bars = {"timestamp": stamps.to_numpy(dtype="datetime64[s]").astype(np.int64)}
+    for col in ("open", "high", "low", "close", "volume"):
+        bars[col] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+    return bars
+
+
+def session_label(ts: int) -> str:
+    """
+    "OCT 28 2024" style label for a session, from any bar timestamp.
+    """
+    return time.strftime("%b %d %Y", time.gmtime(int(ts))).upper()
+
+
+def check_flags(timestamps, check_every: int = 15) -> list:
+    """
+    Which bars trigger a brain check: every `check_every` minutes since the
+    last check, the first bar, and the forced KEY_TIMES.
+    """
+    flags = []
+    last_check = None
+    for ts in timestamps:
+        ts = int(ts)
+        should_check = (
+            last_check is None
+            or ts - last_check >= check_every * 60
+            or format_epoch(ts)[11:16] in KEY_TIMES
+        )
+        if should_check:
+            last_check = ts
+        flags.append(should_check)
+    return flags
+
+
+def format_check(hhmm: str, data) -> list:
+    """
+    Log lines for one check, given an /mtf-signal style response (or None).
+    """
+    if not data:
+        return [f"{hhmm} → NO RESPONSE", ""]
+
+    mode = data.get("day_mode", "???")
+    reason = data.get("day_mode_reason", "")
+    line = f"{hhmm} → {mode:12} | {reason}"
+
+    trend_bits = []
+    for tf, snap in (data.get("timeframes") or {}).items():
+        if snap is None:
+            trend_bits.append(f"{tf}:None")
+        else:
+            trend_bits.append(f"{tf}:{snap.get('trend_label', '?')}")
+    trend_summary = " | ".join(trend_bits)
+
+    return [line, f"    → {trend_summary}", ""]
+
+
+def replay_in_process(bars: dict, symbol: str = "SPX", timeframes=None,
+                      check_every: int = 15, state: MarketState = None) -> dict:
+    """
+    Drive a session through MarketState in-process.
+
+    Returns {"symbol", "bars", "timeline", "checks", "final_mode",
+    "final_reason", "elapsed"}. timeline has one row per bar:
+    (timestamp, close, day_mode, day_mode_reason, {tf: trend_label}).
+    """
+    timeframes = list(timeframes or DEFAULT_TIMEFRAMES)
+    state = state or MarketState()
+
+    ts = bars["timestamp"]
+    flags = check_flags(ts, check_every)
+    timeline = []
+    checks = []
+    final = {"day_mode": None, "reason": "No bars replayed."}
+
+    started = time.perf_counter()
+    for i in range(len(ts)):
+        state.ingest(
+            symbol, "1m", int(ts[i]),
+            float(bars["open"][i]), float(bars["high"][i]), float(bars["low"][i]),
+            float(bars["close"][i]), float(bars["volume"][i]),
+        )
+
+        snaps = state.mtf_snapshots(symbol, timeframes)
+        final = classify_day_mode(snaps)
+        labels = {tf: (snap.get("trend_label") if snap else None) for tf, snap in snaps.items()}
+        timeline.append((int(ts[i]), float(bars["close"][i]), final.get("day_mode"), final.get("reason"), labels))
+
+        if flags[i]:
+            checks.append((int(ts[i]), {
+                "day_mode": final.get("day_mode"),
+                "day_mode_reason": final.get("reason"),
+                "timeframes": snaps,
+            }))
+
+    return {
+        "symbol": symbol,
+        "bars": len(ts),
+        "timeline": timeline,
+        "checks": checks,
+        "final_mode": final.get("day_mode"),
+        "final_reason": final.get("reason"),
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def replay_http(bars: dict, bot_url: str, symbol: str = "SPX", timeframes=None,
+                check_every: int = 15, pause: float = 0.1) -> dict:
+    """
+    The original replay: POST each bar to a running bot, ask /mtf-signal at
+    the check times. Same return shape as replay_in_process (timeline is
+    only filled at the checks).
+    """
+    import requests
+
+    timeframes = list(timeframes or DEFAULT_TIMEFRAMES)
+    params = {"symbol": symbol, "timeframes": ",".join(timeframes)}
+    session = requests.Session()
+
+    ts = bars["timestamp"]
+    flags = check_flags(ts, check_every)
+    timeline = []
+    checks = []
+
+    started = time.perf_counter()
+    for i in range(len(ts)):
+        stamp = format_epoch(ts[i])
+        payload = {
+            "symbol": symbol,
+            "timeframe": "1m",
+            "timestamp": stamp,
+            "open": float(bars["open"][i]),
+            "high": float(bars["high"][i]),
+            "low": float(bars["low"][i]),
+            "close": float(bars["close"][i]),
+            "volume": float(bars["volume"][i]),
+        }
+        try:
+            session.post(f"{bot_url}/feed/candle", json=payload, timeout=10)
+        except Exception as e:
+            print(f"Feed failed at {stamp}: {e}")
+
+        if not flags[i]:
+            continue
+
+        try:
+            data = session.get(f"{bot_url}/mtf-signal", params=params, timeout=10).json()
+        except Exception as e:
+            print(f"MTF call failed at {stamp[11:16]}: {e}")
+            data = None
+
+        checks.append((int(ts[i]), data))
+        if data:
+            labels = {tf: (snap.get("trend_label") if snap else None)
+                      for tf, snap in (data.get("timeframes") or {}).items()}
+            timeline.append((int(ts[i]), payload["close"], data.get("day_mode"), data.get("day_mode_reason"), labels))
+        time.sleep(pause)  # don’t overload Render
+
+    try:
+        final = session.get(f"{bot_url}/mtf-signal", params=params, timeout=10).json()
+        final_mode = final.get("day_mode", "???")
+        final_reason = final.get("day_mode_reason", "")
+    except Exception as e:
+        print(f"Final /mtf-signal failed: {e}")
+        final_mode = "???"
+        final_reason = "No final response"
+
+    return {
+        "symbol": symbol,
+        "bars": len(ts),
+        "timeline": timeline,
+        "checks": checks,
+        "final_mode": final_mode,
+        "final_reason": final_reason,
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def write_log(result: dict, log_path: str, title: str, echo: bool = True) -> None:
+    """
+    Write the classic replay log (check lines + final classification).
+    """
+    with open(log_path, "w", encoding="utf-8") as log:
+        log.write(f"REPLAY OF {result['symbol']} – {title}\n")
+        log.write("=" * 70 + "\n\n")
+
+        for ts, data in result["checks"]:
+            lines = format_check(format_epoch(ts)[11:16], data)
+            if echo:
+                print(lines[0])
+            log.write("\n".join(lines) + "\n")
+
+        final_line = f"{result['final_mode']} | {result['final_reason']}"
+        if echo:
+            print("\n" + "=" * 60)
+            print("FINAL CLASSIFICATION FOR THE DAY")
+            print(f"END OF DAY → {final_line}")
+
+        log.write("\n" + "=" * 60 + "\n")
+        log.write(f"FINAL → {final_line}\n")
+
+
+def write_timeline(result: dict, path: str, timeframes=None) -> None:
+    """
+    Per-bar day-mode timeline as CSV.
+    """
+    timeframes = list(timeframes or DEFAULT_TIMEFRAMES)
+    rows = []
+    for ts, close, mode, reason, labels in result["timeline"]:
+        row = {"timestamp": format_epoch(ts), "close": close, "day_mode": mode, "day_mode_reason": reason}
+        for tf in timeframes:
+            row[f"trend_{tf}"] = labels.get(tf)
+        rows.append(row)
+
+    columns = ["timestamp", "close", "day_mode", "day_mode_reason"] + [f"trend_{tf}" for tf in timeframes]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pd.DataFrame(rows, columns=columns).to_csv(path, index=False)
@@ -0,0 +1,108 @@
+import json
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from candle_store import format_epoch
+from market_state import MarketState
+from replay_engine import check_flags, load_minute_csv, replay_http, replay_in_process
+
+TIMEFRAMES = ["1m", "5m", "15m", "30m", "1h", "day"]
+
+
+def write_session(path, day="2024-10-28", n=150, seed=11, start_price=5800.0):
+    """
+    A 1-minute session CSV from 09:30, random walk prices.
+    """
+    rng = np.random.default_rng(seed)
+    stamps = pd.date_range(f"{day} 09:30", periods=n, freq="min")
+    close = start_price + np.cumsum(rng.normal(0, 2, n))
+    open_ = close + rng.normal(0, 1, n)
+    pd.DataFrame({
+        "timestamp": stamps.strftime("%Y-%m-%dT%H:%M:%S"),
+        "open": open_.round(2),
+        "high": (np.maximum(open_, close) + rng.uniform(0, 2, n)).round(2),
+        "low": (np.minimum(open_, close) - rng.uniform(0, 2, n)).round(2),
+        "close": close.round(2),
+        "volume": rng.integers(1000, 9000, n),
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+class FlaskSession:
+    """
+    Just enough of requests.Session for replay_http, backed by the Flask test client.
+    """
+
+    class Response:
+        def __init__(self, response):
+            self.status_code = response.status_code
+            self._body = response.get_json()
+
+        def json(self):
+            return self._body
+
+    def __init__(self, client):
+        self.client = client
+
+    def post(self, url, json=None, timeout=None):
+        return self.Response(self.client.post(urlparse(url).path, json=json))
+
+    def get(self, url, params=None, timeout=None):
+        return self.Response(self.client.get(urlparse(url).path, query_string=params))
+
+
+def canonical(value):
+    return json.dumps(value, sort_keys=True)  # NaN-safe comparison
+
+
+def test_load_minute_csv(tmp_path):
+    path = write_session(tmp_path / "s.csv", n=5)
+    bars = load_minute_csv(path)
+    assert [format_epoch(t) for t in bars["timestamp"]][:2] == ["2024-10-28T09:30:00", "2024-10-28T09:31:00"]
+    assert bars["close"].dtype == np.float64 and len(bars["volume"]) == 5
+
+
+def test_check_flags():
+    ts = [pd.Timestamp(f"2024-10-28 {t}").value // 10**9 for t in ("09:30", "09:31", "09:44", "09:45", "09:52", "10:00")]
+    # First bar, the KEY_TIMES 09:45 / 10:00, nothing else within 15 minutes
+    assert check_flags(ts, 15) == [True, False, False, True, False, True]
+
+
+def test_in_process_replay_matches_the_http_feed(tmp_path, monkeypatch):
+    import app
+    import requests
+
+    bars = load_minute_csv(write_session(tmp_path / "s.csv"))
+    inproc = replay_in_process(bars, "RPLY", TIMEFRAMES, check_every=15, state=MarketState(capacity=300))
+
+    monkeypatch.setattr(requests, "Session", lambda: FlaskSession(app.app.test_client()))
+    http = replay_http(bars, "http://bot", "RPLY", TIMEFRAMES, check_every=15, pause=0)
+
+    assert inproc["bars"] == http["bars"] == len(bars["timestamp"])
+    assert [ts for ts, _ in inproc["checks"]] == [ts for ts, _ in http["checks"]]
+    for (ts, mine), (_ts, served) in zip(inproc["checks"], http["checks"]):
+        assert served["day_mode"] == mine["day_mode"], format_epoch(ts)
+        assert served["day_mode_reason"] == mine["day_mode_reason"]
+        assert canonical(served["timeframes"]) == canonical(mine["timeframes"]), format_epoch(ts)
+    assert (http["final_mode"], http["final_reason"]) == (inproc["final_mode"], inproc["final_reason"])
+
+    # The timeline rows at the checks are the same too
+    served_rows = {row[0]: row for row in http["timeline"]}
+    for row in inproc["timeline"]:
+        if row[0] in served_rows:
+            assert served_rows[row[0]] == row
+
+    # And the final server-side snapshot is the in-process one
+    final = app.MARKET.mtf_snapshots("RPLY", TIMEFRAMES)
+    state = MarketState(capacity=300)
+    replay_in_process(bars, "RPLY", TIMEFRAMES, state=state)
+    assert canonical(final) == canonical(state.mtf_snapshots("RPLY", TIMEFRAMES))
+
+
+def test_empty_session():
+    empty = {k: np.empty(0) for k in ("timestamp", "open", "high", "low", "close", "volume")}
+    result = replay_in_process(empty)
+    assert result["bars"] == 0 and result["timeline"] == [] and result["final_mode"] is None
+
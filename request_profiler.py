@@ -0,0 +1,108 @@
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import threading
+import time
+from collections import deque
+
+# This file runs single requests under cProfile on demand (see the
+# before/after_request hooks in app.py) and keeps the results around.
+#
+# - profiles are kept per route in a small ring buffer, so a slow call
+#   can be reproduced once and pulled afterward (/debug/profiles)
+# - each profile keeps a short summary (top functions, with the bot's
+#   own modules listed separately) plus the pstats text
+# - cProfile only sees the calling thread; app.py runs the /mtf-signal
+#   fan-out inline while a request is being profiled
+
+# The modules we usually want to see in a profile
+FOCUS_FILES = ("indicators.py", "signal_logic.py", "env_brain.py", "utils.py")
+
+
+def _function_name(key) -> str:
+    filename, line, func = key
+    if filename == "~":  # builtins
+        return func
+    return f"{os.path.basename(filename)}:{line}({func})"
+
+
+def summarize(stats: pstats.Stats, top: int = 15, focus=FOCUS_FILES) -> dict:
+    """
+    Hot functions from a pstats.Stats: overall by self time, and the
+    focus modules by cumulative time.
+    """
+    rows = []
+    for key, (_cc, calls, self_time, cumulative, _callers) in stats.stats.items():
+        rows.append({
+            "function": _function_name(key),
+            "file": os.path.basename(key[0]),
+            "calls": calls,
+            "self_ms": round(self_time * 1000.0, 3),
+            "cumulative_ms": round(cumulative * 1000.0, 3),
+        })
+
+    by_self = sorted(rows, key=lambda r: r["self_ms"], reverse=True)[:top]
+    focused = [r for r in rows if r["file"] in focus]
+    focused.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return {"top_self": by_self, "focus": focused[:top]}
+
+
+class RequestProfiler:
+    def __init__(self, per_route: int = 8, top: int = 15):
+        self.per_route = per_route
+        self.top = top
+        self._profiles = {}  # route -> deque of profiles (newest last)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile: cProfile.Profile, route: str, path: str, started: float) -> dict:
+        """
+        Stop a profile from start() and file it under route.
+        Returns the stored entry.
+        """
+        profile.disable()
+        elapsed = time.perf_counter() - started
+
+        stats = pstats.Stats(profile, stream=io.StringIO())
+        text = io.StringIO()
+        stats.stream = text
+        stats.sort_stats("cumulative").print_stats(40)
+
+        entry = {
+            "id": next(self._ids),
+            "route": route,
+            "path": path,
+            "created": time.time(),
+            "elapsed_ms": round(elapsed * 1000.0, 3),
+            **summarize(stats, top=self.top),
+            "text": text.getvalue(),
+        }
+        with self._lock:
+            ring = self._profiles.setdefault(route, deque(maxlen=self.per_route))
+            ring.append(entry)
+        return entry
+
+    def get(self, profile_id: int):
+        with self._lock:
+            for ring in self._profiles.values():
+                for entry in ring:
+                    if entry["id"] == profile_id:
+                        return entry
+        return None
+
+    def list(self, route: str = None) -> list:
+        """
+        Stored profiles without the pstats text, newest first.
+        """
+        with self._lock:
+            rings = [self._profiles.get(route, ())] if route else list(self._profiles.values())
+            entries = [entry for ring in rings for entry in ring]
+        entries.sort(key=lambda e: e["id"], reverse=True)
+        return [{k: v for k, v in entry.items() if k != "text"} for entry in entries]
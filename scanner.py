@@ -0,0 +1,144 @@
+import re
+
+import numpy as np
+
+from signal_logic import classify_day_mode, score_snapshots
+
+# This file ranks every stored symbol by score_timeframe (/scan).
+#
+# It only reads the cached per-series snapshots (MarketState.snapshot),
+# scores all of them in one vectorized pass, applies the filters as numpy
+# masks, and classifies the day mode per symbol from the same scores.
+# No per-symbol route calls, no indicator recompute unless a series changed.
+
+DEFAULT_SCAN_TIMEFRAMES = ["5m", "15m", "30m", "1h", "day"]
+
+FILTER_PATTERN = re.compile(r"^\s*([A-Za-z_][A-Za-z0-9_]*)\s*(==|!=|>=|<=|>|<)\s*(.+?)\s*$")
+FILTER_OPS = {
+    "==": np.equal,
+    "!=": np.not_equal,
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    ">": np.greater,
+    "<": np.less,
+}
+
+# Numeric snapshot fields a filter can test (booleans count as 1 / 0);
+# text fields like trend_label can't be compared to a number
+FILTER_FIELDS = (
+    "open", "high", "low", "close", "volume",
+    "EMA5", "EMA10", "EMA20", "EMA50", "MA5", "MA9", "MA20",
+    "BOLL_MID", "BOLL_UPPER", "BOLL_LOWER",
+    "MACD_LINE", "MACD_SIGNAL", "MACD_HIST",
+    "RSI14", "ATR14", "WILLR14", "AO", "MOM10",
+    "KC_UPPER", "KC_LOWER", "SQUEEZE_ON", "SQUEEZE_MOM",
+    "DIST_EMA20", "DIST_EMA20_PCT", "DIST_EMA50", "DIST_EMA50_PCT",
+)
+
+# Snapshot fields echoed in every ranked row
+ROW_FIELDS = ["close", "trend_label", "RSI14", "DIST_EMA20_PCT", "SQUEEZE_ON", "ATR14"]
+
+
+def parse_filter(text: str) -> tuple:
+    """
+    "SQUEEZE_ON==true" / "DIST_EMA20_PCT>1.5" -> (field, op, float value).
+    Raises ValueError with a client-facing message.
+    """
+    match = FILTER_PATTERN.match(text or "")
+    if not match:
+        raise ValueError(f"Bad filter {text!r}; use FIELD<op>VALUE with one of {list(FILTER_OPS)}")
+    field, op, raw = match.groups()
+    if field not in FILTER_FIELDS:
+        raise ValueError(f"Unknown filter field {field!r}; use one of {list(FILTER_FIELDS)}")
+    lowered = raw.lower()
+    if lowered in ("true", "false"):
+        value = 1.0 if lowered == "true" else 0.0
+    else:
+        try:
+            value = float(raw)
+        except ValueError:
+            raise ValueError(f"Filter value must be a number or true/false: {text!r}")
+    return field, op, value
+
+
+def _field_column(snapshots: list, field: str) -> np.ndarray:
+    # None / missing -> NaN, which fails every comparison (so it's filtered out)
+    values = []
+    for snap in snapshots:
+        value = snap.get(field)
+        if isinstance(value, bool):
+            value = float(value)
+        elif not isinstance(value, (int, float)):
+            value = None
+        values.append(value)
+    return np.array(values, dtype=np.float64)
+
+
+def scan_universe(market, timeframe: str = "day", timeframes=None, n: int = 10,
+                  filters=(), day_modes=None, symbols=None) -> dict:
+    """
+    Rank symbols by their score on `timeframe`.
+
+    timeframes: used for the day mode (and echoed scores); `timeframe` is
+                always included
+    filters:    parsed filters (see parse_filter), all must pass, evaluated
+                on the `timeframe` snapshot
+    day_modes:  keep only these day modes (e.g. {"KILL"})
+    symbols:    restrict the universe (default: every stored symbol)
+
+    Returns {"scanned", "matched", "top", "bottom"} with up to n rows each.
+    """
+    timeframes = list(dict.fromkeys(list(timeframes or DEFAULT_SCAN_TIMEFRAMES) + [timeframe]))
+    universe = list(symbols) if symbols is not None else market.store.symbols()
+
+    # Latest snapshots (cached) for every symbol x timeframe
+    per_symbol = {}
+    flat = []
+    for symbol in universe:
+        snaps = market.mtf_snapshots(symbol, timeframes)
+        if snaps.get(timeframe) is None:
+            continue  # nothing to rank on
+        per_symbol[symbol] = snaps
+        flat.extend((symbol, tf, snap) for tf, snap in snaps.items() if snap)
+
+    scores = {}
+    for (symbol, tf, _snap), score in zip(flat, score_snapshots([snap for _s, _tf, snap in flat])):
+        scores.setdefault(symbol, {})[tf] = score
+
+    ranked_symbols = list(per_symbol)
+    ranked_snaps = [per_symbol[s][timeframe] for s in ranked_symbols]
+    keep = np.ones(len(ranked_symbols), dtype=bool)
+    for field, op, value in filters:
+        keep &= FILTER_OPS[op](_field_column(ranked_snaps, field), value)
+
+    rows = []
+    for i in np.flatnonzero(keep):
+        symbol = ranked_symbols[i]
+        day_mode_info = classify_day_mode(per_symbol[symbol], scores=scores[symbol])
+        if day_modes and day_mode_info.get("day_mode") not in day_modes:
+            continue
+        snap = ranked_snaps[i]
+        row = {
+            "symbol": symbol,
+            "score": scores[symbol][timeframe],
+            "total_score": sum(scores[symbol].values()),
+            "day_mode": day_mode_info.get("day_mode"),
+            "day_mode_reason": day_mode_info.get("reason"),
+            "scores": scores[symbol],
+            "timestamp": snap.get("timestamp"),
+        }
+        for field in ROW_FIELDS:
+            row[field] = snap.get(field)
+        rows.append(row)
+
+    # Best first; ties broken by the other timeframes, then by name
+    rows.sort(key=lambda r: (-r["score"], -r["total_score"], r["symbol"]))
+    n = max(int(n), 0)
+    return {
+        "timeframe": timeframe,
+        "timeframes": timeframes,
+        "scanned": len(universe),
+        "matched": len(rows),
+        "top": rows[:n],
+        "bottom": rows[::-1][:n],
+    }
@@ -0,0 +1,39 @@
+import pytest
+
+from indicator_engine_test import make_candles
+from market_state import MarketState
+from market_state_test import feed
+from scanner import FILTER_FIELDS, parse_filter, scan_universe
+from utils import sanitize_snapshot
+
+
+def test_parse_filter():
+    assert parse_filter("SQUEEZE_ON==true") == ("SQUEEZE_ON", "==", 1.0)
+    assert parse_filter(" DIST_EMA20_PCT > -1.5 ") == ("DIST_EMA20_PCT", ">", -1.5)
+
+
+@pytest.mark.parametrize("text", [
+    "RSI14",                    # no operator
+    "RSI14>abc",                # not a number
+    "RSl14>50",                 # typo
+    "trend_label==1",           # text field
+    "timestamp>0",
+])
+def test_bad_filters_raise(text):
+    with pytest.raises(ValueError):
+        parse_filter(text)
+
+
+def test_filter_fields_are_numeric_snapshot_keys():
+    snapshot_keys = set(sanitize_snapshot({}, {}))
+    assert set(FILTER_FIELDS) <= snapshot_keys
+
+
+def test_scan_applies_filters():
+    market = MarketState(capacity=300, rollup=False)
+    for i, symbol in enumerate(["AAA", "BBB", "CCC"]):
+        feed(market, make_candles(60, seed=i, start_price=100 * (i + 1)), symbol=symbol, timeframe="5m")
+    everything = scan_universe(market, "5m", ["5m"], n=10)
+    assert everything["matched"] == 3
+    cheap = scan_universe(market, "5m", ["5m"], n=10, filters=[parse_filter("close<250")])
+    assert {row["symbol"] for row in cheap["top"]} == {"AAA", "BBB"}
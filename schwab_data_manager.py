@@ -5,6 +5,11 @@ import base64
 import os
 from urllib.parse import urlparse, parse_qs
 
+import numpy as np
+
+from bar_cache import BAR_COLUMNS, DATE_ONLY_INTERVALS, BarCache
+from candle_store import format_epoch, to_epoch, to_utc_epoch
+
 # ==========================================
 # 🔐 USER CONFIGURATION (EDIT THESE 3 LINES)
 # ==========================================
@@ -18,6 +23,18 @@ TOKEN_FILE = "schwab_tokens.json"
 BASE_URL = "https://api.schwabapi.com/marketdata/v1"
 AUTH_URL = "https://api.schwabapi.com/v1/oauth/token"
 
+# Local bar cache for /pricehistory pulls: data/bars/<interval>/<SYMBOL>_<interval>.csv
+BAR_CACHE = BarCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bars"))
+
+# interval -> /pricehistory params, and the longest span one request may ask for
+PRICEHISTORY_INTERVALS = {
+    "1m": ({"periodType": "day", "frequencyType": "minute", "frequency": 1}, 10),
+    "5m": ({"periodType": "day", "frequencyType": "minute", "frequency": 5}, 10),
+    "15m": ({"periodType": "day", "frequencyType": "minute", "frequency": 15}, 10),
+    "30m": ({"periodType": "day", "frequencyType": "minute", "frequency": 30}, 10),
+    "day": ({"periodType": "year", "frequencyType": "daily", "frequency": 1}, 365 * 20),
+}
+
 def save_tokens(tokens):
     """Saves tokens to a local file with an expiration timestamp."""
     # Schwab tokens usually last 30 mins (1800s). We set safety buffer.
@@ -130,7 +147,8 @@ def authenticate():
         return None
 
 def download_spx_history(tokens):
-    """Downloads SPX candles for a specific timeframe."""
+    """Downloads SPX candles for a specific timeframe.
+    (Many symbols / long spans: see history_downloader.py.)"""
     if not tokens:
         print("❌ No tokens available. Cannot download.")
         return
@@ -183,6 +201,58 @@ def download_spx_history(tokens):
         print(f"❌ Connection Error: {e}")
         return []
 
+def fetch_price_history(tokens, symbol, interval, start, end):
+    """
+    Bars for [start, end) (wall-clock market seconds) straight from
+    /pricehistory, split into as many requests as the interval needs.
+    Returns bar arrays (timestamp + open/high/low/close/volume).
+    Raises requests.HTTPError on an API error.
+    """
+    params, max_days = PRICEHISTORY_INTERVALS[interval]
+    url = f"{BASE_URL}/pricehistory"
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+    candles = []
+    piece_start = int(start)
+    while piece_start < end:
+        piece_end = min(piece_start + max_days * 86400, int(end))
+        response = requests.get(url, headers=headers, timeout=30, params={
+            **params,
+            "symbol": symbol,
+            "startDate": int(to_utc_epoch(piece_start) * 1000),
+            "endDate": int(to_utc_epoch(piece_end) * 1000),
+            "needExtendedHoursData": "true",
+        })
+        response.raise_for_status()
+        candles.extend(response.json().get("candles", []))
+        piece_start = piece_end
+
+    ts = np.array([to_epoch(c["datetime"]) for c in candles], dtype=np.int64)
+    if interval in DATE_ONLY_INTERVALS:
+        ts -= ts % 86400  # daily candles are stamped just after midnight
+    bars = {"timestamp": ts}
+    for col in BAR_COLUMNS:
+        bars[col] = np.array([c.get(col, 0.0) for c in candles], dtype=np.float64)
+    keep = (ts >= start) & (ts < end)  # endDate is inclusive on Schwab's side
+    return {k: v[keep] for k, v in bars.items()}
+
+def get_price_history(tokens, symbol, interval="1m", start=None, end=None, cache=BAR_CACHE):
+    """
+    Bars for [start, end) through the local bar cache: only the ranges
+    that aren't cached yet are requested, so a daily refresh is one small
+    request. start/end: anything candle_store.to_epoch accepts; end
+    defaults to now.
+    """
+    now = to_epoch(time.time())
+    start = to_epoch(start)
+    end = to_epoch(end) if end is not None else now
+
+    def fetcher(sym, iv, gap_start, gap_end):
+        print(f"📥 {sym} {iv}: fetching missing range {format_epoch(gap_start)} → {format_epoch(gap_end)}")
+        return fetch_price_history(tokens, sym, iv, gap_start, gap_end)
+
+    return cache.fetch(symbol, interval, start, end, fetcher, now=now)
+
 if __name__ == "__main__":
     # 1. Authenticate (Auto-refresh or Manual)
     valid_tokens = authenticate()
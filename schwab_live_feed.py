@@ -3,73 +3,243 @@ schwab_live_feed.py
 
 This file will later be responsible for:
 - talking to the Schwab market data API
-- turning price quotes into 1-minute candles
-- sending those candles into the bot's /feed/candle endpoint.
+- turning price quotes into 1-minute candles (tick_aggregator.py)
+- sending those candles into the bot.
 
-Right now it is just a simple demo so we can:
+Candles go to a "sink":
+- HttpSink: POSTs to a running bot's /feed/candles. One pooled keep-alive
+  session, a bounded send queue drained by a background thread in
+  batches, so a slow bot never blocks the quote loop (until the queue
+  is full: then send() waits, which is the backpressure)
+- InProcessSink: the feed runs inside the bot process (LIVE_FEED=demo in
+  app.py) and bars go straight into MarketState.ingest, no HTTP at all
+
+Right now the quotes are fake so we can:
 - practice running a separate Python file
 - see candles flow into the bot
 - test /mtf-signal with a fake live feed.
 """
 
+import queue
+import threading
 import time
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+
+from candle_store import format_epoch
+from tick_aggregator import TickAggregator, market_now
 
 # Where our bot is running (Flask app)
 BOT_URL = "http://127.0.0.1:5000"
 SYMBOL = "SPX"
 
-def send_candle_to_bot(ts: str, open_: float, high: float, low: float, close: float, volume: float) -> None:
+# HttpSink defaults
+SEND_QUEUE_SIZE = 10_000     # candles waiting to be sent
+SEND_BATCH_SIZE = 500        # candles per POST /feed/candles
+SEND_LINGER_SECONDS = 0.005  # wait this long for more candles before a POST
+SEND_RETRIES = 3
+
+_STOP = object()
+
+
+def candle_payload(symbol: str, timeframe: str, bar: dict) -> dict:
     """
-    Send ONE candle to our existing /feed/candle endpoint.
-    This uses the SAME shape as replay_oct28_1m.py.
+    Aggregator bar -> the /feed/candle JSON shape (same as replay_oct28_1m.py).
     """
-    payload = {
-        "symbol": SYMBOL,
-        "timeframe": "1m",
-        "timestamp": ts,
-        "open": float(open_),
-        "high": float(high),
-        "low": float(low),
-        "close": float(close),
-        "volume": float(volume),
+    return {
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "timestamp": format_epoch(bar["timestamp"]),
+        "open": float(bar["open"]),
+        "high": float(bar["high"]),
+        "low": float(bar["low"]),
+        "close": float(bar["close"]),
+        "volume": float(bar["volume"]),
     }
-    try:
-        r = requests.post(f"{BOT_URL}/feed/candle", json=payload, timeout=5)
-        r.raise_for_status()
-        print(f"✅ Sent candle {ts} → status {r.status_code}")
-    except Exception as e:
-        print(f"❌ Failed to send candle {ts}: {e}")
 
-def run_fake_demo_feed() -> None:
+
+class InProcessSink:
+    """
+    Feed running inside the bot: bars go straight into the MarketState
+    (journal, store, indicators, rollups, push listeners), no HTTP.
+    """
+
+    def __init__(self, market):
+        self.market = market
+        self.sent = 0
+        self.failed = 0
+
+    def send(self, symbol: str, timeframe: str, bar: dict) -> None:
+        try:
+            self.market.ingest(
+                symbol, timeframe, int(bar["timestamp"]),
+                float(bar["open"]), float(bar["high"]), float(bar["low"]),
+                float(bar["close"]), float(bar["volume"]),
+            )
+            self.sent += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"❌ Failed to ingest {symbol} {timeframe} {format_epoch(bar['timestamp'])}: {e}")
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"mode": "inprocess", "sent": self.sent, "failed": self.failed}
+
+
+class HttpSink:
+    """
+    Sends bars to a running bot over HTTP without blocking the caller:
+    send() only enqueues; a background thread POSTs batches to
+    /feed/candles over one keep-alive session.
+    """
+
+    def __init__(self, bot_url: str = BOT_URL, queue_size: int = SEND_QUEUE_SIZE,
+                 batch_size: int = SEND_BATCH_SIZE, linger: float = SEND_LINGER_SECONDS,
+                 timeout: float = 5.0, put_timeout: float = 5.0):
+        self.bot_url = bot_url.rstrip("/")
+        self.batch_size = batch_size
+        self.linger = linger
+        self.timeout = timeout
+        self.put_timeout = put_timeout
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0   # queue still full after put_timeout
+        self.batches = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="feed-sender", daemon=True)
+        self._thread.start()
+
+    def send(self, symbol: str, timeframe: str, bar: dict) -> None:
+        """
+        Queue one bar. Blocks (up to put_timeout) while the queue is full,
+        so a feed that outruns the bot slows down instead of piling up.
+        """
+        payload = candle_payload(symbol, timeframe, bar)
+        try:
+            self._queue.put(payload, timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+            print(f"⚠️ Send queue full, dropped candle {symbol} {timeframe} {payload['timestamp']}")
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._post(batch)
+
+    def _post(self, batch: list) -> None:
+        error = None
+        for attempt in range(SEND_RETRIES):
+            try:
+                r = self.session.post(f"{self.bot_url}/feed/candles", json=batch, timeout=self.timeout)
+                if r.status_code < 500:
+                    r.raise_for_status()  # 4xx: the batch itself is bad, retrying won't help
+                    self.sent += len(batch)
+                    self.batches += 1
+                    return
+                error = f"status {r.status_code}"
+            except requests.HTTPError as e:
+                error = e
+                break
+            except requests.RequestException as e:
+                error = e
+            time.sleep(0.2 * 2 ** attempt)
+
+        self.failed += len(batch)
+        print(f"❌ Failed to send {len(batch)} candle(s) starting {batch[0]['timestamp']}: {error}")
+
+    def close(self, timeout: float = 10.0) -> None:
+        """
+        Send what's queued, then stop the sender thread.
+        """
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+        self.session.close()
+
+    def stats(self) -> dict:
+        return {
+            "mode": "http",
+            "queued": self._queue.qsize(),
+            "sent": self.sent,
+            "batches": self.batches,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+def run_fake_demo_feed(sink=None, stop: threading.Event = None) -> None:
     """
     TEMPORARY:
-    - Every 5 seconds, send a fake 1-minute candle into the bot.
+    - Every half second, make up a fake quote and push it through the
+      tick aggregator; each finished 1-minute bar goes to the sink
+      (default: the bot at BOT_URL over HTTP).
     - This is just to test wiring while we wait for Schwab market data.
 
     LATER:
-    - We will replace this with real Schwab API calls.
+    - We will replace the fake quotes with real Schwab API quotes.
     """
+    sink = sink or HttpSink()
+    stop = stop or threading.Event()
     price = 5800.0
-    volume = 100000.0
+    step = 0.25
+
+    def on_bar(symbol, timeframe, bar):
+        sink.send(symbol, timeframe, bar)
+        print(f"✅ Closed {symbol} {timeframe} candle {format_epoch(bar['timestamp'])}")
+
+    # Bars close on the timer too, so a quiet minute still gets sent
+    aggregator = TickAggregator(timeframes=("1m",), grace=2.0, on_bar=on_bar)
+    aggregator.start_timer(interval=1.0)
 
     print("Starting fake demo feed. Press Ctrl+C to stop.")
-    while True:
-        now = datetime.utcnow().replace(second=0, microsecond=0)
-        ts = now.strftime("%Y-%m-%dT%H:%M:%S")
+    try:
+        while not stop.is_set():
+            # Tiny back-and-forth movement (no randomness lib, just simple steps)
+            price += step
+            if price > 5805.0 or price < 5795.0:
+                step = -step
+            aggregator.add(SYMBOL, market_now(), price, 100.0)
+            stop.wait(0.5)
+    finally:
+        aggregator.stop_timer()
+        aggregator.close_all()
+        sink.close()
 
-        # Tiny random-style movement (no randomness lib, just simple steps)
-        open_ = price
-        close = price + 1.0
-        high = max(open_, close) + 0.5
-        low = min(open_, close) - 0.5
 
-        send_candle_to_bot(ts, open_, high, low, close, volume)
+def start_in_process_feed(market, stop: threading.Event = None):
+    """
+    Run the feed on a daemon thread inside the bot, ingesting straight
+    into `market`. Returns (thread, sink).
+    """
+    sink = InProcessSink(market)
+    thread = threading.Thread(
+        target=run_fake_demo_feed, args=(sink, stop), name="live-feed", daemon=True,
+    )
+    thread.start()
+    return thread, sink
 
-        # Update "price" for next candle
-        price = close
-        time.sleep(5)
 
 if __name__ == "__main__":
-    run_fake_demo_feed()
\ No newline at end of file
+    run_fake_demo_feed()
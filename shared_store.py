@@ -0,0 +1,332 @@
+import os
+import platform
+import threading
+import time
+
+import numpy as np
+
+from candle_journal import MAX_SYMBOL_BYTES, MAX_TIMEFRAME_BYTES, encode_key
+from candle_store import CandleSeries
+from indicators import PRICE_COLUMNS
+
+try:
+    import fcntl
+except ImportError:  # Windows: no shared mode, the plain CandleStore still works
+    fcntl = None
+
+# This file is a CandleStore that lives in one mmap'd file, so every
+# gunicorn worker sees the same bars (a POST to worker A shows up in
+# /signal on worker B).
+#
+# Layout: header | directory (symbol, timeframe per slot) | slots
+# Each slot is one series: [seq, start, len, version] + the same mirrored
+# ring as CandleSeries (ts + open/high/low/close/volume, 2 x capacity).
+#
+# - one writer at a time: write_lock is a thread lock + flock on a
+#   sidecar .lock file, held by MarketState for the whole ingest
+# - readers don't lock on x86: every slot is a seqlock. The writer bumps
+#   seq to odd before touching the slot and back to even after; a reader
+#   copies the rows and retries if seq moved. That relies on stores not
+#   being reordered, which x86 guarantees and ARM etc. don't (numpy has
+#   no memory fences), so elsewhere readers take the write lock instead
+# - slots are handed out once and never freed; the directory only grows
+#
+# Put the file on tmpfs (/dev/shm) unless you want it to outlive a reboot.
+
+
+# Lock-free seqlock reads only where stores are seen in program order
+SEQLOCK_READS = platform.machine().lower() in ("x86_64", "amd64", "i386", "i686", "x86")
+
+MAGIC = b"SBSS"
+LAYOUT_VERSION = 1
+HEADER_SIZE = 64
+
+KEY_DTYPE = np.dtype([
+    ("symbol", f"S{MAX_SYMBOL_BYTES}"),
+    ("timeframe", f"S{MAX_TIMEFRAME_BYTES}"),
+])
+
+META_SEQ, META_START, META_LEN, META_VERSION = range(4)
+READ_RETRIES = 1000
+
+
+class SharedWriteLock:
+    """
+    Re-entrant, cross-process: threads in this process queue on an RLock,
+    processes on flock. Use as a context manager.
+    """
+
+    def __init__(self, path: str):
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._local = threading.RLock()
+        self._depth = 0
+
+    def __enter__(self):
+        self._local.acquire()
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._local.release()
+
+
+class SharedCandleSeries(CandleSeries):
+    """
+    A CandleSeries whose rows and counters live in the shared file.
+
+    Writes go through the normal CandleSeries methods (the caller holds
+    the store's write_lock). Reads return copies taken under the seqlock,
+    never views into the shared rows.
+    """
+
+    def __init__(self, symbol: str, timeframe: str, capacity: int, meta, ts, cols, write_lock):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.capacity = capacity
+        self.write_lock = write_lock
+        self._meta = meta
+        self._ts = ts
+        self._cols = cols
+        self._writing = 0
+
+    # Counters live in the slot, not on the instance
+    @property
+    def _start(self):
+        return int(self._meta[META_START])
+
+    @_start.setter
+    def _start(self, value):
+        self._meta[META_START] = value
+
+    @property
+    def _len(self):
+        return int(self._meta[META_LEN])
+
+    @_len.setter
+    def _len(self, value):
+        self._meta[META_LEN] = value
+
+    @property
+    def version(self):
+        return int(self._meta[META_VERSION])
+
+    @version.setter
+    def version(self, value):
+        self._meta[META_VERSION] = value
+
+    # -----------------------------
+    # Writes (seqlock odd while in progress)
+    # -----------------------------
+    def _locked_write(self, method, *args):
+        self._writing += 1
+        if self._writing == 1:
+            self._meta[META_SEQ] += 1
+        try:
+            method(*args)
+        finally:
+            self._writing -= 1
+            if self._writing == 0:
+                self._meta[META_SEQ] += 1
+
+    def append(self, *args) -> None:
+        self._locked_write(super().append, *args)
+
+    def append_many(self, *args) -> None:
+        self._locked_write(super().append_many, *args)
+
+    def replace_last(self, *args) -> None:
+        self._locked_write(super().replace_last, *args)
+
+    # -----------------------------
+    # Reads (consistent copies)
+    # -----------------------------
+    def frozen(self) -> CandleSeries:
+        """
+        A private CandleSeries copy of the current rows, same version.
+        """
+        if not SEQLOCK_READS:
+            with self.write_lock:
+                return self._copy()
+
+        for _ in range(READ_RETRIES):
+            seq = int(self._meta[META_SEQ])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            start = int(self._meta[META_START])
+            length = int(self._meta[META_LEN])
+            version = int(self._meta[META_VERSION])
+            ts = self._ts[start:start + length].copy()
+            cols = {col: values[start:start + length].copy() for col, values in self._cols.items()}
+            if int(self._meta[META_SEQ]) == seq:
+                return self._build_copy(ts, cols, version)
+
+        # A writer kept us out for ~1000 tries; just wait for it
+        with self.write_lock:
+            return self._copy()
+
+    def _copy(self) -> CandleSeries:
+        # Caller holds the write lock: the rows can't move
+        start = int(self._meta[META_START])
+        length = int(self._meta[META_LEN])
+        ts = self._ts[start:start + length].copy()
+        cols = {col: values[start:start + length].copy() for col, values in self._cols.items()}
+        return self._build_copy(ts, cols, int(self._meta[META_VERSION]))
+
+    def _build_copy(self, ts, cols, version) -> CandleSeries:
+        copy = CandleSeries(self.symbol, self.timeframe, capacity=self.capacity)
+        copy.append_many(ts, cols["open"], cols["high"], cols["low"], cols["close"], cols["volume"])
+        copy.version = version
+        return copy
+
+    def timestamps(self) -> np.ndarray:
+        return self.frozen().timestamps()
+
+    def arrays(self) -> dict:
+        return self.frozen().arrays()
+
+    def candle_at(self, index: int) -> dict:
+        return self.frozen().candle_at(index)
+
+    def candles(self) -> list:
+        return self.frozen().candles()
+
+
+class SharedCandleStore:
+    """
+    Same interface as CandleStore, backed by a file every worker maps.
+
+    The first process to open the file lays it out; later ones check the
+    layout. A file built with a different capacity / max_series is
+    reinitialized (empty), so changing either needs the journal to refill.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, capacity: int = 300, max_series: int = 1024):
+        if fcntl is None:
+            raise RuntimeError("shared candle store needs fcntl (Linux / macOS)")
+        if capacity < 1 or max_series < 1:
+            raise ValueError("capacity and max_series must be >= 1")
+
+        self.path = path
+        self.capacity = capacity
+        self.max_series = max_series
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.write_lock = SharedWriteLock(path + ".lock")
+
+        slot_ints = 4 + 2 * capacity
+        slot_floats = len(PRICE_COLUMNS) * 2 * capacity
+        self._slot_bytes = 8 * (slot_ints + slot_floats)
+        dir_offset = HEADER_SIZE
+        slots_offset = dir_offset + KEY_DTYPE.itemsize * max_series
+        slots_offset += -slots_offset % 8
+        size = slots_offset + self._slot_bytes * max_series
+
+        with self.write_lock:
+            self._init_file(size)
+            self._map = np.memmap(path, dtype=np.uint8, mode="r+", shape=(size,))
+
+        header = self._map[:HEADER_SIZE]
+        self._count = header[16:24].view(np.int64)  # allocated slots
+        self.epoch = bytes(header[24:28]).hex()  # set when the file is laid out
+        self._dir = self._map[dir_offset:dir_offset + KEY_DTYPE.itemsize * max_series].view(KEY_DTYPE)
+        self._slots_offset = slots_offset
+
+        self._series = {}  # (symbol, timeframe) -> SharedCandleSeries, this process's index
+        self._seen = 0  # directory entries already indexed
+
+    def _header_bytes(self) -> bytes:
+        fields = (LAYOUT_VERSION, self.capacity, self.max_series)
+        return MAGIC + b"".join(int(v).to_bytes(4, "little") for v in fields)
+
+    def _init_file(self, size: int) -> None:
+        expected = self._header_bytes()
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.pread(fd, len(expected), 0) == expected and os.fstat(fd).st_size == size:
+                return
+            # New file, or a different layout: start empty
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, size)
+            os.pwrite(fd, expected + bytes(8) + os.urandom(4), 0)
+        finally:
+            os.close(fd)
+
+    def _slot(self, index: int, symbol: str, timeframe: str) -> SharedCandleSeries:
+        base = self._slots_offset + index * self._slot_bytes
+        ints = self._map[base:base + 8 * (4 + 2 * self.capacity)].view(np.int64)
+        floats = self._map[base + ints.nbytes:base + self._slot_bytes].view(np.float64)
+        span = 2 * self.capacity
+        cols = {col: floats[i * span:(i + 1) * span] for i, col in enumerate(PRICE_COLUMNS)}
+        return SharedCandleSeries(symbol, timeframe, self.capacity, ints[:4], ints[4:], cols, self.write_lock)
+
+    def _refresh(self) -> None:
+        # Index slots other workers allocated since we last looked
+        count = int(self._count[0])
+        for i in range(self._seen, count):
+            key = self._dir[i]
+            symbol = key["symbol"].decode("utf-8")
+            timeframe = key["timeframe"].decode("utf-8")
+            self._series[(symbol, timeframe)] = self._slot(i, symbol, timeframe)
+        self._seen = count
+
+    def get(self, symbol: str, timeframe: str):
+        """
+        Returns the SharedCandleSeries or None if nothing was stored yet.
+        """
+        series = self._series.get((symbol, timeframe))
+        if series is None:
+            self._refresh()
+            series = self._series.get((symbol, timeframe))
+        return series
+
+    def series_for(self, symbol: str, timeframe: str) -> SharedCandleSeries:
+        """
+        Returns the series, allocating a slot if needed.
+        """
+        series = self.get(symbol, timeframe)
+        if series is not None:
+            return series
+
+        sym, tf = encode_key(symbol, timeframe)
+        with self.write_lock:
+            self._refresh()
+            series = self._series.get((symbol, timeframe))
+            if series is not None:
+                return series
+
+            index = int(self._count[0])
+            if index >= self.max_series:
+                raise RuntimeError(f"shared candle store is full ({self.max_series} series)")
+            self._dir[index] = (sym, tf)
+            self._count[0] = index + 1  # publish after the key is written
+            self._refresh()
+            return self._series[(symbol, timeframe)]
+
+    def append(self, symbol: str, timeframe: str, candle: dict) -> SharedCandleSeries:
+        series = self.series_for(symbol, timeframe)
+        with self.write_lock:
+            series.append_candle(candle)
+        return series
+
+    def symbols(self) -> list:
+        self._refresh()
+        return list(dict.fromkeys(symbol for symbol, _ in self._series))
+
+    def timeframes(self, symbol: str) -> list:
+        self._refresh()
+        return [tf for sym, tf in self._series if sym == symbol]
+
+    def __iter__(self):
+        self._refresh()
+        yield from list(self._series.values())
+
+    def total_candles(self) -> int:
+        return sum(len(series) for series in self)
@@ -0,0 +1,52 @@
+import pytest
+
+import shared_store
+from indicator_engine_test import make_candles
+from market_state import MarketState
+from market_state_test import feed
+from shared_store import SharedCandleStore
+
+
+@pytest.mark.parametrize("seqlock", [True, False])
+def test_shared_store_matches_local(tmp_path, monkeypatch, seqlock):
+    # seqlock=False is the non-x86 path: reads under the write lock
+    monkeypatch.setattr(shared_store, "SEQLOCK_READS", seqlock)
+    candles = make_candles(400)
+    local = MarketState(capacity=300)
+    feed(local, candles)
+    shared = MarketState(store=SharedCandleStore(str(tmp_path / "candles"), capacity=300, max_series=16))
+    feed(shared, candles)
+
+    for tf in ("1m", "5m", "15m", "1h"):
+        assert shared.store.get("SPX", tf).candles() == local.store.get("SPX", tf).candles(), tf
+        assert shared.snapshot("SPX", tf)["mtf"]["close"] == local.snapshot("SPX", tf)["mtf"]["close"]
+
+    # A second process' view of the same file
+    other = SharedCandleStore(str(tmp_path / "candles"), capacity=300, max_series=16)
+    assert other.get("SPX", "1m").frozen().candles() == local.store.get("SPX", "1m").candles()
+
+
+def test_snapshot_cached_under_the_version_it_read(tmp_path, monkeypatch):
+    candles = make_candles(120)
+    path = str(tmp_path / "candles")
+    market = MarketState(store=SharedCandleStore(path, capacity=300, max_series=16), rollup=False)
+    other = MarketState(store=SharedCandleStore(path, capacity=300, max_series=16), rollup=False)
+    feed(market, candles[:100])
+    looked_up = market.version("SPX", "1m")
+
+    # Another worker writes between the version lookup and the read
+    frozen = shared_store.SharedCandleSeries.frozen
+    raced = []
+
+    def racing_frozen(series):
+        if not raced:
+            raced.append(True)
+            feed(other, candles[100:101])
+        return frozen(series)
+
+    monkeypatch.setattr(shared_store.SharedCandleSeries, "frozen", racing_frozen)
+    snap = market.snapshot("SPX", "1m")
+
+    assert snap["candle_count"] == 101
+    assert market.snapshot_at("SPX", "1m", looked_up) is None
+    assert market.snapshot_at("SPX", "1m", looked_up + 1) is snap
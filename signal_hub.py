@@ -0,0 +1,191 @@
+import itertools
+import threading
+
+from signal_logic import classify_day_mode
+
+# This file pushes /mtf-signal style updates to subscribers (the SSE
+# route in app.py) instead of making clients poll.
+#
+# - a topic is (symbol, timeframes); every subscriber of a topic shares
+#   ONE computation per change
+# - MarketState calls notify() after each ingest, which just wakes the
+#   publisher thread; the publisher compares series versions per topic
+#   and only recomputes topics whose series moved
+# - it also re-checks versions every poll_interval seconds, which covers
+#   bars ingested by other workers on a shared store
+# - subscribers keep only the latest payload: a slow client skips
+#   intermediate updates instead of building a backlog
+
+
+class Subscription:
+    def __init__(self, topic):
+        self.topic = topic
+        self.payload = None
+        self.event_id = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def _offer(self, event_id, payload):
+        with self._cond:
+            self.event_id = event_id
+            self.payload = payload
+            self._cond.notify_all()
+
+    def wait(self, last_id: int, timeout: float):
+        """
+        Block until there is a payload newer than last_id (or timeout).
+        Returns (event_id, payload) or None on timeout / close.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or self.event_id > last_id, timeout=timeout)
+            if self.closed or self.event_id <= last_id:
+                return None
+            return self.event_id, self.payload
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class SignalHub:
+    def __init__(self, market, poll_interval: float = 1.0, max_subscribers: int = 500):
+        self.market = market
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self.published = 0  # payloads computed (one per topic change)
+
+        self._topics = {}  # topic -> {"subs": set, "versions": tuple, "payload": dict}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopped = False
+
+    # -----------------------------
+    # Subscribers
+    # -----------------------------
+    def subscribe(self, symbol: str, timeframes) -> Subscription:
+        """
+        Subscribe to (symbol, timeframes). The current state is delivered
+        as the first event. Raises RuntimeError when the hub is full.
+        """
+        topic = (symbol, tuple(timeframes))
+        sub = Subscription(topic)
+        with self._lock:
+            if self.subscriber_count() >= self.max_subscribers:
+                raise RuntimeError("Too many subscribers")
+            state = self._topics.setdefault(topic, {"subs": set(), "versions": None, "payload": None})
+            state["subs"].add(sub)
+            if state["payload"] is not None:
+                sub._offer(state["event_id"], state["payload"])
+        self._ensure_thread()
+        self._wake.set()  # new topics get their first payload right away
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        sub.close()
+        with self._lock:
+            state = self._topics.get(sub.topic)
+            if state is not None:
+                state["subs"].discard(sub)
+                if not state["subs"]:
+                    del self._topics[sub.topic]
+
+    def subscriber_count(self) -> int:
+        return sum(len(state["subs"]) for state in self._topics.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "topics": len(self._topics),
+                "subscribers": self.subscriber_count(),
+                "published": self.published,
+            }
+
+    # -----------------------------
+    # Publisher
+    # -----------------------------
+    def notify(self, symbol: str = None, timeframes=None) -> None:
+        """
+        Called after an ingest. Cheap: the publisher thread does the work.
+        """
+        self._wake.set()
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="signal-hub", daemon=True)
+                self._thread.start()
+
+    def _versions(self, symbol, timeframes) -> tuple:
+        out = []
+        for tf in timeframes:
+            series = self.market.store.get(symbol, tf)
+            out.append(series.version if series is not None else -1)
+        return tuple(out)
+
+    def _build(self, symbol, timeframes, versions, previous) -> dict:
+        snaps = self.market.mtf_snapshots(symbol, timeframes)
+        day_mode_info = classify_day_mode(snaps)
+        old = (previous or {}).get("versions", {})
+        return {
+            "symbol": symbol,
+            "timeframes": snaps,
+            "trend_labels": {tf: (snap.get("trend_label") if snap else None) for tf, snap in snaps.items()},
+            "day_mode": day_mode_info.get("day_mode"),
+            "day_mode_reason": day_mode_info.get("reason"),
+            "versions": dict(zip(timeframes, versions)),
+            "changed": [tf for tf, v in zip(timeframes, versions) if old.get(tf) != v],
+        }
+
+    def publish_changes(self) -> int:
+        """
+        Recompute every topic whose series moved and hand the payload to its
+        subscribers. Returns how many topics were published.
+        """
+        with self._lock:
+            topics = [(topic, state["versions"], state["payload"]) for topic, state in self._topics.items()]
+
+        published = 0
+        for (symbol, timeframes), seen, previous in topics:
+            versions = self._versions(symbol, timeframes)
+            if versions == seen:
+                continue
+            payload = self._build(symbol, timeframes, versions, previous)
+            event_id = next(self._ids)
+
+            with self._lock:
+                state = self._topics.get((symbol, timeframes))
+                if state is None:
+                    continue  # everyone left meanwhile
+                state["versions"] = versions
+                state["payload"] = payload
+                state["event_id"] = event_id
+                subs = list(state["subs"])
+                self.published += 1
+            for sub in subs:
+                sub._offer(event_id, payload)
+            published += 1
+        return published
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(timeout=self.poll_interval)
+            self._wake.clear()
+            with self._lock:
+                if not self._topics:
+                    continue
+            try:
+                self.publish_changes()
+            except Exception as e:  # keep the publisher alive for the other topics
+                print(f"⚠️ signal hub publish failed: {type(e).__name__}: {e}")
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wake.set()
+        with self._lock:
+            subs = [sub for state in self._topics.values() for sub in state["subs"]]
+        for sub in subs:
+            sub.close()
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def classify_trend(latest_indicators: dict) -> dict:
     """
     Analyzes the latest indicator snapshot to classify the market trend.
@@ -67,6 +70,109 @@ def classify_trend(latest_indicators: dict) -> dict:
         "strength": "WEAK"
     }
 
+# === Vectorized versions (full series in, per-bar arrays out) ===
+# Same rules as classify_trend / score_timeframe, for research and
+# backtests over whole histories. Inputs are indicator columns such as
+# indicators.compute_indicator_columns() plus "close" (and "AO"/"MOM10"
+# from compute_ao_series / compute_momentum_series for scoring).
+# Missing values are NaN, which fails every comparison just like the
+# scalar code does.
+
+TREND_LABELS = np.array(["CHOP", "BULLISH", "BEARISH", "ERROR"])
+
+
+def _column(columns, key, default):
+    """
+    float64 column, or the scalar default when the key is missing
+    (mirrors latest_indicators.get(key, default)).
+    """
+    values = columns.get(key)
+    if values is None:
+        return default
+    return np.asarray(values, dtype=np.float64)
+
+
+def classify_trend_series(columns: dict) -> tuple:
+    """
+    Vectorized classify_trend.
+
+    :param columns: dict of equal-length arrays (close, EMA5, EMA10, EMA20,
+                    MACD_LINE, MACD_SIGNAL, RSI14)
+    :return: (trend, strength) arrays; trend holds BULLISH/BEARISH/CHOP/ERROR,
+             strength holds STRONG/WEAK (None where trend is ERROR)
+    """
+    close = np.asarray(columns["close"], dtype=np.float64)
+    EMA5 = _column(columns, "EMA5", close)
+    EMA10 = _column(columns, "EMA10", close)
+    EMA20 = _column(columns, "EMA20", close)
+    MACD_LINE = _column(columns, "MACD_LINE", 0.0)
+    MACD_SIGNAL = _column(columns, "MACD_SIGNAL", 0.0)
+    RSI14 = _column(columns, "RSI14", 50.0)
+
+    # `not close` in the scalar version: 0 is an error, NaN is not
+    error = close == 0
+
+    bull = (EMA5 > EMA10) & (EMA10 > EMA20) & (close > EMA20) & (MACD_LINE > MACD_SIGNAL) & (RSI14 > 50)
+    bear = (EMA5 < EMA10) & (EMA10 < EMA20) & (close < EMA20) & (MACD_LINE < MACD_SIGNAL) & (RSI14 < 50)
+
+    codes = np.zeros(len(close), dtype=np.int8)
+    codes[bear] = 2
+    codes[bull] = 1
+    codes[error] = 3
+    trend = TREND_LABELS[codes]
+
+    strength = np.where(codes == 0, "WEAK", "STRONG").astype(object)
+    strength[error] = None
+    return trend, strength
+
+
+def score_timeframe_series(columns: dict, trend=None) -> np.ndarray:
+    """
+    Vectorized score_timeframe: int8 scores in [-3, 3], one per bar.
+
+    :param columns: dict of arrays (close, EMA20, RSI14, MACD_HIST, AO, MOM10)
+    :param trend: per-bar trend labels; computed with classify_trend_series
+                  when not given
+    """
+    close = np.asarray(columns["close"], dtype=np.float64)
+    n = len(close)
+    nan = np.full(n, np.nan)
+
+    if trend is None:
+        trend, _strength = classify_trend_series(columns)
+    trend = np.asarray(trend)
+
+    ema20 = _column(columns, "EMA20", nan)
+    rsi = _column(columns, "RSI14", nan)
+    macd_hist = _column(columns, "MACD_HIST", nan)
+    ao = _column(columns, "AO", nan)
+    mom = _column(columns, "MOM10", nan)
+
+    score = np.zeros(n, dtype=np.int16)
+
+    # Trend label base
+    score += (trend == "BULLISH")
+    score -= (trend == "BEARISH")
+
+    # Price vs EMA20
+    score += (close > ema20)
+    score -= (close < ema20)
+
+    # RSI strength / weakness (35-45 and 45-55 score 0)
+    score += np.where(rsi >= 65, 2, 0) + np.where((rsi >= 55) & (rsi < 65), 1, 0)
+    score -= np.where((rsi >= 30) & (rsi < 35), 1, 0) + np.where(rsi < 30, 2, 0)
+
+    # MACD histogram
+    score += (macd_hist > 0)
+    score -= (macd_hist < 0)
+
+    # AO + MOM confirmation
+    score += (ao > 0) & (mom > 0)
+    score -= (ao < 0) & (mom < 0)
+
+    return np.clip(score, -3, 3).astype(np.int8)
+
+
 # === PHASE 2: Multi-timeframe scoring + day mode ===
 
 def score_timeframe(snapshot):
@@ -134,15 +240,33 @@ def score_timeframe(snapshot):
     return score
 
 
-def classify_day_mode(mtf_snapshots):
+def score_snapshots(snapshots) -> list:
+    """
+    score_timeframe for many snapshots at once (e.g. every symbol x
+    timeframe of a batch request), in one vectorized pass.
+    """
+    if not snapshots:
+        return []
+    columns = {
+        key: np.array([snap.get(key) for snap in snapshots], dtype=np.float64)
+        for key in ("close", "EMA20", "RSI14", "MACD_HIST", "AO", "MOM10")
+    }
+    trend = np.array([str(snap.get("trend_label")) for snap in snapshots])
+    return score_timeframe_series(columns, trend=trend).tolist()
+
+
+def classify_day_mode(mtf_snapshots, scores=None):
     """
     Classify overall day: KILL / SCALP_ONLY / NO_TRADE
     mtf_snapshots: { timeframe: snapshot_with_trend_label_or_None }
+    scores: optional { timeframe: score_timeframe(snapshot) }, if the
+            caller already scored them (see score_snapshots)
     """
-    scores = {}
-    for tf, snap in mtf_snapshots.items():
-        if snap:
-            scores[tf] = score_timeframe(snap)
+    if scores is None:
+        scores = {}
+        for tf, snap in mtf_snapshots.items():
+            if snap:
+                scores[tf] = score_timeframe(snap)
 
     if not scores:
         return {'day_mode': None, 'reason': 'Not enough data to classify day.'}
@@ -0,0 +1,153 @@
+import time
+
+import numpy as np
+import pytest
+
+import signal_logic
+from indicator_engine_test import make_candles
+from indicators import (
+    candles_to_arrays,
+    compute_ao_series,
+    compute_indicator_columns,
+    compute_indicators,
+    compute_momentum_series,
+)
+from signal_logic import classify_trend, classify_trend_series, score_timeframe, score_timeframe_series
+
+SCORE_KEYS = ("close", "EMA20", "RSI14", "MACD_HIST", "AO", "MOM10")
+
+
+def series_columns(candles):
+    arrays = candles_to_arrays(candles)
+    columns = compute_indicator_columns(arrays["high"], arrays["low"], arrays["close"])
+    columns["close"] = arrays["close"]
+    columns["AO"] = compute_ao_series(arrays["high"], arrays["low"])
+    columns["MOM10"] = compute_momentum_series(arrays["close"])
+    return columns
+
+
+def scalar_labels(snapshots):
+    trend, strength, score = [], [], []
+    for snap in snapshots:
+        info = classify_trend(snap)
+        snap = dict(snap, trend_label=info["trend"])
+        trend.append(info["trend"])
+        strength.append(info.get("strength"))
+        score.append(score_timeframe(snap))
+    return trend, strength, score
+
+
+def assert_parity(columns, snapshots):
+    trend, strength = classify_trend_series(columns)
+    score = score_timeframe_series(columns)
+    want_trend, want_strength, want_score = scalar_labels(snapshots)
+    assert trend.tolist() == want_trend
+    assert strength.tolist() == want_strength
+    assert score.tolist() == want_score
+
+
+def test_every_bar_matches_the_scalar_rules():
+    candles = make_candles(160, seed=4)
+    columns = series_columns(candles)
+    # The scalar rules on what compute_indicators returns at each bar,
+    # warm-up included (NaN windows, AO / MOM10 still None)
+    snapshots = [compute_indicators(candles[:i + 1])[0] for i in range(len(candles))]
+    assert snapshots[0]["AO"] is None and np.isnan(snapshots[0]["RSI14"])
+    assert_parity(columns, snapshots)
+
+    trend, _strength = classify_trend_series(columns)
+    assert {"BULLISH", "BEARISH", "CHOP"} <= set(trend.tolist())
+
+
+def test_ties_nans_and_zero_close():
+    n = 10
+    base = {
+        "close": np.full(n, 100.0),
+        "EMA5": np.full(n, 100.0),
+        "EMA10": np.full(n, 100.0),
+        "EMA20": np.full(n, 100.0),
+        "MACD_LINE": np.zeros(n),
+        "MACD_SIGNAL": np.zeros(n),
+        "MACD_HIST": np.zeros(n),
+        "RSI14": np.array([30, 35, 45, 50, 55, 65, 29.999, 45.001, np.nan, 50]),
+        "AO": np.array([0, 1, -1, 1, np.nan, 0, 1, -1, 1, 1]),
+        "MOM10": np.array([1, 1, -1, 0, 1, np.nan, 1, -1, 1, 1]),
+    }
+    base["close"][3] = 0.0  # "not close": ERROR
+    base["close"][9] = np.nan  # NaN is truthy: not an error, fails every comparison
+    base["EMA20"][5] = np.nan
+
+    # A clean bull and a clean bear bar, then the same bars with one tie each
+    bull = {"close": 103, "EMA5": 102, "EMA10": 101, "EMA20": 100, "MACD_LINE": 1, "MACD_SIGNAL": 0,
+            "MACD_HIST": 1, "RSI14": 70, "AO": 1, "MOM10": 1}
+    bear = {"close": 97, "EMA5": 98, "EMA10": 99, "EMA20": 100, "MACD_LINE": -1, "MACD_SIGNAL": 0,
+            "MACD_HIST": -1, "RSI14": 20, "AO": -1, "MOM10": -1}
+    rows = [bull, bear]
+    for clean in (bull, bear):
+        for key, tie in (("EMA5", "EMA10"), ("EMA10", "EMA20"), ("close", "EMA20"),
+                         ("MACD_LINE", "MACD_SIGNAL")):
+            rows.append(dict(clean, **{key: clean[tie]}))
+        rows.append(dict(clean, RSI14=50))
+    columns = {
+        key: np.concatenate([base[key], [float(row[key]) for row in rows]]) for key in base
+    }
+
+    snapshots = [{key: float(values[i]) for key, values in columns.items()} for i in range(len(columns["close"]))]
+    assert_parity(columns, snapshots)
+
+    trend, strength = classify_trend_series(columns)
+    assert trend[3] == "ERROR" and strength[3] is None
+    assert trend[9] == "CHOP"
+    assert trend[n:n + 2].tolist() == ["BULLISH", "BEARISH"]
+    assert set(trend[n + 2:].tolist()) == {"CHOP"}
+
+
+def test_missing_columns_use_the_scalar_defaults():
+    candles = make_candles(80, seed=9)
+    columns = series_columns(candles)
+    snapshots = [compute_indicators(candles[:i + 1])[0] for i in range(len(candles))]
+    for key in ("EMA5", "MACD_SIGNAL", "RSI14", "AO"):
+        del columns[key]
+        for snap in snapshots:
+            del snap[key]
+    assert_parity(columns, snapshots)
+
+
+def test_labeling_is_vectorized(monkeypatch):
+    # Nothing per bar: the scalar functions must never be called
+    def per_bar(*args, **kwargs):
+        raise AssertionError("scalar rule called per bar")
+
+    monkeypatch.setattr(signal_logic, "classify_trend", per_bar)
+    monkeypatch.setattr(signal_logic, "score_timeframe", per_bar)
+
+    n = 1_000_000
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, n))
+    columns = {"close": close}
+    for key in ("EMA5", "EMA10", "EMA20"):
+        columns[key] = close + rng.normal(0, 0.2, n)
+    for key in ("MACD_LINE", "MACD_SIGNAL", "MACD_HIST", "AO", "MOM10"):
+        columns[key] = rng.normal(0, 1, n)
+    columns["RSI14"] = rng.uniform(0, 100, n)
+
+    started = time.perf_counter()
+    trend, strength = classify_trend_series(columns)
+    score = score_timeframe_series(columns, trend=trend)
+    elapsed = time.perf_counter() - started
+
+    assert len(trend) == len(strength) == len(score) == n
+    assert score.dtype == np.int8 and -3 <= score.min() and score.max() <= 3
+    # A per-bar Python loop over 1M bars takes many seconds
+    assert elapsed < 2.0
+
+
+@pytest.mark.parametrize("trend", [None, "given"])
+def test_score_snapshots_matches_score_timeframe(trend):
+    candles = make_candles(120, seed=5)
+    snapshots = []
+    for i in range(0, len(candles), 7):
+        snap = compute_indicators(candles[:i + 1])[0]
+        snap["trend_label"] = classify_trend(snap)["trend"] if trend else None
+        snapshots.append(snap)
+    assert signal_logic.score_snapshots(snapshots) == [score_timeframe(s) for s in snapshots]
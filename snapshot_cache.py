@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict, deque
+
+# This file is a small LRU cache for per-series indicator snapshots.
+# Entries are keyed by (symbol, timeframe) and tagged with the series
+# version they were built from; a different version is a miss, and
+# MarketState drops the entry as soon as the series changes.
+#
+# The last few (version, value) pairs per key are also kept as history,
+# so a client that says "I have version N" can be sent just the delta.
+
+
+class SnapshotCache:
+    def __init__(self, maxsize: int = 1024, history: int = 4):
+        self.maxsize = maxsize
+        self.history = history
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # (symbol, timeframe) -> (version, value)
+        self._history = OrderedDict()  # (symbol, timeframe) -> deque of (version, value)
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, version, compute):
+        """
+        Cached value for key at this version, or compute() and store it.
+        compute() returns (version, value): the version the value was
+        actually built from, which is what it's stored under (the series
+        may have moved on since the lookup).
+        Cached values are shared between callers: treat them as read-only.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Compute outside the lock; two racing misses just do the work twice
+        version, value = compute()
+
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+            if self.history:
+                past = self._history.get(key)
+                if past is None:
+                    past = self._history[key] = deque(maxlen=self.history)
+                if not past or past[-1][0] != version:
+                    past.append((version, value))
+                self._history.move_to_end(key)
+                while len(self._history) > self.maxsize:
+                    self._history.popitem(last=False)
+        return value
+
+    def at_version(self, key, version):
+        """
+        The value computed for key at that exact version, if still retained.
+        """
+        with self._lock:
+            for past_version, value in reversed(self._history.get(key, ())):
+                if past_version == version:
+                    return value
+        return None
+
+    def invalidate(self, key=None) -> None:
+        """
+        Drop one key, or everything if key is None.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._history.clear()
+            else:
+                self._entries.pop(key, None)  # history is version-tagged, it stays
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else None,
+            }
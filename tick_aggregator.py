@@ -0,0 +1,348 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from candle_store import format_epoch, to_epoch
+from timeframe_rollup import SESSION_OPEN
+
+# This file turns a stream of quotes / trades (timestamp, price, size)
+# into OHLCV bars for several timeframes at once (the live feed's job).
+#
+# - O(1) per tick per timeframe: every (symbol, timeframe) keeps one
+#   forming bar as a small list; a tick inside it is a few compares
+# - buckets are aligned like timeframe_rollup (to the 09:30 open), so a
+#   1h bar built here matches the one rolled up from 1m bars
+# - late ticks: when a new bucket starts, the previous bar stays open
+#   for `grace` seconds and late ticks for it are still applied; after
+#   that it is closed and later ticks for it are dropped (counted), also
+#   when the bar was closed by the timer (each bucket is emitted once)
+# - bar close on a timer: flush(now) closes bars whose bucket (+ grace)
+#   has passed even if no newer tick arrived (quiet symbols);
+#   start_timer() runs that every second
+#
+# Timestamps are wall-clock seconds in market time, like the candle
+# store (see candle_store.to_epoch); floats are fine.
+#
+# Benchmark with synthetic ticks:
+#   python tick_aggregator.py --symbols 5000 --ticks 2000000 --timeframes 1m,5m
+
+# timeframe -> bucket size in seconds
+TICK_TIMEFRAMES = {
+    "1s": 1,
+    "5s": 5,
+    "15s": 15,
+    "30s": 30,
+    "1m": 60,
+    "5m": 5 * 60,
+    "15m": 15 * 60,
+    "30m": 30 * 60,
+    "1h": 60 * 60,
+}
+
+_NOTHING = ()
+
+# Bar list layout (lists are cheaper to update in place than dicts)
+_START, _END, _OPEN, _HIGH, _LOW, _CLOSE, _VOLUME, _TICKS = range(8)
+
+
+def market_now() -> int:
+    """
+    Current wall-clock time in market time, as candle store seconds.
+    """
+    return to_epoch(time.time())
+
+
+def _bar_dict(bar) -> dict:
+    return {
+        "timestamp": bar[_START],
+        "open": bar[_OPEN],
+        "high": bar[_HIGH],
+        "low": bar[_LOW],
+        "close": bar[_CLOSE],
+        "volume": bar[_VOLUME],
+        "ticks": bar[_TICKS],
+    }
+
+
+class TickAggregator:
+    """
+    Live OHLCV bars for many symbols from ticks.
+
+    Closed bars come out as (symbol, timeframe, bar dict) from add() /
+    flush(), and also go to on_bar(symbol, timeframe, bar) if given.
+    """
+
+    def __init__(self, timeframes=("1m",), grace: float = 2.0, on_bar=None):
+        unknown = [tf for tf in timeframes if tf not in TICK_TIMEFRAMES]
+        if unknown:
+            raise ValueError(f"Unknown tick timeframe(s) {unknown}; use {list(TICK_TIMEFRAMES)}")
+        self.timeframes = tuple(timeframes)
+        self.grace = float(grace)
+        self.on_bar = on_bar
+
+        self.ticks = 0
+        self.late_applied = 0   # late ticks that made it into their bar
+        self.late_dropped = 0   # late ticks for a bar that was already closed
+        self.bars_closed = 0
+
+        # symbol -> [[timeframe, seconds, forming bar, bar in grace,
+        #             start of the last closed bucket], ...]
+        self._symbols = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        self._stop = threading.Event()
+
+    # -----------------------------
+    # Ticks
+    # -----------------------------
+    def add(self, symbol: str, ts: float, price: float, size: float = 0.0):
+        """
+        Apply one tick. Returns the bars it closed (usually none).
+        """
+        closed = []
+        with self._lock:
+            self._add(closed, symbol, ts, price, size)
+            self.bars_closed += len(closed)
+        return self._emit(closed)
+
+    def add_many(self, ticks):
+        """
+        Apply an iterable of (symbol, ts, price, size) under one lock.
+        Returns the bars closed along the way.
+        """
+        closed = []
+        with self._lock:
+            add = self._add
+            for symbol, ts, price, size in ticks:
+                add(closed, symbol, ts, price, size)
+            self.bars_closed += len(closed)
+        return self._emit(closed)
+
+    def _add(self, closed, symbol, ts, price, size):
+        self.ticks += 1
+        slots = self._symbols.get(symbol)
+        if slots is None:
+            slots = self._symbols[symbol] = [
+                [tf, TICK_TIMEFRAMES[tf], None, None, None] for tf in self.timeframes
+            ]
+
+        for slot in slots:
+            bar = slot[2]
+            if bar is not None and bar[_START] <= ts < bar[_END]:
+                # Hot path: the tick belongs to the forming bar
+                if price > bar[_HIGH]:
+                    bar[_HIGH] = price
+                elif price < bar[_LOW]:
+                    bar[_LOW] = price
+                bar[_CLOSE] = price
+                bar[_VOLUME] += size
+                bar[_TICKS] += 1
+                waiting = slot[3]
+                if waiting is not None and ts >= waiting[_END] + self.grace:
+                    closed.append((symbol, slot[0], waiting))
+                    slot[3] = None
+                    slot[4] = waiting[_START]
+                continue
+
+            seconds = slot[1]
+            t = int(ts)
+            start = t - (t - SESSION_OPEN) % seconds
+
+            if slot[4] is not None and start <= slot[4]:
+                # Its bucket was already emitted (e.g. closed by flush())
+                self.late_dropped += 1
+                continue
+
+            if bar is None or start > bar[_START]:
+                # New bucket; the old bar waits out the grace window
+                slot[2] = [start, start + seconds, price, price, price, price, size, 1]
+                if bar is not None:
+                    waiting = slot[3]
+                    if waiting is not None:
+                        closed.append((symbol, slot[0], waiting))
+                        slot[3] = None
+                        slot[4] = waiting[_START]
+                    if ts >= bar[_END] + self.grace:
+                        closed.append((symbol, slot[0], bar))
+                        slot[4] = bar[_START]
+                    else:
+                        slot[3] = bar
+                continue
+
+            # Late tick (older bucket than the forming bar)
+            waiting = slot[3]
+            if waiting is not None and waiting[_START] == start:
+                if price > waiting[_HIGH]:
+                    waiting[_HIGH] = price
+                elif price < waiting[_LOW]:
+                    waiting[_LOW] = price
+                # A late tick is not the last trade of its bar: close stays
+                waiting[_VOLUME] += size
+                waiting[_TICKS] += 1
+                self.late_applied += 1
+            else:
+                self.late_dropped += 1
+
+    # -----------------------------
+    # Closing bars
+    # -----------------------------
+    def flush(self, now: float):
+        """
+        Close every bar whose bucket ended at least `grace` seconds before
+        `now` (wall-clock market seconds). Returns the closed bars.
+        """
+        cutoff = now - self.grace
+        closed = []
+        with self._lock:
+            for symbol, slots in self._symbols.items():
+                for slot in slots:
+                    if slot[3] is not None and slot[3][_END] <= cutoff:
+                        closed.append((symbol, slot[0], slot[3]))
+                        slot[4] = slot[3][_START]
+                        slot[3] = None
+                    if slot[2] is not None and slot[2][_END] <= cutoff:
+                        closed.append((symbol, slot[0], slot[2]))
+                        slot[4] = slot[2][_START]
+                        slot[2] = None
+            self.bars_closed += len(closed)
+        return self._emit(closed)
+
+    def close_all(self):
+        """
+        Close every open bar, finished or not (shutdown).
+        """
+        return self.flush(float("inf"))
+
+    def _emit(self, closed):
+        if not closed:
+            return _NOTHING
+        out = [(symbol, tf, _bar_dict(bar)) for symbol, tf, bar in closed]
+        if self.on_bar is not None:
+            for symbol, tf, bar in out:
+                self.on_bar(symbol, tf, bar)
+        return out
+
+    def start_timer(self, interval: float = 1.0, clock=market_now) -> None:
+        """
+        flush(clock()) every `interval` seconds on a daemon thread.
+        """
+        if self._timer is not None and self._timer.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.flush(clock())
+                except Exception as e:  # keep closing bars for the other symbols
+                    print(f"⚠️ tick aggregator flush failed: {type(e).__name__}: {e}")
+
+        self._timer = threading.Thread(target=run, name="tick-aggregator", daemon=True)
+        self._timer.start()
+
+    def stop_timer(self) -> None:
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join(timeout=5)
+            self._timer = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "symbols": len(self._symbols),
+                "ticks": self.ticks,
+                "bars_closed": self.bars_closed,
+                "late_applied": self.late_applied,
+                "late_dropped": self.late_dropped,
+            }
+
+
+# -------------------------------------------------
+# Synthetic ticks + benchmark
+# -------------------------------------------------
+def synthetic_ticks(n_symbols: int = 1000, n_ticks: int = 1_000_000, rate: float = 100_000.0,
+                    start: int = None, late_fraction: float = 0.01, late_seconds: float = 3.0,
+                    seed: int = 7) -> list:
+    """
+    (symbol, ts, price, size) tuples, roughly `rate` ticks per second
+    across n_symbols random walks, in arrival order. late_fraction of the
+    ticks arrive up to late_seconds behind their timestamp.
+    """
+    rng = np.random.default_rng(seed)
+    if start is None:
+        start = to_epoch("2025-11-26T10:00:00")
+
+    ts = start + np.cumsum(rng.exponential(1.0 / rate, n_ticks))
+    late = rng.random(n_ticks) < late_fraction
+    ts[late] -= rng.uniform(0.0, late_seconds, int(late.sum()))
+
+    sym = rng.integers(0, n_symbols, n_ticks)
+    base = rng.uniform(5.0, 500.0, n_symbols)
+    # Per-symbol random walk: cumulative steps, grouped by symbol
+    steps = rng.normal(0.0, 0.0005, n_ticks)
+    order = np.argsort(sym, kind="stable")
+    sorted_steps = steps[order]
+    running = np.cumsum(sorted_steps)
+    first = np.searchsorted(sym[order], sym[order])  # start of each tick's symbol group
+    walk = np.empty(n_ticks)
+    walk[order] = running - running[first] + sorted_steps[first]
+    price = np.round(base[sym] * np.exp(walk), 2)
+    size = rng.integers(1, 50, n_ticks).astype(np.float64)
+
+    names = [f"SYM{i:05d}" for i in range(n_symbols)]
+    return list(zip([names[i] for i in sym], ts.tolist(), price.tolist(), size.tolist()))
+
+
+def benchmark(ticks, timeframes=("1m",), grace: float = 2.0, batch: int = 1000) -> dict:
+    """
+    Feed pre-built ticks through a TickAggregator in batches of `batch`
+    (0 = one add() per tick) and report throughput.
+    """
+    agg = TickAggregator(timeframes=timeframes, grace=grace)
+    started = time.perf_counter()
+    if batch:
+        for i in range(0, len(ticks), batch):
+            agg.add_many(ticks[i:i + batch])
+    else:
+        add = agg.add
+        for symbol, ts, price, size in ticks:
+            add(symbol, ts, price, size)
+    elapsed = time.perf_counter() - started
+    agg.close_all()
+
+    stats = agg.stats()
+    stats["elapsed"] = elapsed
+    stats["ticks_per_second"] = len(ticks) / elapsed if elapsed > 0 else None
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the tick aggregator on synthetic ticks.")
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--ticks", type=int, default=1_000_000)
+    parser.add_argument("--rate", type=float, default=100_000.0, help="simulated ticks per second")
+    parser.add_argument("--timeframes", default="1m,5m")
+    parser.add_argument("--grace", type=float, default=2.0)
+    parser.add_argument("--late", type=float, default=0.01, help="fraction of ticks that arrive late")
+    parser.add_argument("--batch", type=int, default=1000, help="ticks per add_many() call, 0 = add() per tick")
+    args = parser.parse_args()
+
+    timeframes = [tf.strip() for tf in args.timeframes.split(",") if tf.strip()]
+    print(f"Generating {args.ticks:,} ticks over {args.symbols:,} symbols…")
+    ticks = synthetic_ticks(args.symbols, args.ticks, args.rate, late_fraction=args.late)
+    span = ticks[-1][1] - ticks[0][1]
+    print(f"Simulated span: {format_epoch(ticks[0][1])} + {span:.1f}s")
+
+    stats = benchmark(ticks, timeframes, args.grace, args.batch)
+    print(f"\n{stats['ticks_per_second']:,.0f} ticks/s ({stats['elapsed']:.2f}s)")
+    print(f"Bars closed:   {stats['bars_closed']:,}")
+    print(f"Late applied:  {stats['late_applied']:,}")
+    print(f"Late dropped:  {stats['late_dropped']:,}")
+    # Real time keeps up when we process faster than the simulated rate
+    print(f"Headroom:      x{stats['ticks_per_second'] / args.rate:.1f} over {args.rate:,.0f} ticks/s")
+
+
+if __name__ == "__main__":
+    main()
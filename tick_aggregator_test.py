@@ -0,0 +1,97 @@
+import pytest
+
+from candle_store import to_epoch
+from tick_aggregator import TickAggregator, synthetic_ticks
+
+T0 = to_epoch("2025-11-26T10:00:00")
+
+
+def starts(bars):
+    return [(symbol, tf, bar["timestamp"]) for symbol, tf, bar in bars]
+
+
+def test_bar_ohlcv_and_close_on_next_bucket():
+    agg = TickAggregator(timeframes=("1m",), grace=0.0)
+    for ts, price, size in [(T0, 10.0, 1), (T0 + 10, 12.0, 2), (T0 + 20, 9.0, 3), (T0 + 59, 11.0, 4)]:
+        assert agg.add("X", ts, price, size) == ()
+    (symbol, tf, bar), = agg.add("X", T0 + 60, 11.5, 1)
+    assert (symbol, tf) == ("X", "1m")
+    assert bar == {"timestamp": T0, "open": 10.0, "high": 12.0, "low": 9.0,
+                   "close": 11.0, "volume": 10, "ticks": 4}
+
+
+def test_buckets_align_to_session_open():
+    agg = TickAggregator(timeframes=("1h",), grace=0.0)
+    agg.add("X", to_epoch("2025-11-26T10:15:00"), 1.0)
+    (_, _, bar), = agg.close_all()
+    assert bar["timestamp"] == to_epoch("2025-11-26T09:30:00")
+
+
+def test_late_tick_inside_grace_is_applied():
+    agg = TickAggregator(timeframes=("1m",), grace=2.0)
+    agg.add("X", T0 + 5, 10.0, 1)
+    agg.add("X", T0 + 60.5, 11.0, 1)        # new bucket, old bar waits
+    agg.add("X", T0 + 59, 8.0, 5)           # late, still in grace
+    closed = agg.add("X", T0 + 62.5, 11.2, 1)  # past grace: old bar closes
+    (_, _, bar), = closed
+    assert bar["low"] == 8.0 and bar["close"] == 10.0 and bar["volume"] == 6
+    assert agg.late_applied == 1 and agg.late_dropped == 0
+
+
+def test_late_tick_after_grace_is_dropped():
+    agg = TickAggregator(timeframes=("1m",), grace=1.0)
+    agg.add("X", T0 + 5, 10.0)
+    agg.add("X", T0 + 70, 11.0)   # closes the first bar right away (past grace)
+    assert agg.add("X", T0 + 30, 9.0) == ()
+    assert agg.late_dropped == 1
+
+
+def test_tick_for_bucket_closed_by_flush_is_dropped():
+    agg = TickAggregator(timeframes=("1m",), grace=2.0)
+    agg.add("X", T0 + 1, 10.0)
+    (first,) = agg.flush(T0 + 70)
+    agg.add("X", T0 + 30, 9.0)   # that bucket was already emitted
+    assert agg.flush(T0 + 200) == ()
+    assert first[2]["timestamp"] == T0
+    assert agg.late_dropped == 1 and agg.bars_closed == 1
+
+
+def test_flush_closes_quiet_bars_and_keeps_forming_ones():
+    agg = TickAggregator(timeframes=("1m", "5m"), grace=2.0)
+    agg.add("X", T0 + 1, 10.0)
+    assert starts(agg.flush(T0 + 61)) == []
+    assert starts(agg.flush(T0 + 62)) == [("X", "1m", T0)]
+    assert starts(agg.flush(T0 + 302)) == [("X", "5m", T0)]
+
+
+def test_each_bucket_emitted_once_and_matches_batch():
+    ticks = synthetic_ticks(n_symbols=20, n_ticks=20000, rate=200.0, late_fraction=0.05, seed=3)
+    agg = TickAggregator(timeframes=("1m", "5m"), grace=2.0)
+    bars = []
+    for i in range(0, len(ticks), 500):
+        bars.extend(agg.add_many(ticks[i:i + 500]))
+        bars.extend(agg.flush(ticks[min(i + 499, len(ticks) - 1)][1]))
+    bars.extend(agg.close_all())
+
+    keys = starts(bars)
+    assert len(keys) == len(set(keys))
+    stats = agg.stats()
+    # Every tick lands in one bar per timeframe, or is counted as dropped
+    assert sum(bar["ticks"] for _, _, bar in bars) + stats["late_dropped"] == 2 * stats["ticks"]
+    assert stats["late_dropped"] > 0
+
+    # Without late ticks every 1m bar matches a plain group-by
+    clean = synthetic_ticks(n_symbols=5, n_ticks=5000, rate=50.0, late_fraction=0.0, seed=4)
+    agg = TickAggregator(timeframes=("1m",), grace=0.0)
+    out = list(agg.add_many(clean)) + list(agg.close_all())
+    for symbol, _, bar in out:
+        rows = [(ts, p, s) for sym, ts, p, s in clean
+                if sym == symbol and bar["timestamp"] <= ts < bar["timestamp"] + 60]
+        assert bar["open"] == rows[0][1] and bar["close"] == rows[-1][1]
+        assert bar["high"] == max(p for _, p, _ in rows) and bar["low"] == min(p for _, p, _ in rows)
+        assert bar["volume"] == pytest.approx(sum(s for _, _, s in rows))
+
+
+def test_unknown_timeframe():
+    with pytest.raises(ValueError):
+        TickAggregator(timeframes=("7m",))
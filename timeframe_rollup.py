@@ -0,0 +1,168 @@
+import numpy as np
+
+# This file rolls 1-minute bars up into the higher intraday timeframes
+# (5m / 15m / 30m / 1h / day) as they arrive, so one 1m feed drives every
+# timeframe /mtf-signal asks for.
+#
+# Buckets are aligned to the regular session open (09:30 market time), so
+# the 1h bars are 09:30-10:30, 10:30-11:30, ... like a broker chart.
+# Only regular-session minutes [09:30, 16:00) are rolled up; extended-hours
+# 1m bars stay in the 1m series only.
+
+BASE_TIMEFRAME = "1m"
+
+# timeframe -> bucket size in seconds (None = whole session)
+ROLLUP_TIMEFRAMES = {
+    "5m": 5 * 60,
+    "15m": 15 * 60,
+    "30m": 30 * 60,
+    "1h": 60 * 60,
+    "day": None,
+}
+
+SESSION_OPEN = 9 * 3600 + 30 * 60   # 09:30, seconds after midnight
+SESSION_CLOSE = 16 * 3600           # 16:00
+SECONDS_PER_DAY = 86400
+
+
+def in_session(ts):
+    """
+    True if a wall-clock epoch falls inside the regular session.
+    Works on ints and on int64 arrays.
+    """
+    seconds = ts % SECONDS_PER_DAY
+    return (seconds >= SESSION_OPEN) & (seconds < SESSION_CLOSE)
+
+
+def bucket_start(ts, timeframe: str):
+    """
+    Start (wall-clock epoch) of the timeframe bucket that contains ts.
+    Works on ints and on int64 arrays.
+    """
+    day_start = ts - ts % SECONDS_PER_DAY
+    size = ROLLUP_TIMEFRAMES[timeframe]
+    if size is None:
+        return day_start
+
+    offset = ts - day_start - SESSION_OPEN
+    return day_start + SESSION_OPEN + (offset // size) * size
+
+
+class TimeframeRollup:
+    """
+    Forming higher-timeframe bars for ONE symbol.
+
+    add() takes the next 1m bar and returns a list of
+    (timeframe, bar, is_new) where bar is a dict with
+    timestamp/open/high/low/close/volume and is_new says whether it
+    starts a new bucket (append) or updates the forming one (replace).
+    """
+
+    def __init__(self, timeframes=None):
+        self.timeframes = tuple(timeframes or ROLLUP_TIMEFRAMES)
+        self._bars = {}  # timeframe -> forming bar dict
+
+    def seed(self, timeframe: str, bar: dict) -> None:
+        """
+        Resume a forming bar (e.g. the last stored 5m bar after a restart),
+        so the next minute in the same bucket updates it instead of
+        starting a duplicate.
+        """
+        if timeframe in self.timeframes:
+            self._bars[timeframe] = {
+                k: bar[k] for k in ("timestamp", "open", "high", "low", "close", "volume")
+            }
+
+    def add(self, ts: int, open_: float, high: float, low: float, close: float, volume: float = 0.0) -> list:
+        if not in_session(ts):
+            return []
+
+        updates = []
+        for tf in self.timeframes:
+            start = bucket_start(ts, tf)
+            bar = self._bars.get(tf)
+
+            if bar is None or start > bar["timestamp"]:
+                bar = {
+                    "timestamp": start,
+                    "open": open_,
+                    "high": high,
+                    "low": low,
+                    "close": close,
+                    "volume": volume,
+                }
+                self._bars[tf] = bar
+                updates.append((tf, dict(bar), True))
+            elif start == bar["timestamp"]:
+                bar["high"] = max(bar["high"], high)
+                bar["low"] = min(bar["low"], low)
+                bar["close"] = close
+                bar["volume"] += volume
+                updates.append((tf, dict(bar), False))
+            # else: a late minute for a bucket that already closed -> skip
+
+        return updates
+
+    def add_many(self, ts, open_, high, low, close, volume) -> dict:
+        """
+        Vectorized add() for a run of 1m bars (equal-length arrays).
+
+        Returns {timeframe: (bars, continues)} where bars holds one
+        aggregated row per bucket as arrays (timestamp/open/high/low/close/
+        volume) and continues says whether the first row updates the bar
+        that was already forming (replace) rather than starting a new one.
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        mask = in_session(ts)
+        ts, open_, high, low, close, volume = (
+            np.asarray(a)[mask] for a in (ts, open_, high, low, close, volume)
+        )
+
+        out = {}
+        if len(ts) == 0:
+            return out
+
+        for tf in self.timeframes:
+            starts = bucket_start(ts, tf)
+            forming = self._bars.get(tf)
+
+            # Drop late minutes, same as add(): anything older than the newest bucket seen so far
+            floor = np.maximum.accumulate(starts)
+            if forming is not None:
+                floor = np.maximum(floor, forming["timestamp"])
+            ok = starts >= floor
+            if not ok.any():
+                continue
+
+            s = starts[ok]
+            o, h, lo, c, v = open_[ok], high[ok], low[ok], close[ok], volume[ok]
+
+            edges = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+            last = np.r_[edges[1:], len(s)] - 1
+            bars = {
+                "timestamp": s[edges],
+                "open": o[edges].astype(np.float64),
+                "high": np.maximum.reduceat(h, edges).astype(np.float64),
+                "low": np.minimum.reduceat(lo, edges).astype(np.float64),
+                "close": c[last].astype(np.float64),
+                "volume": np.add.reduceat(v, edges).astype(np.float64),
+            }
+
+            continues = forming is not None and bars["timestamp"][0] == forming["timestamp"]
+            if continues:
+                bars["open"][0] = forming["open"]
+                bars["high"][0] = max(bars["high"][0], forming["high"])
+                bars["low"][0] = min(bars["low"][0], forming["low"])
+                bars["volume"][0] += forming["volume"]
+
+            self._bars[tf] = {
+                "timestamp": int(bars["timestamp"][-1]),
+                "open": float(bars["open"][-1]),
+                "high": float(bars["high"][-1]),
+                "low": float(bars["low"][-1]),
+                "close": float(bars["close"][-1]),
+                "volume": float(bars["volume"][-1]),
+            }
+            out[tf] = (bars, continues)
+
+        return out
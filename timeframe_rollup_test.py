@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from candle_store import to_epoch
+from timeframe_rollup import ROLLUP_TIMEFRAMES, TimeframeRollup, bucket_start, in_session
+
+
+def minutes(start, end, seed=2):
+    """
+    1m bars every minute in [start, end) as arrays, random walk prices.
+    """
+    ts = np.arange(to_epoch(start), to_epoch(end), 60, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, len(ts)))
+    open_ = close + rng.normal(0, 0.05, len(ts))
+    high = np.maximum(open_, close) + 0.1
+    low = np.minimum(open_, close) - 0.1
+    volume = rng.integers(1, 100, len(ts)).astype(np.float64)
+    return ts, open_, high, low, close, volume
+
+
+@pytest.mark.parametrize("ts, tf, expected", [
+    ("2025-11-26T09:30:00", "5m", "2025-11-26T09:30:00"),
+    ("2025-11-26T09:34:00", "5m", "2025-11-26T09:30:00"),
+    ("2025-11-26T10:29:00", "1h", "2025-11-26T09:30:00"),
+    ("2025-11-26T10:30:00", "1h", "2025-11-26T10:30:00"),
+    ("2025-11-26T15:59:00", "1h", "2025-11-26T15:30:00"),
+    ("2025-11-26T15:59:00", "30m", "2025-11-26T15:30:00"),
+    ("2025-11-26T12:00:00", "day", "2025-11-26T00:00:00"),
+])
+def test_buckets_align_to_session_open(ts, tf, expected):
+    assert bucket_start(to_epoch(ts), tf) == to_epoch(expected)
+
+
+def test_session_bounds():
+    assert not in_session(to_epoch("2025-11-26T09:29:00"))
+    assert in_session(to_epoch("2025-11-26T09:30:00"))
+    assert in_session(to_epoch("2025-11-26T15:59:00"))
+    assert not in_session(to_epoch("2025-11-26T16:00:00"))
+
+
+def test_extended_hours_are_not_rolled_up():
+    rollup = TimeframeRollup()
+    assert rollup.add(to_epoch("2025-11-26T08:00:00"), 1, 2, 0.5, 1.5, 10) == []
+    assert rollup.add(to_epoch("2025-11-26T16:00:00"), 1, 2, 0.5, 1.5, 10) == []
+
+
+def reference(ts, open_, high, low, close, volume, tf):
+    # Plain pandas group-by on the session minutes
+    mask = in_session(ts)
+    df = pd.DataFrame({"open": open_, "high": high, "low": low, "close": close, "volume": volume})[mask]
+    df["bucket"] = bucket_start(ts[mask], tf)
+    g = df.groupby("bucket", sort=True)
+    return pd.DataFrame({
+        "open": g["open"].first(), "high": g["high"].max(), "low": g["low"].min(),
+        "close": g["close"].last(), "volume": g["volume"].sum(),
+    })
+
+
+def test_add_matches_group_by_and_last_1h_bar_is_short():
+    bars = minutes("2025-11-26T08:00:00", "2025-11-26T17:00:00")
+    rollup = TimeframeRollup()
+    final = {}
+    for row in zip(*bars):
+        for tf, bar, _ in rollup.add(*row):
+            final.setdefault(tf, {})[bar["timestamp"]] = bar
+    for tf in ROLLUP_TIMEFRAMES:
+        expected = reference(*bars, tf)
+        got = pd.DataFrame(list(final[tf].values())).set_index("timestamp")
+        np.testing.assert_allclose(got[expected.columns].to_numpy(), expected.to_numpy())
+    # 09:30-16:00 = 6.5 hours: seven 1h bars, the last one 15:30-16:00
+    assert len(final["1h"]) == 7
+    assert len(final["day"]) == 1
+
+
+def test_add_many_matches_add_across_chunks():
+    bars = minutes("2025-11-26T09:00:00", "2025-11-27T11:00:00")
+    one = TimeframeRollup()
+    per_bar = {}
+    for row in zip(*bars):
+        for tf, bar, _ in one.add(*row):
+            per_bar.setdefault(tf, {})[bar["timestamp"]] = bar
+
+    many = TimeframeRollup()
+    chunked = {}
+    for lo in range(0, len(bars[0]), 37):  # chunks that split buckets
+        for tf, (out, _continues) in many.add_many(*(a[lo:lo + 37] for a in bars)).items():
+            for i, start in enumerate(out["timestamp"]):
+                chunked.setdefault(tf, {})[int(start)] = {k: float(out[k][i]) for k in out if k != "timestamp"}
+
+    for tf in ROLLUP_TIMEFRAMES:
+        assert chunked[tf].keys() == per_bar[tf].keys()
+        for start, bar in per_bar[tf].items():
+            for key in ("open", "high", "low", "close", "volume"):
+                assert chunked[tf][start][key] == pytest.approx(bar[key]), (tf, start, key)
+
+
+def test_late_minute_is_skipped():
+    rollup = TimeframeRollup(timeframes=("5m",))
+    rollup.add(to_epoch("2025-11-26T09:40:00"), 1, 2, 0.5, 1.5, 1)
+    assert rollup.add(to_epoch("2025-11-26T09:31:00"), 9, 9, 9, 9, 9) == []
+    (tf, bar, is_new), = rollup.add(to_epoch("2025-11-26T09:41:00"), 1, 3, 0.5, 2, 1)
+    assert not is_new and bar["high"] == 3 and bar["volume"] == 2
+
+
+def test_seed_resumes_forming_bar():
+    rollup = TimeframeRollup(timeframes=("1h",))
+    rollup.seed("1h", {"timestamp": to_epoch("2025-11-26T09:30:00"), "open": 1.0, "high": 5.0,
+                       "low": 0.5, "close": 2.0, "volume": 10.0})
+    (tf, bar, is_new), = rollup.add(to_epoch("2025-11-26T10:00:00"), 2, 6, 1, 4, 5)
+    assert not is_new
+    assert bar == {"timestamp": to_epoch("2025-11-26T09:30:00"), "open": 1.0, "high": 6,
+                   "low": 0.5, "close": 4, "volume": 15.0}